@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Alarm latency under saturation, with and without admission control.
+
+Against slow fake upstreams, --mics chat clients keep the server saturated while a slow
+robot (it acks each SAY only after "speaking" it for --robot-say-ms) lets speech pile up in
+the command window. Every --alarm-every seconds another client says an alarm phrase and
+we measure how long until
+  - the robot receives BUZZER ON        (alarm_to_robot)
+  - the client receives the alert frame (alarm_to_client)
+The server is run --runs times with ADMISSION_CONTROL=0 and =1, alternating, each on a fresh
+server. Alarm latencies are pooled per setting and their percentiles computed exactly from
+all samples, so p95 rests on dozens of alarms rather than being the maximum of one short run;
+the report keeps each run's figures too, plus chat latency and how many chat turns were shed
+with the "busy" reply.
+
+Usage (from the project root):
+    python -m benchmarks.bench_alarm_latency [--runs 3] [--mics 48] [--duration 30]
+        [--alarm-every 0.5] [--chat-ms 1500] [--robot-say-ms 60] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_upstreams import tag_clip  # noqa: E402
+from benchmarks.load_test import _free_port, _get_json, _unique, _wait_http, synth_clip  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+from server.services.robot_protocol import BINARY_PROTOCOL, get_codec  # noqa: E402
+
+CHAT_PHRASE = "Tell me something interesting about black holes."
+ALARM_PHRASE = "Emergency! Sound the alarm."
+BUSY_TEXT = "I'm a bit busy right now. Ask me again in a moment."
+MIN_SAMPLES_FOR_P95 = 40  # below this, p95 is little more than the worst alarm
+
+
+class Run:
+    def __init__(self) -> None:
+        self.alarm_robot = LatencyHistogram()
+        self.alarm_robot_s: List[float] = []  # raw samples, pooled across runs
+        self.alarm_client = LatencyHistogram()
+        self.chat = LatencyHistogram()
+        self.counters: Dict[str, int] = {
+            "alarms_sent": 0, "alarms_missed_robot": 0, "alarms_missed_client": 0,
+            "chat_sent": 0, "chat_answered": 0, "chat_shed": 0, "chat_timeouts": 0, "robot_says": 0,
+        }
+        self.buzzers: asyncio.Queue = asyncio.Queue()
+
+
+async def robot(url: str, run: Run, stop_at: float, say_ms: float) -> None:
+    """Binary-protocol robot that speaks (and only then acks) SAY commands one at a time."""
+    import websockets
+
+    codec = get_codec(BINARY_PROTOCOL)
+    work: asyncio.Queue = asyncio.Queue()
+    queued, done = set(), set()
+
+    async with websockets.connect(url, subprotocols=[BINARY_PROTOCOL]) as ws:
+        async def process() -> None:
+            while True:
+                seq, action = await work.get()
+                if action == "SAY":
+                    run.counters["robot_says"] += 1
+                    await asyncio.sleep(say_ms / 1000.0)
+                queued.discard(seq)
+                done.add(seq)
+                await ws.send(codec.encode_ack(seq))
+
+        worker = asyncio.create_task(process())
+        try:
+            while time.monotonic() < stop_at:
+                try:
+                    frame = await asyncio.wait_for(ws.recv(), max(0.01, stop_at - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                data = codec.decode(frame)
+                if data.get("action") == "BUZZER" and data.get("value") == "ON":
+                    run.buzzers.put_nowait(time.perf_counter())
+                seq = data.get("seq")
+                if not seq:
+                    continue
+                if seq in done:
+                    await ws.send(codec.encode_ack(seq))  # retransmission of a handled command
+                elif seq not in queued:
+                    queued.add(seq)
+                    work.put_nowait((seq, data.get("action")))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            worker.cancel()
+
+
+async def chat_mic(url: str, clip: bytes, run: Run, stop_at: float, timeout: float) -> None:
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            run.counters["chat_sent"] += 1
+            await ws.send(_unique(clip))
+            try:
+                reply = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+            except asyncio.TimeoutError:
+                run.counters["chat_timeouts"] += 1
+                break
+            if reply.get("text") == BUSY_TEXT:
+                run.counters["chat_shed"] += 1
+                await asyncio.sleep(random.uniform(0.2, 0.6))  # back off like a person would
+                continue
+            run.counters["chat_answered"] += 1
+            run.chat.record(time.perf_counter() - started)
+            await asyncio.sleep(random.uniform(0.05, 0.25))
+
+
+async def alarm_mic(url: str, clip: bytes, run: Run, stop_at: float, every: float, timeout: float) -> None:
+    import websockets
+
+    await asyncio.sleep(every)  # let the chat load build up first
+    async with websockets.connect(url, max_size=None) as ws:
+        while time.monotonic() < stop_at - 1.0:
+            while not run.buzzers.empty():
+                run.buzzers.get_nowait()
+            started = time.perf_counter()
+            run.counters["alarms_sent"] += 1
+            await ws.send(_unique(clip))
+            try:
+                while json.loads(await asyncio.wait_for(ws.recv(), timeout)).get("type") != "alert":
+                    pass
+                run.alarm_client.record(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                run.counters["alarms_missed_client"] += 1
+            try:
+                elapsed = await asyncio.wait_for(run.buzzers.get(), timeout) - started
+                run.alarm_robot.record(elapsed)
+                run.alarm_robot_s.append(elapsed)
+            except asyncio.TimeoutError:
+                run.counters["alarms_missed_robot"] += 1
+            while True:  # drain the alarm's remaining reply frames
+                try:
+                    await asyncio.wait_for(ws.recv(), 0.2)
+                except asyncio.TimeoutError:
+                    break
+            await asyncio.sleep(every)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank q-th percentile of raw samples, in ms."""
+    ordered = sorted(samples)
+    return round(ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * q // 100) - 1))] * 1000, 1)
+
+
+def pooled(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "max_ms": round(max(samples) * 1000, 1),
+        "p95_reliable": len(samples) >= MIN_SAMPLES_FOR_P95,
+    }
+
+
+async def measure(args: argparse.Namespace, base: str, run: Run) -> Dict:
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    ws_base = base.replace("http", "ws", 1)
+    clip = synth_clip(1.0, 260)
+    stop_at = time.monotonic() + args.duration
+    robot_task = asyncio.create_task(robot(f"{ws_base}/ws/robot?device_id=bench", run, stop_at + 2, args.robot_say_ms))
+    await asyncio.sleep(0.3)
+    await asyncio.gather(
+        alarm_mic(f"{ws_base}/ws/audio", tag_clip(clip, ALARM_PHRASE), run, stop_at, args.alarm_every, args.timeout),
+        *(chat_mic(f"{ws_base}/ws/audio", tag_clip(clip, CHAT_PHRASE), run, stop_at, args.timeout)
+          for _ in range(args.mics)),
+    )
+    robot_task.cancel()
+    server = await _get_json(f"{base}/api/metrics") or {}
+    counters = server.get("counters", {})
+    return {
+        "alarm_to_robot": run.alarm_robot.snapshot(),
+        "alarm_to_client": run.alarm_client.snapshot(),
+        "chat_latency": run.chat.snapshot(),
+        "counters": run.counters,
+        "server": {
+            "alarm_pipeline": server.get("histograms", {}).get("pipeline.alarm"),
+            "counters": {k: v for k, v in counters.items() if k.startswith(("admission.", "robot."))},
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Alarm latency under chat saturation, admission control off vs on")
+    parser.add_argument("--mics", type=int, default=48)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--runs", type=int, default=3, help="fresh-server runs per setting, alternating")
+    parser.add_argument("--alarm-every", type=float, default=0.5, help="seconds between alarms")
+    parser.add_argument("--chat-ms", type=float, default=1500.0)
+    parser.add_argument("--stt-ms", type=float, default=150.0)
+    parser.add_argument("--robot-say-ms", type=float, default=60.0, help="how long the robot takes per SAY")
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+         "--chat-ms", str(args.chat_ms), "--fast-chat-ms", str(args.chat_ms), "--stt-ms", str(args.stt_ms),
+         "--weather-ms", "40", "--jitter-ms", "50"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    report: Dict = {"config": vars(args).copy()}
+    report["config"].pop("output")
+    samples: Dict[str, List[float]] = {"admission_off": [], "admission_on": []}
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        for label, enabled in [setting for _ in range(args.runs)
+                               for setting in (("admission_off", "0"), ("admission_on", "1"))]:
+            port = _free_port()
+            env = dict(os.environ)
+            env.update({
+                "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+                "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+                "ADMISSION_CONTROL": enabled,
+            })
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            run = Run()
+            try:
+                report.setdefault(label, {"runs": []})["runs"].append(
+                    asyncio.run(measure(args, f"http://127.0.0.1:{port}", run))
+                )
+                samples[label].extend(run.alarm_robot_s)
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+    finally:
+        fake.terminate()
+        fake.wait(timeout=15)
+
+    for label, values in samples.items():
+        report[label]["alarm_to_robot"] = pooled(values)
+    off, on = report["admission_off"]["alarm_to_robot"], report["admission_on"]["alarm_to_robot"]
+    if off["count"] and on["count"]:
+        report["alarm_to_robot_p50_speedup"] = round(off["p50_ms"] / on["p50_ms"], 2)
+        report["alarm_to_robot_p95_speedup"] = round(off["p95_ms"] / on["p95_ms"], 2)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
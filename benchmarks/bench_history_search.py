@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+History search benchmark over a synthetic interaction log (default one million turns).
+
+Builds a throwaway SQLite database with the server's schema, search index and sync
+triggers (services/history.py), fills it with --rows turns spread over a year, then times
+/history/search queries as the API runs them:
+  latest        newest page, no filters
+  common_term   a word in ~10% of turns
+  rare_term     a word in ~0.01% of turns
+  prefix        a partial word ("photosynth*")
+  mode          mode=study
+  range         one week in the middle of the year
+  combined      term + mode + time range
+  deep_keyset   page --deep-page of a common term, following next_cursor
+and compares against the plans a dashboard would otherwise use:
+  like_scan     the rare term with LIKE '%word%' (full table scan)
+  deep_offset   the same deep page with OFFSET instead of a cursor
+
+Usage (from the project root):
+    python -m benchmarks.bench_history_search [--rows 1000000] [--repeat 20] [--deep-page 50]
+        [--db path/to/keep.db] [--output report.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from server.database import Base  # noqa: E402
+from server.models import InteractionLogs  # noqa: E402
+from server.services.history import PAGE_SIZE, install_search_index, search_history  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+
+START = datetime(2025, 1, 1)
+MODES = ["normal"] * 6 + ["study"] * 2 + ["child", "privacy"]
+TOPICS = [
+    "black holes", "the moon", "dinosaurs", "volcanoes", "my homework", "fractions", "photosynthesis",
+    "the solar system", "rainbows", "sharks", "robots", "music", "football", "the ocean", "gravity",
+]
+QUESTIONS = [
+    "tell me about {topic}", "what do you know about {topic}", "can you explain {topic}",
+    "why is {topic} interesting", "help me with {topic}", "I want to learn about {topic}",
+]
+ANSWERS = [
+    "Sure! {topic} is a fascinating subject.", "Here is a fun fact about {topic}.",
+    "Let's break {topic} down step by step.", "Great question, {topic} surprises a lot of people.",
+]
+COMMON_WORD = "weather"  # ~10% of turns
+RARE_WORD = "axolotl"    # ~0.01% of turns
+
+
+def synth_rows(n: int, seed: int = 7):
+    """Yield interaction rows in time order, about one every 30 seconds."""
+    rng = random.Random(seed)
+    step = 365 * 86400 / max(1, n)
+    for i in range(n):
+        topic = rng.choice(TOPICS)
+        user_text = rng.choice(QUESTIONS).format(topic=topic)
+        roll = rng.random()
+        if roll < 0.10:
+            user_text = f"what is the {COMMON_WORD} like today"
+        elif roll < 0.1001:
+            user_text = f"is an {RARE_WORD} a kind of fish"
+        yield {
+            "timestamp": START + timedelta(seconds=i * step + rng.uniform(0, step / 2)),
+            "user_text": user_text,
+            "robot_response": rng.choice(ANSWERS).format(topic=topic),
+            "mode": rng.choice(MODES),
+            "audio_duration": round(rng.uniform(0.8, 6.0), 2),
+        }
+
+
+def build(engine, rows: int, batch: int) -> Dict:
+    Base.metadata.create_all(bind=engine, tables=[InteractionLogs.__table__])
+    install_search_index(engine)
+    insert = InteractionLogs.__table__.insert()
+    started = time.perf_counter()
+    buffer: List[dict] = []
+    with engine.begin() as conn:
+        for row in synth_rows(rows):
+            buffer.append(row)
+            if len(buffer) >= batch:
+                conn.execute(insert, buffer)
+                buffer = []
+        if buffer:
+            conn.execute(insert, buffer)
+    elapsed = time.perf_counter() - started
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("INSERT INTO interaction_logs_fts(interaction_logs_fts) VALUES ('optimize')")
+        conn.commit()
+    return {"rows": rows, "seconds": round(elapsed, 1), "rows_per_s": round(rows / elapsed)}
+
+
+def timed(fn: Callable[[], object], repeat: int) -> Dict:
+    hist = LatencyHistogram()
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        hist.record(time.perf_counter() - started)
+    snap = hist.snapshot()
+    return {"p50_ms": snap["p50_ms"], "p95_ms": snap["p95_ms"], "max_ms": snap["max_ms"], "result_rows": _count(result)}
+
+
+def _count(result) -> int:
+    if isinstance(result, dict):
+        return len(result["items"])
+    return len(result or [])
+
+
+def walk(db, pages: int, **filters) -> dict:
+    """Follow next_cursor `pages` pages deep; return the last page."""
+    page = search_history(db, **filters)
+    for _ in range(pages - 1):
+        if not page["next_cursor"]:
+            break
+        page = search_history(db, cursor=page["next_cursor"], **filters)
+    return page
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark FTS5 history search with keyset pagination")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=5000, help="rows per insert batch (the flusher's batching)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--deep-page", type=int, default=50)
+    parser.add_argument("--db", help="keep the generated database at this path (reused if it exists)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    tmpdir = None
+    path = args.db
+    if path is None:
+        tmpdir = tempfile.mkdtemp(prefix="gus-history-")
+        path = os.path.join(tmpdir, "history.db")
+    engine = create_engine(f"sqlite:///{path}")
+    report: Dict = {"config": {k: v for k, v in vars(args).items() if k not in ("db", "output")}}
+    try:
+        if os.path.exists(path) and os.path.getsize(path) > 0 and args.db:
+            report["build"] = "reused"
+            install_search_index(engine)
+        else:
+            report["build"] = build(engine, args.rows, args.batch)
+        report["db_mb"] = round(os.path.getsize(path) / 1e6, 1)
+
+        db = sessionmaker(bind=engine)()
+        week = (START + timedelta(days=180), START + timedelta(days=187))
+        deep_offset = text(
+            "SELECT l.id FROM interaction_logs l WHERE l.id IN "
+            "(SELECT rowid FROM interaction_logs_fts WHERE interaction_logs_fts MATCH :q) "
+            "ORDER BY l.timestamp DESC, l.id DESC LIMIT :limit OFFSET :offset"
+        )
+        like_scan = text(
+            "SELECT l.id FROM interaction_logs l WHERE l.user_text LIKE :p OR l.robot_response LIKE :p "
+            "ORDER BY l.timestamp DESC, l.id DESC LIMIT :limit"
+        )
+        repeat = args.repeat
+        queries = {
+            "latest": lambda: search_history(db),
+            "common_term": lambda: search_history(db, q=COMMON_WORD),
+            "rare_term": lambda: search_history(db, q=RARE_WORD),
+            "prefix": lambda: search_history(db, q="photosynth*"),
+            "mode": lambda: search_history(db, mode="study"),
+            "range": lambda: search_history(db, since=week[0], until=week[1]),
+            "combined": lambda: search_history(db, q="homework", mode="study", since=week[0], until=week[1]),
+            "deep_keyset": lambda: walk(db, args.deep_page, q=COMMON_WORD),
+            "like_scan": lambda: db.execute(like_scan, {"p": f"%{RARE_WORD}%", "limit": PAGE_SIZE}).all(),
+            "deep_offset": lambda: db.execute(deep_offset, {
+                "q": f'"{COMMON_WORD}"', "limit": PAGE_SIZE, "offset": (args.deep_page - 1) * PAGE_SIZE,
+            }).all(),
+        }
+        results = {}
+        for name, fn in queries.items():
+            # Full scans are slow by design; a few runs are enough to show it
+            results[name] = timed(fn, max(3, repeat // 5) if name in ("like_scan", "deep_offset") else repeat)
+            print(f"{name:12s} p50 {results[name]['p50_ms']} ms", file=sys.stderr)
+        # A cursor walk touches deep_page pages; report the per-page cost too
+        results["deep_keyset"]["per_page_p50_ms"] = round(results["deep_keyset"]["p50_ms"] / args.deep_page, 2)
+        report["queries"] = results
+        if results["rare_term"]["p50_ms"]:
+            report["rare_term_speedup_vs_like"] = round(results["like_scan"]["p50_ms"] / results["rare_term"]["p50_ms"], 1)
+        db.close()
+    finally:
+        engine.dispose()
+        if tmpdir is not None:
+            for name in os.listdir(tmpdir):
+                os.unlink(os.path.join(tmpdir, name))
+            os.rmdir(tmpdir)
+
+    text_report = json.dumps(report, indent=2)
+    print(text_report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Local CPU LLM: load time, time to first token and decode speed per thread count, and what a
+voice turn costs when the local model answers it.
+
+In-process part (always): loads the GGUF model given by --model (default LOCAL_LLM_MODEL)
+through server.services.llm_backend.LocalBackend once per --threads value, warms it up, then
+answers --prompts short assistant prompts with the privacy-mode system prompt and reports
+TTFT p50/p95, tokens/s (from the per-token decode time), tokens per reply and peak RSS.
+
+--e2e also starts the fake upstreams and a server with the model, and measures reply latency
+after the end of an utterance for
+  groq      normal mode, healthy (fake) Groq: the baseline
+  privacy   privacy mode: answered locally, and the fake Groq must see no chat call
+  fallback  normal mode with both Groq chat models failing: answered locally
+Replies must never be the canned error.
+
+Needs llama-cpp-python and a small instruct model, e.g. a Q4_K_M GGUF of
+Qwen2.5-1.5B-Instruct or Llama-3.2-1B-Instruct.
+
+Usage (from the project root):
+    python -m benchmarks.bench_local_llm --model models/qwen2.5-1.5b-instruct-q4_k_m.gguf
+        [--threads 1,2,4] [--prompts 8] [--max-tokens 96] [--e2e] [--turns 4] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_upstreams import tag_clip  # noqa: E402
+from benchmarks.load_test import _free_port, _get_json, _unique, _wait_http, synth_clip  # noqa: E402
+from server.services.metrics import LatencyHistogram, get_metrics  # noqa: E402
+from server.services.model_router import FAST_MODEL, LARGE_MODEL  # noqa: E402
+from server.services.resilience import Deadline  # noqa: E402
+
+SYSTEM = "[SYSTEM] You are in Privacy Mode. Be extremely concise. Acknowledge commands briefly."
+PROMPTS = [
+    "What time is it?",
+    "Remind me to drink water.",
+    "How are you today?",
+    "What is Ohm's law?",
+    "Tell me a short joke.",
+    "What's the capital of Japan?",
+    "Explain what a capacitor does in one sentence.",
+    "Thanks, that's all for now.",
+]
+CANNED_ERROR = "I'm having trouble processing that right now"
+E2E_QUESTION = "tell me something interesting about the moon"
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def bench_threads(model: str, threads: int, prompts: int, max_tokens: int) -> Dict:
+    from server.services.llm_backend import LocalBackend
+
+    metrics = get_metrics()
+    for name in ("llm.local.ttft", "llm.local.per_token", "llm.local.turn"):
+        metrics.histograms.pop(name, None)  # per-config figures
+    backend = LocalBackend(model, threads=threads)
+    try:
+        started = time.perf_counter()
+        backend.load().result()
+        load_s = time.perf_counter() - started
+        warmup = [{"role": "system", "content": SYSTEM}, {"role": "user", "content": "Hello!"}]
+        backend.complete(warmup, "Hello!", "privacy", max_tokens, Deadline(120))
+        for name in ("llm.local.ttft", "llm.local.per_token", "llm.local.turn"):
+            metrics.histograms.pop(name, None)  # leave the warm-up out
+        tokens_before = metrics.counters.get("llm.local.tokens", 0)
+        replies: List[str] = []
+        for i in range(prompts):
+            text = PROMPTS[i % len(PROMPTS)]
+            messages = [{"role": "system", "content": SYSTEM}, {"role": "user", "content": text}]
+            replies.append(backend.complete(messages, text, "privacy", max_tokens, Deadline(120)))
+        ttft = metrics.histogram("llm.local.ttft").snapshot()
+        per_token = metrics.histogram("llm.local.per_token").snapshot()
+        return {
+            "threads": threads,
+            "load_s": round(load_s, 2),
+            "ttft_ms": {"p50": ttft["p50_ms"], "p95": ttft["p95_ms"]},
+            "tokens_per_s": {
+                "p50": round(1000 / per_token["p50_ms"], 1) if per_token["p50_ms"] else None,
+                "worst": round(1000 / per_token["max_ms"], 1) if per_token["max_ms"] else None,
+            },
+            "reply_ms_p50": metrics.histogram("llm.local.turn").snapshot()["p50_ms"],
+            "tokens_per_reply": round((metrics.counters.get("llm.local.tokens", 0) - tokens_before) / prompts, 1),
+            "peak_rss_mb": peak_rss_mb(),
+            "sample_reply": replies[0][:120] if replies else None,
+        }
+    finally:
+        backend.close()
+
+
+async def voice_turns(base: str, turns: int, clip: bytes) -> Dict:
+    import websockets
+
+    latency = LatencyHistogram()
+    canned = 0
+    async with websockets.connect(base.replace("http", "ws", 1) + "/ws/audio", max_size=None) as ws:
+        for _ in range(turns):
+            started = time.perf_counter()
+            await ws.send(_unique(clip))
+            while True:
+                message = await asyncio.wait_for(ws.recv(), 120)
+                if isinstance(message, str) and '"ai_response"' in message:
+                    break
+            latency.record(time.perf_counter() - started)
+            canned += CANNED_ERROR in json.loads(message)["text"]
+    return {"turn_latency": latency.snapshot(), "canned_errors": canned}
+
+
+async def e2e(args: argparse.Namespace, base: str, fake_base: str) -> Dict:
+    import httpx
+
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    clip = tag_clip(synth_clip(1.0, 300), E2E_QUESTION)
+    report: Dict = {}
+    async with httpx.AsyncClient(timeout=30) as client:
+        # The model loads in the background at startup; wait for it before measuring
+        deadline = time.monotonic() + 300
+        while time.monotonic() < deadline:
+            local = ((await client.get(f"{base}/api/upstream/health")).json() or {}).get("local_llm") or {}
+            if local.get("loaded"):
+                break
+            await asyncio.sleep(0.5)
+        report["local_llm"] = local
+
+        async def phase(mode: str, failing: List[str]) -> Dict:
+            await client.post(f"{fake_base}/__config", json={"fail_models": failing, "reset": True})
+            await client.post(f"{base}/api/command", json={"type": mode})
+            result = await voice_turns(base, args.turns, clip)
+            stats = (await client.get(f"{fake_base}/__stats")).json()["calls"]
+            result["groq_chat_calls"] = stats.get("chat", 0) + stats.get("chat_fast", 0)
+            return result
+
+        report["groq"] = await phase("normal_mode", [])
+        report["privacy"] = await phase("privacy_mode", [])
+        report["fallback"] = await phase("normal_mode", [LARGE_MODEL, FAST_MODEL])
+    report["server"] = {
+        name: value for name, value in ((await _get_json(f"{base}/api/metrics?prefix=ai.")) or {}).get(
+            "counters", {}).items()
+    }
+    report["checks"] = {
+        "privacy turns never reach Groq": report["privacy"]["groq_chat_calls"] == 0,
+        "no canned errors": not any(report[p]["canned_errors"] for p in ("groq", "privacy", "fallback")),
+        "fallback answered locally": report["server"].get("ai.fallback.local", 0) >= args.turns,
+    }
+    return report
+
+
+def run_e2e(args: argparse.Namespace) -> Dict:
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    server = None
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        port = _free_port()
+        env = dict(os.environ)
+        env.update({
+            "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+            "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+            "LOCAL_LLM_MODEL": os.path.abspath(args.model), "LOCAL_LLM_THREADS": str(args.e2e_threads),
+            "SPECULATION": "0",
+        })
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        return asyncio.run(e2e(args, f"http://127.0.0.1:{port}", fake_base))
+    finally:
+        for proc in (server, fake):
+            if proc is None:
+                continue
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local CPU LLM: TTFT, tokens/s and voice-turn latency")
+    parser.add_argument("--model", default=os.getenv("LOCAL_LLM_MODEL", ""), help="GGUF model path")
+    parser.add_argument("--threads", default="", help="comma-separated thread counts (default: 1 and half the CPUs)")
+    parser.add_argument("--prompts", type=int, default=8)
+    parser.add_argument("--max-tokens", type=int, default=96)
+    parser.add_argument("--e2e", action="store_true", help="also measure voice turns against a live server")
+    parser.add_argument("--e2e-threads", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--turns", type=int, default=4, help="voice turns per e2e phase")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        import llama_cpp  # noqa: F401
+    except ImportError:
+        sys.exit("llama-cpp-python is not installed: pip install llama-cpp-python")
+    if not args.model or not os.path.isfile(args.model):
+        sys.exit("pass --model (or set LOCAL_LLM_MODEL) to a GGUF file")
+    threads = sorted({int(t) for t in args.threads.split(",") if t} or {1, max(1, (os.cpu_count() or 2) // 2)})
+
+    report: Dict = {
+        "cpu": cpu_model(),
+        "cpus": os.cpu_count(),
+        "model": os.path.basename(args.model),
+        "model_mb": round(os.path.getsize(args.model) / 1e6, 1),
+        "max_tokens": args.max_tokens,
+        "runs": [bench_threads(args.model, t, args.prompts, args.max_tokens) for t in threads],
+    }
+    if args.e2e:
+        report["e2e"] = run_e2e(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    failed = args.e2e and not all(report["e2e"]["checks"].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: robot wire codecs.
+Measures encode/decode cost and bytes on the wire per command type for the JSON and binary
+framings (plus MessagePack/CBOR when those libraries happen to be installed, for reference).
+
+Usage (from the project root):
+    python -m benchmarks.bench_robot_protocol [--iterations 200000] [--json]
+"""
+
+import argparse
+import json
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from server.services.robot_protocol import BINARY_PROTOCOL, JSON_PROTOCOL, get_codec
+
+COMMANDS: List[Tuple[str, str]] = [
+    ("LED", "BLUE"),
+    ("LED", "RED_BLINK"),
+    ("SERVO", "DOWN"),
+    ("BUZZER", "ON"),
+    ("VOLUME", "0.75"),
+    ("SAY", "Study Mode Activated. Blue LED is on. I am now your strict tutor."),
+]
+
+
+def _reference_codecs() -> Dict[str, Tuple[Callable, Callable]]:
+    codecs: Dict[str, Tuple[Callable, Callable]] = {}
+    try:
+        import msgpack
+        codecs["msgpack"] = (
+            lambda a, v: msgpack.packb({"action": a, "value": v}),
+            msgpack.unpackb,
+        )
+    except ImportError:
+        pass
+    try:
+        import cbor2
+        codecs["cbor"] = (lambda a, v: cbor2.dumps({"action": a, "value": v}), cbor2.loads)
+    except ImportError:
+        pass
+    return codecs
+
+
+def run(iterations: int) -> List[dict]:
+    codecs: Dict[str, Tuple[Callable, Callable]] = {}
+    for protocol in (JSON_PROTOCOL, BINARY_PROTOCOL):
+        codec = get_codec(protocol)
+        # Nothing is pre-built here, so the real encoder is measured (with a seq, as on a live link)
+        codecs[protocol] = (lambda a, v, c=codec: c.encode_command(a, v, seq=1), codec.decode)
+    codecs.update(_reference_codecs())
+
+    rows = []
+    for action, value in COMMANDS:
+        for name, (encode, decode) in codecs.items():
+            frame = encode(action, value)
+            size = len(frame.encode("utf-8")) if isinstance(frame, str) else len(frame)
+            enc = timeit.timeit(lambda: encode(action, value), number=iterations) / iterations
+            dec = timeit.timeit(lambda: decode(frame), number=iterations) / iterations
+            rows.append({
+                "command": f"{action}:{value[:12]}",
+                "codec": name,
+                "bytes": size,
+                "encode_ns": round(enc * 1e9),
+                "decode_ns": round(dec * 1e9),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    rows = run(args.iterations)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'command':<18} {'codec':<12} {'bytes':>6} {'encode ns':>10} {'decode ns':>10}")
+    for row in rows:
+        print(f"{row['command']:<18} {row['codec']:<12} {row['bytes']:>6} {row['encode_ns']:>10} {row['decode_ns']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Speculative chat replies on streamed utterances, off vs on.
+
+--mics clients stream chat utterances to /ws/audio in real time (utterance_start, 100 ms PCM
+chunks, utterance_end). The audio is fake speech (benchmarks/fake_upstreams.speak_pcm) that
+the fake Whisper hears word by word, so interim transcripts of a partial utterance are
+prefixes of the final one, as with a real recognizer. Most utterances end with --tail-ms of
+silence; every --afterthought-every-th adds a last word after a pause, so the speculation made
+during the pause must be cancelled. For each turn we measure utterance_end -> ai_response,
+and check the reply answers the whole utterance (the fake LLM echoes the question).
+
+The server is run twice, SPECULATION=0 then =1; the report compares reply latency and adds
+the server's hit rate and saved latency (GET /api/speculation).
+
+Usage (from the project root):
+    python -m benchmarks.bench_speculation [--mics 4] [--turns 6] [--chat-ms 700] [--stt-ms 300]
+        [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.fake_upstreams import silence_pcm, speak_pcm  # noqa: E402
+from benchmarks.load_test import _free_port, _get_json, _wait_http  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+
+QUESTIONS = [
+    "how far away is the moon from the earth",
+    "what is the capital city of france",
+    "explain how a transistor amplifies a signal",
+    "tell me a short joke about robots",
+    "why is the sky blue during the day",
+    "how do volcanoes erupt",
+]
+AFTERTHOUGHT = "quickly"
+CHUNK_S = 0.1
+
+
+class Run:
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.settled = LatencyHistogram()
+        self.afterthought = LatencyHistogram()
+        self.wrong = 0
+        self.timeouts = 0
+
+
+async def mic(url: str, index: int, args: argparse.Namespace, run: Run) -> None:
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        for turn in range(args.turns):
+            words = f"mic {index} turn {turn} {QUESTIONS[(index + turn) % len(QUESTIONS)]}".split()
+            afterthought = args.afterthought_every and (turn + 1) % args.afterthought_every == 0
+            pcm = speak_pcm(words, args.word_ms / 1000)
+            if afterthought:
+                pcm += silence_pcm(args.pause_ms / 1000) + speak_pcm([AFTERTHOUGHT], args.word_ms / 1000)
+                words.append(AFTERTHOUGHT)
+                pcm += silence_pcm(0.2)
+            else:
+                pcm += silence_pcm(args.tail_ms / 1000)
+
+            await ws.send(json.dumps({"type": "utterance_start"}))
+            chunk = int(CHUNK_S * 16000) * 2
+            next_at = time.perf_counter()
+            for offset in range(0, len(pcm), chunk):
+                await ws.send(pcm[offset:offset + chunk])
+                next_at += CHUNK_S
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))  # real-time pacing
+            await ws.send(json.dumps({"type": "utterance_end"}))
+            ended = time.perf_counter()
+
+            reply = None
+            try:
+                while reply is None:
+                    message = await asyncio.wait_for(ws.recv(), args.timeout)
+                    if isinstance(message, str) and '"ai_response"' in message:
+                        reply = json.loads(message)["text"]
+            except asyncio.TimeoutError:
+                run.timeouts += 1
+                continue
+            elapsed = time.perf_counter() - ended
+            run.latency.record(elapsed)
+            (run.afterthought if afterthought else run.settled).record(elapsed)
+            if not reply.rstrip().endswith(" ".join(words)):
+                run.wrong += 1  # answered a different (partial) question
+            await asyncio.sleep(0.3)
+
+
+async def measure(args: argparse.Namespace, base: str) -> Dict:
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    run = Run()
+    await asyncio.gather(*(mic(url, i, args, run) for i in range(args.mics)))
+    return {
+        "reply_latency": run.latency.snapshot(),
+        "settled_latency": run.settled.snapshot(),
+        "afterthought_latency": run.afterthought.snapshot(),
+        "wrong_replies": run.wrong,
+        "timeouts": run.timeouts,
+        "server": await _get_json(f"{base}/api/speculation"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speculative LLM replies on interim transcripts, off vs on")
+    parser.add_argument("--mics", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=6, help="utterances per mic")
+    parser.add_argument("--word-ms", type=float, default=300.0, help="speaking time per word")
+    parser.add_argument("--tail-ms", type=float, default=600.0, help="silence before utterance_end")
+    parser.add_argument("--pause-ms", type=float, default=1200.0, help="pause before an afterthought word")
+    parser.add_argument("--afterthought-every", type=int, default=3, help="every Nth turn adds a word late (0: never)")
+    parser.add_argument("--chat-ms", type=float, default=700.0)
+    parser.add_argument("--stt-ms", type=float, default=300.0)
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+         "--chat-ms", str(args.chat_ms), "--fast-chat-ms", str(args.chat_ms), "--stt-ms", str(args.stt_ms),
+         "--weather-ms", "40", "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    report: Dict = {"config": vars(args).copy()}
+    report["config"].pop("output")
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        for label, enabled in (("speculation_off", "0"), ("speculation_on", "1")):
+            port = _free_port()
+            env = dict(os.environ)
+            env.update({
+                "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+                "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+                "SPECULATION": enabled,
+            })
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                report[label] = asyncio.run(measure(args, f"http://127.0.0.1:{port}"))
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+    finally:
+        fake.terminate()
+        fake.wait(timeout=15)
+
+    off, on = report["speculation_off"]["reply_latency"], report["speculation_on"]["reply_latency"]
+    if off["p50_ms"] and on["p50_ms"]:
+        report["p50_saved_ms"] = round(off["p50_ms"] - on["p50_ms"], 1)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    failed = any(report[label]["wrong_replies"] or report[label]["timeouts"]
+                 for label in ("speculation_off", "speculation_on"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
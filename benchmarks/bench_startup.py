@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark / regression gate: server startup cost.
+Measures, in fresh interpreters with GROQ_API_KEY unset:
+  - import time of server.main, and that importing it pulls in no upstream SDKs
+  - time from spawning uvicorn to the first accepted /ws/robot WebSocket
+
+The import is split in two: the framework (FRAMEWORK_MODULES, most of the total and outside
+our control) and then server.main itself. The regression gate is on the app's own share,
+--max-app-import-ms, which stays put when the machine is slow or busy; the total only has a
+loose --max-import-ms ceiling.
+
+Exits non-zero when a threshold is exceeded or a heavy module is imported eagerly,
+so it can run in CI as a startup regression test.
+
+Usage (from the project root):
+    python -m benchmarks.bench_startup [--runs 5] [--max-app-import-ms 1000] [--max-import-ms 6000]
+        [--max-ready-ms 6000] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just by importing the app
+LAZY_MODULES = ("groq", "ffmpeg", "numpy", "requests", "httpx")
+# Third-party modules server.main cannot start without; imported first as the baseline
+FRAMEWORK_MODULES = ("asyncio", "fastapi", "sqlalchemy.orm")
+
+_IMPORT_PROBE = (
+    "import importlib, json, sys, time\n"
+    "t = time.perf_counter()\n"
+    f"for m in {FRAMEWORK_MODULES!r}: importlib.import_module(m)\n"
+    "framework = time.perf_counter() - t\n"
+    "import server.main\n"
+    "elapsed = time.perf_counter() - t\n"
+    "print(json.dumps({'seconds': elapsed, 'framework': framework, "
+    f"'eager': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))\n"
+)
+
+
+def _clean_env() -> dict:
+    env = dict(os.environ)
+    env.pop("GROQ_API_KEY", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def measure_import(runs: int) -> dict:
+    times: List[float] = []
+    app_times: List[float] = []
+    eager: List[str] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE],
+            cwd=PROJECT_ROOT, env=_clean_env(), capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["seconds"] * 1000)
+        app_times.append((result["seconds"] - result["framework"]) * 1000)
+        eager = result["eager"]
+    return {
+        "median_ms": round(statistics.median(times), 1),
+        "max_ms": round(max(times), 1),
+        "app_median_ms": round(statistics.median(app_times), 1),
+        "app_max_ms": round(max(app_times), 1),
+        "eager_modules": eager,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_for_socket(url: str, deadline: float) -> bool:
+    import websockets
+    while time.perf_counter() < deadline:
+        try:
+            async with websockets.connect(url, open_timeout=1):
+                return True
+        except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            await asyncio.sleep(0.02)
+    return False
+
+
+def measure_ready(runs: int, timeout: float = 30.0) -> dict:
+    times: List[float] = []
+    for _ in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=_clean_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            ok = asyncio.run(_wait_for_socket(f"ws://127.0.0.1:{port}/ws/robot", started + timeout))
+            if not ok:
+                raise RuntimeError("server never accepted a WebSocket")
+            times.append((time.perf_counter() - started) * 1000)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+    return {"median_ms": round(statistics.median(times), 1), "max_ms": round(max(times), 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-app-import-ms", type=float, default=1000,
+                        help="server.main's own import time, over the framework baseline")
+    parser.add_argument("--max-import-ms", type=float, default=6000, help="total import time, framework included")
+    parser.add_argument("--max-ready-ms", type=float, default=6000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    result = {"import": measure_import(args.runs), "first_socket": measure_ready(args.runs)}
+    failures = []
+    if result["import"]["eager_modules"]:
+        failures.append(f"eagerly imported: {', '.join(result['import']['eager_modules'])}")
+    if result["import"]["app_median_ms"] > args.max_app_import_ms:
+        failures.append(f"app import {result['import']['app_median_ms']} ms > {args.max_app_import_ms} ms")
+    if result["import"]["median_ms"] > args.max_import_ms:
+        failures.append(f"import {result['import']['median_ms']} ms > {args.max_import_ms} ms")
+    if result["first_socket"]["median_ms"] > args.max_ready_ms:
+        failures.append(f"first socket {result['first_socket']['median_ms']} ms > {args.max_ready_ms} ms")
+    result["failures"] = failures
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import server.main : median {result['import']['median_ms']} ms, max {result['import']['max_ms']} ms")
+        print(f"  of which the app : median {result['import']['app_median_ms']} ms, max {result['import']['app_max_ms']} ms")
+        print(f"first /ws/robot    : median {result['first_socket']['median_ms']} ms, max {result['first_socket']['max_ms']} ms")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Uplink codec benchmark: what compressing mic uploads on /ws/audio costs and saves.
+
+For each codec in services/audio_uplink.py (and plain WAV as the baseline) it encodes and
+decodes a set of utterances and reports
+  - bytes on the wire per second of audio and the compression ratio
+  - encode and decode CPU time per second of audio (decode runs on the server)
+  - SNR of the decoded audio against the original, as a cheap proxy for accuracy
+With --stt (needs GROQ_API_KEY) every clip is also transcribed as sent and after the codec
+round trip, and the word error rate between the two is reported; a clip.txt next to a
+--clips clip.wav is used as the reference transcript instead when present.
+With --e2e it starts the fake upstreams and a server and checks that a mic offering the
+ADPCM subprotocol gets it, and that its compressed upload is transcribed and answered.
+
+Opus is measured only where opuslib and the libopus library are installed.
+
+Usage (from the project root):
+    python -m benchmarks.bench_uplink_codec [--clips dir/with/wavs] [--stt] [--e2e]
+        [--output report.json]
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import _free_port, _get_json, _wait_http  # noqa: E402
+from server.services.audio_uplink import (  # noqa: E402
+    ADPCM_PROTOCOL,
+    OPUS_PROTOCOL,
+    SAMPLE_RATE,
+    AdpcmUplink,
+    OpusUplink,
+    opuslib,
+    pcm_to_wav,
+    wav_to_pcm,
+)
+
+
+def synth_utterance(seconds: float, seed: int) -> bytes:
+    """Speech-like 16 kHz PCM: a gliding voiced pitch with formant-ish harmonics, syllable
+    envelopes and breath noise (a pure tone flatters ADPCM)."""
+    rng = random.Random(seed)
+    n = int(seconds * SAMPLE_RATE)
+    pitch = rng.uniform(110, 220)
+    formants = [(rng.uniform(300, 900), 1.0), (rng.uniform(1000, 2200), 0.5), (rng.uniform(2400, 3400), 0.2)]
+    syllable = rng.uniform(3.0, 5.0)
+    phase = 0.0
+    out = bytearray()
+    for i in range(n):
+        t = i / SAMPLE_RATE
+        f0 = pitch * (1 + 0.1 * math.sin(2 * math.pi * 0.7 * t))
+        phase += 2 * math.pi * f0 / SAMPLE_RATE
+        voiced = 0.0
+        for h in range(1, 20):
+            freq = f0 * h
+            if freq > 3800:
+                break
+            gain = sum(g / (1 + ((freq - fc) / 150) ** 2) for fc, g in formants)
+            voiced += gain * math.sin(h * phase) / h
+        envelope = max(0.0, math.sin(math.pi * syllable * t)) ** 0.5 * math.sin(math.pi * i / n)
+        sample = 6000 * envelope * voiced + rng.gauss(0, 200)
+        out += struct.pack("<h", max(-32768, min(32767, int(sample))))
+    return bytes(out)
+
+
+def load_clips(directory: Optional[str], count: int) -> List[Tuple[str, bytes, Optional[str]]]:
+    """(name, 16 kHz mono PCM, reference transcript or None) per clip."""
+    if not directory:
+        return [(f"synth-{i}", synth_utterance(2.0 + i % 3, seed=i), None) for i in range(count)]
+    clips = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with open(path, "rb") as f:
+            pcm = wav_to_pcm(f.read())
+        reference = None
+        if os.path.exists(path[:-4] + ".txt"):
+            with open(path[:-4] + ".txt") as f:
+                reference = f.read().strip()
+        clips.append((os.path.basename(path), pcm, reference))
+    if not clips:
+        raise SystemExit(f"no .wav clips in {directory}")
+    return clips
+
+
+def snr_db(original: bytes, decoded: bytes) -> float:
+    n = min(len(original), len(decoded)) // 2
+    a = struct.unpack(f"<{n}h", original[:n * 2])
+    b = struct.unpack(f"<{n}h", decoded[:n * 2])
+    signal = sum(x * x for x in a)
+    noise = sum((x - y) ** 2 for x, y in zip(a, b))
+    return round(10 * math.log10(signal / noise), 1) if noise else float("inf")
+
+
+def best_lag(original: bytes, decoded: bytes, max_lag: int = 960) -> int:
+    """Codec delay in samples (Opus has a few ms of look-ahead), by cross-correlation."""
+    n = min(len(original), len(decoded)) // 2 - max_lag
+    if n <= 0:
+        return 0
+    a = struct.unpack(f"<{n}h", original[:n * 2])
+    b = struct.unpack(f"<{n + max_lag}h", decoded[:(n + max_lag) * 2])
+    step = max(1, n // 4000)  # a subsample is plenty to find the peak
+    return max(range(0, max_lag, 8), key=lambda lag: sum(a[i] * b[i + lag] for i in range(0, n, step)))
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return round(row[-1] / max(1, len(ref)), 3)
+
+
+def measure(codec, clips: List[Tuple[str, bytes, Optional[str]]], repeat: int) -> Dict:
+    seconds = sum(len(pcm) for _, pcm, _ in clips) / 2 / SAMPLE_RATE
+    wire = 0
+    encode_s = decode_s = 0.0
+    snrs: List[float] = []
+    decoded_clips: List[bytes] = []
+    for _, pcm, _ in clips:
+        for _ in range(repeat):
+            started = time.process_time()
+            message = codec.encode(pcm)
+            encode_s += time.process_time() - started
+            started = time.process_time()
+            decoded = codec.decode(message)
+            decode_s += time.process_time() - started
+        wire += len(message)
+        lag = best_lag(pcm, decoded) if codec.name == "opus" else 0
+        snrs.append(snr_db(pcm, decoded[lag * 2:]))
+        decoded_clips.append(decoded)
+    return {
+        "bytes_per_audio_s": round(wire / seconds),
+        "kbit_per_s": round(wire * 8 / seconds / 1000, 1),
+        "compression_ratio": None,  # filled in against WAV
+        "encode_ms_per_audio_s": round(encode_s / repeat / seconds * 1000, 2),
+        "decode_ms_per_audio_s": round(decode_s / repeat / seconds * 1000, 2),
+        "snr_db_min": min(snrs) if math.isfinite(min(snrs)) else "lossless",
+        "snr_db_mean": round(sum(snrs) / len(snrs), 1) if math.isfinite(min(snrs)) else "lossless",
+        "_wire_bytes": wire,
+        "_decoded": decoded_clips,
+    }
+
+
+class WavBaseline:
+    """What mics sent before: the whole utterance as a WAV file."""
+
+    name = "wav"
+
+    def encode(self, pcm: bytes) -> bytes:
+        return pcm_to_wav(pcm)
+
+    def decode(self, message: bytes) -> bytes:
+        return wav_to_pcm(message)
+
+
+def transcribe_all(clips, results: Dict) -> Dict:
+    """Transcribe the original and every codec's round trip; WER per codec."""
+    from server.services.transcriber import Transcriber
+
+    transcriber = Transcriber()
+    report: Dict = {}
+    references = []
+    for _, pcm, reference in clips:
+        references.append(reference or transcriber.transcribe_audio(pcm_to_wav(pcm)) or "")
+    for codec, result in results.items():
+        if codec == "wav":
+            continue
+        wers = []
+        for reference, decoded in zip(references, result["_decoded"]):
+            heard = transcriber.transcribe_audio(pcm_to_wav(decoded)) or ""
+            wers.append(word_error_rate(reference, heard))
+        report[codec] = {"wer_mean": round(sum(wers) / len(wers), 3), "wer_max": max(wers)}
+    return report
+
+
+async def _e2e(base: str, fake_base: str, pcm: bytes) -> Dict:
+    import websockets
+
+    await _wait_http(f"{fake_base}/__stats", time.monotonic() + 30)
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    before = ((await _get_json(f"{fake_base}/__stats")) or {}).get("calls", {}).get("stt", 0)
+    async with websockets.connect(url, subprotocols=[OPUS_PROTOCOL, ADPCM_PROTOCOL], max_size=None) as ws:
+        negotiated = ws.subprotocol
+        await ws.send(AdpcmUplink().encode(pcm) if negotiated == ADPCM_PROTOCOL else pcm_to_wav(pcm))
+        reply = None
+        try:
+            while reply is None:
+                message = await asyncio.wait_for(ws.recv(), 20)
+                if isinstance(message, str):
+                    reply = message
+        except asyncio.TimeoutError:
+            pass
+    # Plain clients still get plain WAV handling
+    async with websockets.connect(url) as ws:
+        plain = ws.subprotocol
+    after = ((await _get_json(f"{fake_base}/__stats")) or {}).get("calls", {}).get("stt", 0)
+    counters = ((await _get_json(f"{base}/api/metrics?prefix=uplink.")) or {}).get("counters", {})
+    checks = {
+        "best offered codec negotiated": negotiated == (OPUS_PROTOCOL if opuslib is not None else ADPCM_PROTOCOL),
+        "compressed upload transcribed": after - before == 1,
+        "reply received": reply is not None,
+        "no subprotocol for plain clients": plain is None,
+    }
+    return {"negotiated": negotiated, "server_counters": counters, "checks": checks, "passed": all(checks.values())}
+
+
+def run_e2e(pcm: bytes) -> Dict:
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+        "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+    })
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--jitter-ms", "0"],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+    ]
+    try:
+        return asyncio.run(_e2e(base, fake_base, pcm))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark compressed audio uplink codecs")
+    parser.add_argument("--clips", help="directory of 16 kHz mono WAV clips (default: synthetic utterances)")
+    parser.add_argument("--count", type=int, default=6, help="synthetic clips to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="encode/decode runs per clip")
+    parser.add_argument("--stt", action="store_true", help="compare transcripts via Groq Whisper (GROQ_API_KEY)")
+    parser.add_argument("--e2e", action="store_true", help="check negotiation against a live server")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips, args.count)
+    audio_s = sum(len(pcm) for _, pcm, _ in clips) / 2 / SAMPLE_RATE
+    codecs = [WavBaseline(), AdpcmUplink()] + ([OpusUplink()] if opuslib is not None else [])
+    results = {codec.name: measure(codec, clips, args.repeat) for codec in codecs}
+    for result in results.values():
+        result["compression_ratio"] = round(results["wav"]["_wire_bytes"] / result["_wire_bytes"], 2)
+
+    report: Dict = {
+        "clips": len(clips),
+        "audio_seconds": round(audio_s, 1),
+        "codecs": {name: {k: v for k, v in r.items() if not k.startswith("_")} for name, r in results.items()},
+    }
+    if opuslib is None:
+        report["codecs"]["opus"] = "unavailable (install opuslib and libopus)"
+    if args.stt and os.getenv("GROQ_API_KEY"):
+        report["stt"] = transcribe_all(clips, results)
+    else:
+        report["stt"] = "skipped (pass --stt with GROQ_API_KEY set); snr_db is the accuracy proxy"
+    if args.e2e:
+        report["e2e"] = run_e2e(clips[0][1])
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.e2e and not report["e2e"]["passed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
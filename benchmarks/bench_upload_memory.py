@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Server memory under many concurrent large audio uploads, with and without upload budgets.
+
+--clients mics each send --turns utterances of --seconds of 16 kHz PCM at once and wait for
+the replies. The server gets few admission slots (--slots) and a slow fake Whisper, so most
+turns queue while holding their audio. Each phase runs on a fresh server whose RSS is sampled
+from /proc. Server configurations:
+  in_memory  UPLOAD_CONN_MEMORY_KB = UPLOAD_MAX_KB and an unlimited pool: every queued
+             upload stays in memory, as before upload budgets
+  budgeted   UPLOAD_CONN_MEMORY_KB=--conn-kb, UPLOAD_MEMORY_MB=--memory-mb: uploads spill
+             to temp files once the pool is used up
+and mic framings:
+  whole      one WAV message per utterance; the WebSocket layer holds a few copies of each
+             message while reading it, outside any budget
+  chunked    utterance_start {"bytes": N}, --chunk-kb PCM chunks, utterance_end
+Oversized utterances are then sent to a budgeted server and must be refused:
+  declared   utterance_start says {"bytes": N} over UPLOAD_MAX_KB: refused before any audio
+  streamed   no size given: refused once the chunks pass the limit, before utterance_end
+  whole      one message over UPLOAD_MAX_KB (but under uvicorn's --ws-max-size)
+Exits non-zero if budgeted + chunked does not have the lowest peak RSS, the pool went over
+budget, a turn got no reply or an oversized utterance was not refused. Linux only (/proc).
+
+Usage (from the project root):
+    python -m benchmarks.bench_upload_memory [--clients 32] [--turns 1] [--seconds 20]
+        [--stt-ms 1000] [--slots 2] [--memory-mb 8] [--conn-kb 256] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import _free_port, _get_json, _unique, _wait_http, synth_clip  # noqa: E402
+from server.services.audio_uplink import WAV_HEADER_BYTES  # noqa: E402
+from server.services.canned_responses import CANNED_TEXT  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+
+MAX_KB = 2048  # UPLOAD_MAX_KB for both servers
+WS_MAX_SIZE = (MAX_KB + 64) * 1024
+
+
+def rss_mb(pid: int, field: str = "VmRSS") -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return round(int(line.split()[1]) / 1024, 1)  # kB
+    return 0.0
+
+
+async def sample_rss(pid: int, stop: asyncio.Event, samples: List[float]) -> None:
+    while not stop.is_set():
+        samples.append(rss_mb(pid))
+        await asyncio.sleep(0.05)
+
+
+async def reply(ws, timeout: float = 60) -> str:
+    while True:
+        message = await asyncio.wait_for(ws.recv(), timeout)
+        if isinstance(message, str) and '"ai_response"' in message:
+            return json.loads(message)["text"]
+
+
+async def stream(ws, pcm: bytes, chunk: int, declare: bool = True) -> None:
+    start = {"type": "utterance_start", "bytes": len(pcm)} if declare else {"type": "utterance_start"}
+    await ws.send(json.dumps(start))
+    for offset in range(0, len(pcm), chunk):
+        await ws.send(pcm[offset:offset + chunk])
+    await ws.send(json.dumps({"type": "utterance_end"}))
+
+
+async def mic(url: str, clip: bytes, framing: str, args: argparse.Namespace, result: Dict) -> None:
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        for _ in range(args.turns):
+            started = time.perf_counter()
+            audio = _unique(clip)
+            if framing == "chunked":
+                await stream(ws, audio[WAV_HEADER_BYTES:], args.chunk_kb * 1024)
+            else:
+                await ws.send(audio)
+            try:
+                text = await reply(ws, args.timeout)
+            except asyncio.TimeoutError:
+                result["timeouts"] += 1
+                continue
+            result["latency"].record(time.perf_counter() - started)
+            result["busy"] += text == CANNED_TEXT["busy"]
+            result["too_long"] += text == CANNED_TEXT["too_long"]
+
+
+async def measure(args: argparse.Namespace, base: str, pid: int, clip: bytes, framing: str) -> Dict:
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    await asyncio.sleep(0.5)
+    idle = rss_mb(pid)
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    result: Dict = {"latency": LatencyHistogram(), "timeouts": 0, "busy": 0, "too_long": 0}
+    samples: List[float] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, stop, samples))
+    started = time.perf_counter()
+    await asyncio.gather(*(mic(url, clip, framing, args, result) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    uploads = await _get_json(f"{base}/api/uploads") or {}
+    return {
+        "seconds": round(elapsed, 1),
+        "turns": args.clients * args.turns,
+        "turn_latency": result["latency"].snapshot(),
+        "timeouts": result["timeouts"],
+        "busy_replies": result["busy"],
+        "too_long_replies": result["too_long"],
+        "rss_idle_mb": idle,
+        "rss_peak_mb": max(samples + [idle]),
+        "rss_hwm_mb": rss_mb(pid, "VmHWM"),
+        "rss_growth_mb": round(max(samples + [idle]) - idle, 1),
+        "uploads": uploads,
+    }
+
+
+async def oversized(base: str, chunk: int) -> Dict:
+    import websockets
+
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    too_big = os.urandom(MAX_KB * 1024 + 32 * 1024)
+    report: Dict = {}
+    async with websockets.connect(url, max_size=None) as ws:
+        # Declared: the refusal must come before we send anything
+        await ws.send(json.dumps({"type": "utterance_start", "bytes": len(too_big)}))
+        report["declared"] = await reply(ws, 10)
+        await ws.send(json.dumps({"type": "utterance_end"}))
+
+        # Undeclared: refused mid-stream, the rest is dropped without an answer
+        await stream(ws, too_big, chunk, declare=False)
+        report["streamed"] = await reply(ws, 10)
+
+        await ws.send(too_big)
+        report["whole"] = await reply(ws, 10)
+    return report
+
+
+def start_server(port: int, fake_base: str, args: argparse.Namespace, env_extra: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+        "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+        "TTS_BACKEND": "none", "SPECULATION": "0",
+        "ADMISSION_SLOTS": str(args.slots), "ADMISSION_CHAT_SLOTS": str(max(1, args.slots - 1)),
+        "ADMISSION_CHAT_QUEUE": str(args.clients), "ADMISSION_CHAT_WAIT_MS": "60000",
+        "ADMISSION_LISTEN_QUEUE": str(args.clients),
+        "UPSTREAM_BUDGET_MS": str(args.timeout * 1000),  # queued turns must still get transcribed
+        "UPLOAD_MAX_KB": str(MAX_KB),
+    })
+    env.update(env_extra)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning",
+         "--ws-max-size", str(WS_MAX_SIZE)],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server memory under many concurrent large uploads")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=1, help="utterances per client and phase")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of each utterance")
+    parser.add_argument("--chunk-kb", type=int, default=32, help="chunk size of streamed utterances")
+    parser.add_argument("--slots", type=int, default=2, help="ADMISSION_SLOTS: how many turns run at once")
+    parser.add_argument("--memory-mb", type=int, default=8, help="UPLOAD_MEMORY_MB of the budgeted server")
+    parser.add_argument("--conn-kb", type=int, default=256, help="UPLOAD_CONN_MEMORY_KB of the budgeted server")
+    parser.add_argument("--stt-ms", type=float, default=1000.0)
+    parser.add_argument("--timeout", type=float, default=180.0, help="seconds a mic waits for each reply")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/status"):
+        sys.exit("needs Linux /proc to read the server's RSS")
+
+    clip = synth_clip(args.seconds, 300)
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+         "--stt-ms", str(args.stt_ms), "--chat-ms", "100", "--fast-chat-ms", "50", "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    report: Dict = {"config": {k: v for k, v in vars(args).items() if k != "output"}}
+    report["config"]["clip_kb"] = len(clip) // 1024
+    configs = {
+        "in_memory": {"UPLOAD_CONN_MEMORY_KB": str(MAX_KB), "UPLOAD_MEMORY_MB": "100000"},
+        "budgeted": {"UPLOAD_CONN_MEMORY_KB": str(args.conn_kb), "UPLOAD_MEMORY_MB": str(args.memory_mb)},
+    }
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        for label, env_extra in configs.items():
+            for framing in ("whole", "chunked"):
+                port = _free_port()
+                server = start_server(port, fake_base, args, env_extra)
+                try:
+                    base = f"http://127.0.0.1:{port}"
+                    report[f"{label}_{framing}"] = asyncio.run(measure(args, base, server.pid, clip, framing))
+                    if label == "budgeted" and framing == "chunked":
+                        report["oversized"] = asyncio.run(oversized(base, args.chunk_kb * 1024))
+                finally:
+                    stop(server)
+    finally:
+        stop(fake)
+
+    phases = [f"{label}_{framing}" for label in configs for framing in ("whole", "chunked")]
+    report["rss_growth_mb"] = {phase: report[phase]["rss_growth_mb"] for phase in phases}
+    best = report["budgeted_chunked"]
+    report["checks"] = {
+        "budgeted + chunked has the lowest peak RSS": best["rss_growth_mb"] == min(report["rss_growth_mb"].values()),
+        "pool stayed within its budget": all(
+            report[p]["uploads"].get("memory_peak_mb", 1e9) <= report[p]["uploads"].get("memory_budget_mb", 0)
+            for p in phases
+        ),
+        "budgeted uploads spilled": best["uploads"].get("counters", {}).get("upload.spilled", 0) > 0,
+        "every turn answered": not any(report[p]["timeouts"] or report[p]["too_long_replies"] for p in phases),
+        "oversized utterances refused": all(
+            text == CANNED_TEXT["too_long"] for text in report["oversized"].values()
+        ),
+    }
+    failures = [name for name, ok in report["checks"].items() if not ok]
+    report["passed"] = not failures
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
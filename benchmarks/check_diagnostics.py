@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Diagnostics check: the admin profiling endpoints work on a loaded server and are off by default.
+
+Starts the fake upstreams and a server without ADMIN_TOKEN (every /api/admin route must
+answer 404), then one with it while --mics clients keep sending voice turns, and checks
+  - a wrong or missing X-Admin-Token gets 403
+  - a CPU profile returns collapsed stacks that include the server's own frames, and a
+    second profile started meanwhile gets 409
+  - tracemalloc snapshots and a diff across a burst of turns work
+  - the task dump lists the open /ws/audio handlers with their ages
+Turn latency is reported with nothing running, while profiling and while tracing, to show
+what leaving the endpoints compiled in costs. Exits non-zero on failure.
+
+Usage (from the project root):
+    python -m benchmarks.check_diagnostics [--mics 4] [--seconds 4] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import _free_port, _unique, _wait_http, synth_clip  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+
+TOKEN = "check-diagnostics"
+
+
+class Load:
+    """Mics sending turns back to back; latency goes to whichever phase is current."""
+
+    def __init__(self) -> None:
+        self.phase = "idle"
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.stop = asyncio.Event()
+
+    async def mic(self, url: str, clip: bytes) -> None:
+        import websockets
+
+        async with websockets.connect(url, max_size=None) as ws:
+            while not self.stop.is_set():
+                started, phase = time.perf_counter(), self.phase
+                await ws.send(_unique(clip))
+                while not isinstance(await asyncio.wait_for(ws.recv(), 20), str):
+                    pass
+                self.latency.setdefault(phase, LatencyHistogram()).record(time.perf_counter() - started)
+
+
+def start_server(port: int, fake_base: str, token: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+        "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+        "ADMIN_TOKEN": token,
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def check_disabled(base: str) -> Dict:
+    import httpx
+
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    async with httpx.AsyncClient(timeout=10) as client:
+        codes = {
+            path: (await client.get(f"{base}/api/admin{path}", headers={"X-Admin-Token": TOKEN})).status_code
+            for path in ("/tasks", "/memory", "/profile/cpu?seconds=1")
+        }
+    return {"status_codes": codes, "ok": all(code == 404 for code in codes.values())}
+
+
+async def check_enabled(args: argparse.Namespace, base: str) -> Dict:
+    import httpx
+
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    load = Load()
+    clip = synth_clip(1.0, 300)
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    mics = [asyncio.create_task(load.mic(url, clip)) for _ in range(args.mics)]
+    report: Dict = {}
+    admin = {"X-Admin-Token": TOKEN}
+    try:
+        async with httpx.AsyncClient(base_url=f"{base}/api/admin", timeout=args.seconds + 30) as client:
+            report["no_token"] = (await client.get("/tasks")).status_code
+            report["wrong_token"] = (await client.get("/tasks", headers={"X-Admin-Token": "nope"})).status_code
+
+            await asyncio.sleep(args.seconds)  # baseline latency
+
+            load.phase = "profiling"
+            first = asyncio.create_task(client.get(f"/profile/cpu?seconds={args.seconds}", headers=admin))
+            await asyncio.sleep(0.5)
+            report["concurrent_profile"] = (await client.get("/profile/cpu?seconds=1", headers=admin)).status_code
+            response = await first
+            stacks = response.text.splitlines()
+            report["profile"] = {
+                "status": response.status_code,
+                "samples": int(response.headers.get("X-Profile-Samples", 0)),
+                "stacks": len(stacks),
+                "server_stacks": sum("server/" in line for line in stacks),
+                "hottest": sorted(stacks, key=lambda l: -int(l.rsplit(" ", 1)[1]))[:3] if stacks else [],
+            }
+            load.phase = "after_profile"
+            await asyncio.sleep(1)
+
+            started = (await client.post("/memory/start", headers=admin)).json()
+            load.phase = "tracing"
+            first = (await client.post("/memory/snapshot?top=5", headers=admin)).json()
+            await asyncio.sleep(args.seconds)
+            second = (await client.post("/memory/snapshot?top=5", headers=admin)).json()
+            diff = (await client.get(f"/memory/diff?base={first['id']}&top=5&match=server", headers=admin)).json()
+            missing = (await client.get("/memory/diff?base=nope", headers=admin)).status_code
+            await client.post("/memory/stop", headers=admin)
+            load.phase = "after_tracing"
+            report["memory"] = {
+                "started": started.get("tracing"),
+                "snapshots": [first["id"], second["id"]],
+                "traced_mb": second["traced_mb"],
+                "top_sites": [s["where"] for s in second["top"]],
+                "diff_top": [{k: s[k] for k in ("where", "size_diff_kb", "count_diff")} for s in diff["top"]],
+                "unknown_snapshot": missing,
+            }
+
+            tasks = (await client.get("/tasks", headers=admin)).json()
+            handlers = [t for t in tasks["tasks"] if "websocket" in (t["awaiting"] or "") or "websocket" in t["coro"]]
+            report["tasks"] = {
+                "count": tasks["count"],
+                "by_coro": dict(list(tasks["by_coro"].items())[:8]),
+                "oldest": tasks["tasks"][:3],
+                "aged": sum(t["age_s"] is not None for t in tasks["tasks"]),
+            }
+            await asyncio.sleep(1)
+    finally:
+        load.stop.set()
+        await asyncio.gather(*mics, return_exceptions=True)
+
+    report["turn_latency_p50_ms"] = {phase: hist.snapshot()["p50_ms"] for phase, hist in load.latency.items()}
+    report["checks"] = {
+        "403 without token": report["no_token"] == 403 and report["wrong_token"] == 403,
+        "profile returns collapsed stacks": report["profile"]["status"] == 200 and report["profile"]["stacks"] > 0,
+        "profile includes server frames": report["profile"]["server_stacks"] > 0,
+        "second profile refused": report["concurrent_profile"] == 409,
+        "snapshots and diff": bool(report["memory"]["snapshots"][1]) and report["memory"]["unknown_snapshot"] == 404,
+        "task dump has aged tasks": report["tasks"]["aged"] > 0 and bool(handlers),
+    }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the admin profiling and diagnostics endpoints")
+    parser.add_argument("--mics", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=4.0, help="length of each measured phase")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    procs: List[subprocess.Popen] = [subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )]
+    report: Dict = {}
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        port = _free_port()
+        server = start_server(port, fake_base, "")
+        try:
+            report["disabled"] = asyncio.run(check_disabled(f"http://127.0.0.1:{port}"))
+        finally:
+            stop(server)
+        port = _free_port()
+        server = start_server(port, fake_base, TOKEN)
+        try:
+            report["enabled"] = asyncio.run(check_enabled(args, f"http://127.0.0.1:{port}"))
+        finally:
+            stop(server)
+    finally:
+        for proc in procs:
+            stop(proc)
+
+    failures = [name for name, ok in report["enabled"]["checks"].items() if not ok]
+    if not report["disabled"]["ok"]:
+        failures.append("404 when ADMIN_TOKEN is unset")
+    report["passed"] = not failures
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
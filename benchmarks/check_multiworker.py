@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Integration check: several uvicorn workers behaving as one server.
+Starts `uvicorn --workers N` on a shared state backend, attaches a simulated robot (which
+lands on one worker), then over fresh HTTP connections (spread across workers):
+  - sends numbered set_volume commands and checks every one reaches the robot exactly once,
+    including some taken by a worker other than the robot's owner (which must route them);
+    requests continue past --commands until that happens
+  - switches the AI mode and checks /api/status reports it from at least two workers
+Which worker takes a connection is up to the kernel, so both steps keep asking until two
+workers have answered, or --timeout passes.
+
+Exits non-zero on failure. Needs `websockets` and `httpx` (both in server/requirements.txt).
+
+Usage (from the project root):
+    python -m benchmarks.check_multiworker [--workers 2] [--commands 200] [--backend sqlite] [--timeout 30]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Set
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from server.services.robot_protocol import JSON_PROTOCOL, get_codec  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _robot(url: str, received: List[str], ready: asyncio.Event, stop: asyncio.Event) -> None:
+    """Minimal robot: acks sequenced commands and records VOLUME values."""
+    import websockets
+
+    codec = get_codec(JSON_PROTOCOL)
+    seen: Set[int] = set()
+    async with websockets.connect(url, subprotocols=[JSON_PROTOCOL]) as ws:
+        ready.set()
+        while not stop.is_set():
+            try:
+                frame = await asyncio.wait_for(ws.recv(), timeout=0.1)
+            except asyncio.TimeoutError:
+                continue
+            data = codec.decode(frame)
+            seq = data.get("seq")
+            if seq:
+                await ws.send(codec.encode_ack(seq))
+                if seq in seen:
+                    continue  # retransmission
+                seen.add(seq)
+            if data.get("action") == "VOLUME":
+                received.append(data["value"])
+
+
+async def _wait_ready(base: str, deadline: float) -> None:
+    import httpx
+
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base}/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not come up")
+
+
+def _fresh_client():
+    import httpx
+
+    # No keep-alive: every request opens a new connection, so the kernel spreads them over workers
+    return httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=0), timeout=10)
+
+
+async def _statuses(client, base: str, deadline: float) -> Dict[str, dict]:
+    """/api/status by worker_id, asking until two workers have answered or the deadline passes."""
+    statuses: Dict[str, dict] = {}
+    while len(statuses) < 2 and time.monotonic() < deadline:
+        for resp in await asyncio.gather(*(client.get(f"{base}/api/status") for _ in range(10))):
+            status = resp.json()
+            statuses[status["worker_id"]] = status
+        if len(statuses) < 2:
+            await asyncio.sleep(0.2)  # let every worker get back to accept()
+    return statuses
+
+
+async def run_check(port: int, commands: int, timeout: float = 30.0) -> Dict:
+    base = f"http://127.0.0.1:{port}"
+    await _wait_ready(base, time.monotonic() + 30)
+
+    received: List[str] = []
+    ready, stop = asyncio.Event(), asyncio.Event()
+    robot = asyncio.create_task(_robot(f"ws://127.0.0.1:{port}/ws/robot", received, ready, stop))
+    await asyncio.wait_for(ready.wait(), 10)
+    await asyncio.sleep(0.5)  # let the owning worker register
+
+    values = [f"{i / 1000:.3f}" for i in range(1, 1000)]
+    handled_by: Dict[str, str] = {}  # value -> worker that took the POST
+    async with _fresh_client() as client:
+        statuses = await _statuses(client, base, time.monotonic() + timeout)
+        owner = next((w for w, status in statuses.items() if status["robot_connected"]), None)
+
+        # Concurrent batches: sequential connects tend to land on whichever worker is idle.
+        # Past --commands, keep going until some command was taken by a worker that must route it.
+        deadline = time.monotonic() + timeout
+        while values and time.monotonic() < deadline and (
+            len(handled_by) < commands or all(worker == owner for worker in handled_by.values())
+        ):
+            batch, values = values[:20], values[20:]
+            for value, resp in zip(batch, await asyncio.gather(*(
+                client.post(f"{base}/api/command", json={"type": "set_volume", "value": value})
+                for value in batch
+            ))):
+                resp.raise_for_status()
+                handled_by[value] = resp.json()["worker_id"]
+
+        wait_until = time.monotonic() + 5
+        while len(received) < len(handled_by) and time.monotonic() < wait_until:
+            await asyncio.sleep(0.05)
+
+        await client.post(f"{base}/api/command", json={"type": "study_mode"})
+        await asyncio.sleep(0.5)
+        statuses = await _statuses(client, base, time.monotonic() + timeout)
+
+    stop.set()
+    await robot
+
+    got = [float(v) for v in received]
+    missing = sorted(set(float(v) for v in handled_by) - set(got))
+    routed = [v for v, worker in handled_by.items() if worker != owner]
+    routed_delivered = [v for v in routed if float(v) in set(got)]
+    failures = []
+    if owner is None:
+        failures.append("no worker reports the robot as connected")
+    if missing:
+        failures.append(f"{len(missing)} commands never reached the robot")
+    if len(got) != len(set(got)):
+        failures.append(f"{len(got) - len(set(got))} commands delivered twice")
+    if len(statuses) < 2:
+        failures.append(f"requests only reached {len(statuses)} worker(s) in {timeout:.0f}s")
+    if not routed_delivered:
+        failures.append("no command was handled by a worker other than the robot's owner and delivered")
+    modes = {worker: status["ai_mode"] for worker, status in statuses.items()}
+    if any(mode != "study" for mode in modes.values()):
+        failures.append(f"mode did not propagate: {modes}")
+    return {
+        "commands_sent": len(handled_by),
+        "commands_received": len(got),
+        "robot_owner": owner,
+        "commands_by_worker": {w: list(handled_by.values()).count(w) for w in sorted(set(handled_by.values()))},
+        "routed_delivered": len(routed_delivered),
+        "workers_seen": modes,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-worker integration check")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--commands", type=int, default=200, help="at most 999")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "redis"])
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for a second worker to answer")
+    args = parser.parse_args()
+
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.pop("GROQ_API_KEY", None)
+        env["STATE_BACKEND"] = args.backend
+        env["STATE_SQLITE_PATH"] = os.path.join(tmp, "state.db")
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            result = asyncio.run(run_check(port, min(args.commands, 999), args.timeout))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=15)
+
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Resilience check: voice turns against fake upstreams that inject latency tails and faults
+(benchmarks/fake_upstreams.py, reconfigured between phases through POST /__config).
+
+Two servers share the fakes, one with hedging (UPSTREAM_HEDGE=1) and one without:
+  baseline  no faults; every turn answered (also warms up the p95 hedge delays)
+  tail      a few percent of upstream calls take --slow-ms; the hedged server's p99 must
+            be well below the unhedged one's
+  faults    --error-rate of upstream calls fail with 500; retries keep turns answered
+  outage    the large chat model and whisper-large-v3 answer 503; breakers open and turns
+            fall back to the fast model / fallback Whisper model without error replies
+  recovery  faults cleared; after BREAKER_RESET_S the large model serves turns again
+A half-open breaker is also checked in-process: a call whose deadline is already used up
+must not take the probe, so the next call with time left still closes the breaker.
+
+Prints a JSON report and exits non-zero if a phase fails.
+
+Usage (from the project root):
+    python -m benchmarks.check_resilience [--mics 4] [--phase-s 15] [--slow-ms 3000]
+        [--error-rate 0.2] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import Stats, _free_port, _get_json, _wait_http, load_clips, run_mic  # noqa: E402
+from server.services.model_router import LARGE_MODEL  # noqa: E402
+from server.services.resilience import CircuitBreaker, Deadline, Resilience, UpstreamUnavailable  # noqa: E402
+
+BREAKER_RESET_S = 2.0
+
+
+async def _configure(fake_base: str, **fields) -> None:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        (await client.post(f"{fake_base}/__config", json=fields)).raise_for_status()
+
+
+async def _counters(base: str) -> Dict[str, int]:
+    return ((await _get_json(f"{base}/api/metrics")) or {}).get("counters", {})
+
+
+async def _phase(base: str, args: argparse.Namespace, clips: List[bytes], seconds: float) -> Dict:
+    """Run --mics synthetic mics for `seconds`; report latency, errors and server counter deltas."""
+    before = await _counters(base)
+    stats = Stats()
+    stop_at = time.monotonic() + seconds
+    ws_url = base.replace("http", "ws", 1) + "/ws/audio"
+    await asyncio.gather(*(
+        run_mic(ws_url, clips, stats, stop_at, args.think_ms / 1000.0, args.timeout) for _ in range(args.mics)
+    ))
+    after = await _counters(base)
+    c = stats.counters
+    sent = max(1, c["turns_sent"])
+    return {
+        "turns": c["turns_completed"],
+        "e2e_latency": stats.e2e.snapshot(),
+        "timeout_rate": round(c["timeouts"] / sent, 4),
+        "error_reply_rate": round(c["error_replies"] / sent, 4),
+        "server_counters": {
+            k: after[k] - before.get(k, 0)
+            for k in sorted(after)
+            if after[k] != before.get(k, 0) and (k.startswith(("resilience.", "ai.fallback", "pipeline.transcribe.")))
+        },
+    }
+
+
+def check_half_open_probe() -> Dict:
+    """Open a breaker, let it go half-open, call with no time left, then with time left."""
+    resilience = Resilience(hedging=False, max_attempts=1)
+    breaker = resilience.breakers["probe"] = CircuitBreaker("probe", failures=1, reset_after=0.05)
+    with contextlib.redirect_stdout(io.StringIO()):  # keep the breaker's log line out of the report
+        breaker.record_failure()
+    time.sleep(0.1)
+    result: Dict = {"state_before": breaker.state}
+    try:
+        resilience.call("probe", lambda timeout: "ok", deadline=Deadline(0))
+    except UpstreamUnavailable as e:
+        result["expired_call"] = str(e)
+    try:
+        result["next_call"] = resilience.call("probe", lambda timeout: "ok", deadline=Deadline(5))
+    except UpstreamUnavailable as e:
+        result["next_call"] = str(e)
+    result["state_after"] = breaker.state
+    return result
+
+
+def _check(results: Dict, failures: List[str], phase: str, condition: bool, message: str) -> None:
+    results[phase].setdefault("checks", {})[message] = condition
+    if not condition:
+        failures.append(f"{phase}: {message}")
+
+
+async def run_check(args: argparse.Namespace, hedged: str, unhedged: str, fake_base: str) -> Dict:
+    await _wait_http(f"{fake_base}/__stats", time.monotonic() + 30)
+    for base in (hedged, unhedged):
+        await _wait_http(f"{base}/", time.monotonic() + 60)
+    clips = load_clips(None)
+    results: Dict[str, Dict] = {}
+    failures: List[str] = []
+
+    results["half_open"] = check_half_open_probe()
+    _check(results, failures, "half_open",
+           results["half_open"]["next_call"] == "ok" and results["half_open"]["state_after"] == "closed",
+           "an expired deadline does not strand the probe")
+
+    # Both servers see the same clean traffic first, so hedge delays come from real p95s
+    results["baseline"] = await _phase(hedged, args, clips, args.phase_s)
+    await _phase(unhedged, args, clips, args.phase_s)
+    _check(results, failures, "baseline", results["baseline"]["error_reply_rate"] == 0, "no error replies")
+    _check(results, failures, "baseline", results["baseline"]["timeout_rate"] == 0, "no timeouts")
+
+    await _configure(fake_base, slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    results["tail_hedged"] = await _phase(hedged, args, clips, args.phase_s)
+    results["tail_unhedged"] = await _phase(unhedged, args, clips, args.phase_s)
+    await _configure(fake_base, slow_rate=0)
+    p99_on = results["tail_hedged"]["e2e_latency"]["p99_ms"] or 0.0
+    p99_off = results["tail_unhedged"]["e2e_latency"]["p99_ms"] or 0.0
+    results["tail_hedged"]["p99_vs_unhedged"] = round(p99_on / p99_off, 3) if p99_off else None
+    _check(results, failures, "tail_hedged", p99_on < 0.6 * p99_off, "p99 below 60% of the unhedged p99")
+    _check(
+        results, failures, "tail_hedged",
+        any(k.endswith(".hedge_wins") for k in results["tail_hedged"]["server_counters"]), "hedges won",
+    )
+
+    await _configure(fake_base, error_rate=args.error_rate)
+    results["faults"] = await _phase(hedged, args, clips, args.phase_s)
+    await _configure(fake_base, error_rate=0)
+    faults = results["faults"]
+    _check(results, failures, "faults", faults["error_reply_rate"] + faults["timeout_rate"] <= 0.05,
+           "at most 5% of turns lost")
+    _check(results, failures, "faults",
+           any(k.endswith(".retries") for k in faults["server_counters"]), "retries happened")
+
+    await _configure(fake_base, fail_models=[LARGE_MODEL, "whisper-large-v3"])
+    results["outage"] = await _phase(hedged, args, clips, args.phase_s)
+    outage = results["outage"]
+    _check(results, failures, "outage", outage["error_reply_rate"] == 0 and outage["timeout_rate"] == 0,
+           "every turn answered")
+    _check(results, failures, "outage",
+           outage["server_counters"].get("resilience.groq.chat.large.breaker_opened", 0) >= 1, "large-model breaker opened")
+    _check(results, failures, "outage",
+           outage["server_counters"].get("resilience.groq.chat.large.short_circuited", 0) >= 1, "calls short-circuited")
+    _check(results, failures, "outage", outage["server_counters"].get("pipeline.transcribe.fallback", 0) >= 1,
+           "fallback Whisper model used")
+
+    await _configure(fake_base, fail_models=[])
+    await asyncio.sleep(BREAKER_RESET_S + 0.5)
+    results["recovery"] = await _phase(hedged, args, clips, min(args.phase_s, 8.0))
+    health = await _get_json(f"{hedged}/api/upstream/health") or {}
+    results["recovery"]["breakers"] = health.get("breakers", {})
+    _check(results, failures, "recovery",
+           all(b["state"] == "closed" for b in results["recovery"]["breakers"].values()), "all breakers closed again")
+
+    return {
+        "config": {
+            "mics": args.mics, "phase_s": args.phase_s, "slow_rate": args.slow_rate, "slow_ms": args.slow_ms,
+            "error_rate": args.error_rate,
+        },
+        "phases": results,
+        "upstream_calls": await _get_json(f"{fake_base}/__stats"),
+        "passed": not failures,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check hedging, retries and circuit breaking against fake upstreams")
+    parser.add_argument("--mics", type=int, default=4)
+    parser.add_argument("--phase-s", type=float, default=15.0, help="seconds per phase")
+    parser.add_argument("--think-ms", type=float, default=100.0)
+    parser.add_argument("--timeout", type=float, default=15.0, help="seconds to wait for a reply")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="fraction of calls in the latency tail")
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    procs: List[subprocess.Popen] = [subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+         "--chat-ms", "300", "--fast-chat-ms", "100", "--stt-ms", "150", "--weather-ms", "40", "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )]
+    bases = []
+    for hedge in ("1", "0"):
+        port = _free_port()
+        bases.append(f"http://127.0.0.1:{port}")
+        env = dict(os.environ)
+        env.update({
+            "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+            "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+            "UPSTREAM_HEDGE": hedge, "BREAKER_FAILURES": "3", "BREAKER_RESET_S": str(BREAKER_RESET_S),
+        })
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    try:
+        report = asyncio.run(run_check(args, bases[0], bases[1], fake_base))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Retention check: rollup, archive, batched delete and incremental vacuum of interaction_logs.
+
+Builds a throwaway database (server schema, search index, created without auto-vacuum like
+databases from before retention existed) holding --rows turns over the last --days days,
+then runs one retention pass (services/retention.py) while a writer thread keeps inserting
+turns the way the history flusher does, and checks that
+  - daily rollups match the raw rows they replace, and /history/stats serves them
+  - every archived row is in the gzip archive exactly once and gone from the table
+  - nothing newer than the cutoff was touched and the FTS index is still consistent
+  - freed pages were vacuumed (at most one vacuum step left over) and the file shrank
+  - a second pass is a no-op
+The writer's worst insert stall is compared with the same rows removed by one big DELETE
+on a copy of the database. Exits non-zero on failure.
+
+Usage (from the project root):
+    python -m benchmarks.check_retention [--rows 200000] [--days 90] [--retention-days 30]
+        [--output report.json]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from server.database import Base  # noqa: E402
+from server.models import InteractionDailyRollups, InteractionLogs  # noqa: E402
+from server.services.history import daily_stats, install_search_index  # noqa: E402
+from server.services.metrics import LatencyHistogram  # noqa: E402
+from server.services.retention import RetentionJob  # noqa: E402
+
+MODES = ["normal", "normal", "normal", "study", "child", "privacy"]
+
+
+def _sql_ts(value: datetime) -> str:
+    """A datetime the way SQLAlchemy stores it in SQLite, for raw-SQL comparisons."""
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def make_engine(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+def build(engine, rows: int, days: int, now: datetime) -> None:
+    Base.metadata.create_all(bind=engine, tables=[InteractionLogs.__table__, InteractionDailyRollups.__table__])
+    install_search_index(engine)
+    rng = random.Random(3)
+    start = now - timedelta(days=days)
+    step = days * 86400 / rows
+    insert = InteractionLogs.__table__.insert()
+    with engine.begin() as conn:
+        batch: List[dict] = []
+        for i in range(rows):
+            batch.append({
+                "timestamp": start + timedelta(seconds=i * step),
+                "user_text": f"question number {i} about {rng.choice(['sharks', 'stars', 'volcanoes'])}",
+                "robot_response": "Here is an answer with a few more words in it to make rows realistic.",
+                "mode": rng.choice(MODES),
+                "audio_duration": round(rng.uniform(0.5, 5.0), 2) if rng.random() < 0.8 else None,
+            })
+            if len(batch) == 5000:
+                conn.execute(insert, batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+
+
+def truth(engine, before: datetime) -> Dict[tuple, Counter]:
+    """(day, mode) -> turns and audio totals straight from the raw rows."""
+    result: Dict[tuple, Counter] = {}
+    with engine.connect() as conn:
+        for day, mode, turns, audio_turns, audio_seconds in conn.execute(text(
+            "SELECT date(timestamp), coalesce(mode, 'normal'), count(*), count(audio_duration), "
+            "coalesce(sum(audio_duration), 0) FROM interaction_logs WHERE timestamp < :before GROUP BY 1, 2"
+        ), {"before": _sql_ts(before)}):
+            result[(day, mode)] = Counter(turns=turns, audio_turns=audio_turns, audio_seconds=round(audio_seconds, 3))
+    return result
+
+
+class Writer(threading.Thread):
+    """Inserts a small batch every `every` seconds and records how long each insert took."""
+
+    def __init__(self, engine, every: float = 0.01) -> None:
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.every = every
+        self.latency = LatencyHistogram()
+        self.stop = threading.Event()
+        self.rows = 0
+
+    def run(self) -> None:
+        insert = InteractionLogs.__table__.insert()
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            with self.engine.begin() as conn:
+                conn.execute(insert, [{
+                    "timestamp": datetime.utcnow(), "user_text": "live turn while retention runs",
+                    "robot_response": "ok", "mode": "normal", "audio_duration": 1.0,
+                }])
+            self.latency.record(time.perf_counter() - started)
+            self.rows += 1
+            time.sleep(self.every)
+
+
+def with_writer(engine, fn) -> Dict:
+    writer = Writer(engine)
+    writer.start()
+    time.sleep(0.3)
+    started = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - started
+        time.sleep(0.3)
+        writer.stop.set()
+        writer.join()
+    return {"result": result, "seconds": round(elapsed, 2), "writer": writer.latency.snapshot(), "writer_rows": writer.rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the interaction_logs retention job")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--retention-days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="gus-retention-")
+    path = os.path.join(tmpdir, "gus.db")
+    archive_dir = os.path.join(tmpdir, "archive")
+    now = datetime.utcnow()
+    report: Dict = {"config": {k: v for k, v in vars(args).items() if k != "output"}}
+    failures: List[str] = []
+
+    def check(name: str, condition: bool) -> None:
+        report.setdefault("checks", {})[name] = condition
+        if not condition:
+            failures.append(name)
+
+    try:
+        engine = make_engine(path)
+        build(engine, args.rows, args.days, now)
+        job = RetentionJob(engine=engine, archive_dir=archive_dir, retention_days=args.retention_days,
+                           batch=args.batch, pause=0.005)
+        started = time.perf_counter()
+        check("converted to incremental auto-vacuum", job._ensure_incremental_vacuum())
+        report["conversion_seconds"] = round(time.perf_counter() - started, 2)
+
+        cutoff = now - timedelta(days=args.retention_days)
+        expected = truth(engine, datetime.combine(now.date(), datetime.min.time()))
+        with engine.connect() as conn:
+            old_ids = {r[0] for r in conn.execute(text("SELECT id FROM interaction_logs WHERE timestamp < :c"),
+                                                  {"c": _sql_ts(cutoff)})}
+        engine.dispose()
+        shutil.copy(path, path + ".baseline")
+        size_before = os.path.getsize(path)
+
+        # One big DELETE of the same rows, with the same writer running
+        baseline_engine = make_engine(path + ".baseline")
+
+        def single_delete() -> int:
+            with baseline_engine.begin() as conn:
+                return conn.execute(text("DELETE FROM interaction_logs WHERE timestamp < :c"), {"c": _sql_ts(cutoff)}).rowcount
+
+        baseline = with_writer(baseline_engine, single_delete)
+        baseline_engine.dispose()
+        report["single_delete"] = {"seconds": baseline["seconds"], "writer_latency": baseline["writer"]}
+
+        engine = make_engine(path)
+        job.engine = engine
+        run = with_writer(engine, lambda: job.run_once(now))
+        report["retention_pass"] = run["result"]
+        report["retention_writer_latency"] = run["writer"]
+
+        summary = run["result"]
+        check("all rows older than the cutoff archived", summary["rows_archived"] == len(old_ids))
+        with engine.connect() as conn:
+            check("no raw rows older than the cutoff remain", conn.execute(text(
+                "SELECT count(*) FROM interaction_logs WHERE timestamp < :c"),
+                {"c": _sql_ts(datetime.fromisoformat(summary["archive_cutoff"]))},
+            ).scalar() == 0)
+            rolled = {
+                (str(day), mode): Counter(turns=turns, audio_turns=audio_turns, audio_seconds=round(audio_seconds, 3))
+                for day, mode, turns, audio_turns, audio_seconds in conn.execute(text(
+                    "SELECT day, mode, turns, audio_turns, audio_seconds FROM interaction_daily_rollups"))
+            }
+            conn.exec_driver_sql("INSERT INTO interaction_logs_fts(interaction_logs_fts, rank) VALUES ('integrity-check', 1)")
+            # The writer keeps going (and FTS merges free pages of their own), so allow one step's worth
+            report["free_pages_left"] = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            check("vacuumed the freelist down", report["free_pages_left"] <= job.vacuum_pages)
+        check("rollups equal the raw rows they summarize", rolled == expected)
+
+        archived_ids: List[int] = []
+        for name in sorted(os.listdir(archive_dir)):
+            with gzip.open(os.path.join(archive_dir, name), "rt") as f:
+                archived_ids.extend(json.loads(line)["id"] for line in f)
+        check("archive holds every deleted row exactly once",
+              len(archived_ids) == len(set(archived_ids)) and set(archived_ids) == old_ids)
+        report["archive_files"] = sorted(os.listdir(archive_dir))
+        report["archive_mb"] = round(sum(os.path.getsize(os.path.join(archive_dir, n)) for n in os.listdir(archive_dir)) / 1e6, 2)
+
+        engine.dispose()
+        report["db_mb_before"] = round(size_before / 1e6, 1)
+        report["db_mb_after"] = round(os.path.getsize(path) / 1e6, 1)
+        check("database file shrank", os.path.getsize(path) < size_before)
+
+        engine = make_engine(path)
+        job.engine = engine
+        again = job.run_once(now)
+        check("second pass archives nothing", again["rows_archived"] == 0)
+        db = sessionmaker(bind=engine)()
+        stats = daily_stats(db, args.days)
+        db.close()
+        old_turns = sum(c["turns"] for (day, _), c in expected.items() if day >= stats["days"][0]["day"])
+        served = sum(d["turns"] for d in stats["days"] if d["day"] < now.date().isoformat())
+        check("stats endpoint serves the rolled-up totals", served == old_turns)
+
+        report["writer_p99_ms"] = {
+            "single_delete": baseline["writer"]["p99_ms"], "batched_retention": run["writer"]["p99_ms"],
+        }
+        report["writer_max_ms"] = {
+            "single_delete": baseline["writer"]["max_ms"], "batched_retention": run["writer"]["max_ms"],
+        }
+        check("batched deletes stall writers less than one big delete",
+              run["writer"]["max_ms"] < baseline["writer"]["max_ms"])
+        engine.dispose()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    report["passed"] = not failures
+    report["failures"] = failures
+    text_report = json.dumps(report, indent=2, default=str)
+    print(text_report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text_report + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
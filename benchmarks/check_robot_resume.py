@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Robot session resumption check: commands sent while the robot's link is down are replayed
+once it reconnects, without re-running what it already executed and without stale states.
+
+A simulated robot (binary protocol) connects and keeps its session token. Three outages:
+  blip     acks are withheld for privacy_mode (SERVO DOWN, LED OFF executed but unacked),
+           the TCP link is aborted, and while it is down normal_mode (LED GREEN),
+           set_volume 0.3 then 0.5 and a chat turn (SAY) arrive. After a fast reconnect
+           the session must resume and replay exactly SERVO DOWN (re-acked, not executed
+           again), LED GREEN, VOLUME 0.5 and the SAY.
+  long     like blip, but the robot stays away longer than ROBOT_REPLAY_SPEECH_TTL_MS:
+           the LED is replayed, the SAY has expired.
+  expired  the robot stays away longer than ROBOT_RESUME_TTL_S: the token is refused,
+           a new session starts and nothing is replayed.
+The blip is then repeated on a server with sessions off (ROBOT_RESUME_TTL_S=0) to show
+what used to be lost. Exits non-zero on failure.
+
+Usage (from the project root):
+    python -m benchmarks.check_robot_resume [--resume-ttl 5] [--speech-ttl 1.5] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import _free_port, _get_json, _unique, _wait_http, synth_clip  # noqa: E402
+from server.services.robot_protocol import BINARY_PROTOCOL, SESSION_ACTION, get_codec  # noqa: E402
+
+
+class Robot:
+    """Executes each seq once, acks (unless told not to) and keeps its session across drops."""
+
+    def __init__(self, url: str, session_timeout: float = 5.0) -> None:
+        self.url = url
+        self.session_timeout = session_timeout
+        self.codec = get_codec(BINARY_PROTOCOL)
+        self.token: Optional[str] = None
+        self.sessions: List[str] = []
+        self.executed: Dict[int, Tuple[str, str]] = {}
+        self.log: List[Tuple[str, str]] = []  # executed commands since the last connect
+        self.duplicates = 0
+        self.ack = True
+        self.ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._session_seen = asyncio.Event()
+
+    async def connect(self) -> float:
+        """Connect (resuming if we have a token); returns seconds until the session frame."""
+        import websockets
+
+        started = time.perf_counter()
+        self._session_seen.clear()
+        self.log = []
+        url = self.url + (f"&session={self.token}" if self.token else "")
+        self.ws = await websockets.connect(url, subprotocols=[BINARY_PROTOCOL])
+        self._reader = asyncio.create_task(self._read())
+        try:
+            await asyncio.wait_for(self._session_seen.wait(), self.session_timeout)
+        except asyncio.TimeoutError:
+            self.sessions.append("none")  # sessions are off on this server
+        return time.perf_counter() - started
+
+    def drop(self) -> None:
+        """A Wi-Fi drop: the TCP connection dies without a closing handshake."""
+        self.ws.transport.abort()
+        self._reader.cancel()
+
+    async def _read(self) -> None:
+        async for frame in self.ws:
+            data = self.codec.decode(frame)
+            action, value, seq = data.get("action"), data.get("value"), data.get("seq")
+            if action == SESSION_ACTION:
+                self.token, _, state = value.partition("/")
+                if state != "resumed":
+                    self.executed.clear()
+                self.sessions.append(state)
+                self._session_seen.set()
+                continue
+            if not seq:
+                continue
+            if self.ack:
+                await self.ws.send(self.codec.encode_ack(seq))
+            if seq in self.executed:
+                self.duplicates += 1
+                continue
+            self.executed[seq] = (action, value)
+            self.log.append((action, value))
+
+
+async def command(client, base: str, kind: str, value=None) -> None:
+    body = {"type": kind} if value is None else {"type": kind, "value": value}
+    (await client.post(f"{base}/api/command", json=body)).raise_for_status()
+
+
+async def chat_turn(base: str, clip: bytes) -> None:
+    import websockets
+
+    async with websockets.connect(base.replace("http", "ws", 1) + "/ws/audio", max_size=None) as ws:
+        await ws.send(_unique(clip))
+        while '"ai_response"' not in str(await asyncio.wait_for(ws.recv(), 20)):
+            pass
+    await asyncio.sleep(0.2)  # the SAY follows the reply to the mic
+
+
+async def outage(robot: Robot, client, base: str, clip: bytes, linger: float, chat: bool = True) -> Dict:
+    """privacy_mode unacked, drop, changes while away, reconnect `linger` seconds after the last one."""
+    robot.ack = False
+    await command(client, base, "privacy_mode")
+    await asyncio.sleep(0.2)
+    robot.drop()
+    dropped = time.perf_counter()
+    await asyncio.sleep(0.2)  # the server notices the reset
+    await command(client, base, "normal_mode")
+    await command(client, base, "set_volume", 0.3)
+    await command(client, base, "set_volume", 0.5)
+    if chat:
+        await chat_turn(base, clip)
+    await asyncio.sleep(linger)
+    robot.ack = True
+    duplicates = robot.duplicates
+    session_s = await robot.connect()
+    await asyncio.sleep(1.0)  # let the replay finish
+    return {
+        "away_s": round(time.perf_counter() - dropped - 1.0, 2),
+        "session": robot.sessions[-1],
+        "session_frame_ms": round(session_s * 1000, 1),
+        "executed_after_reconnect": [f"{a} {v}" if a != "SAY" else "SAY ..." for a, v in robot.log],
+        "duplicates_reacked": robot.duplicates - duplicates,
+    }
+
+
+def actions(result: Dict) -> List[str]:
+    return sorted(result["executed_after_reconnect"])
+
+
+async def run_sessions(args: argparse.Namespace, base: str) -> Dict:
+    import httpx
+
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    clip = synth_clip(1.0, 300)
+    robot = Robot(base.replace("http", "ws", 1) + "/ws/robot?device_id=resume")
+    report: Dict = {}
+    async with httpx.AsyncClient(timeout=20) as client:
+        await robot.connect()
+        await command(client, base, "normal_mode")
+        await asyncio.sleep(0.3)
+        report["blip"] = await outage(robot, client, base, clip, linger=0.1)
+        report["long"] = await outage(robot, client, base, clip, linger=args.speech_ttl + 0.5)
+        report["expired"] = await outage(robot, client, base, clip, linger=args.resume_ttl + 1.0, chat=False)
+        robot.drop()
+    report["server"] = (await _get_json(f"{base}/api/robot/metrics") or {}).get("counters", {})
+    blip, long, expired = report["blip"], report["long"], report["expired"]
+    report["checks"] = {
+        "blip resumed": blip["session"] == "resumed",
+        "blip replays only the latest states and the SAY": actions(blip) == ["LED GREEN", "SAY ...", "VOLUME 0.5"],
+        "executed-but-unacked SERVO re-acked, not re-executed": blip["duplicates_reacked"] >= 1,
+        "long outage: SAY expired, states replayed": long["session"] == "resumed"
+        and actions(long) == ["LED GREEN", "VOLUME 0.5"],
+        "expired session starts fresh, nothing replayed": expired["session"] == "new"
+        and not expired["executed_after_reconnect"],
+    }
+    return report
+
+
+async def run_without(base: str) -> Dict:
+    import httpx
+
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    robot = Robot(base.replace("http", "ws", 1) + "/ws/robot?device_id=resume", session_timeout=0.5)
+    async with httpx.AsyncClient(timeout=20) as client:
+        await robot.connect()
+        result = await outage(robot, client, base, synth_clip(1.0, 300), linger=0.1)
+        robot.drop()
+    return result
+
+
+def start_server(port: int, fake_base: str, resume_ttl: float, speech_ttl: float) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+        "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+        "TTS_BACKEND": "none", "SPECULATION": "0",
+        "ROBOT_RESUME_TTL_S": str(resume_ttl), "ROBOT_REPLAY_SPEECH_TTL_MS": str(speech_ttl * 1000),
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def stop(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check robot session resumption and command replay")
+    parser.add_argument("--resume-ttl", type=float, default=5.0, help="ROBOT_RESUME_TTL_S for the server")
+    parser.add_argument("--speech-ttl", type=float, default=1.5, help="ROBOT_REPLAY_SPEECH_TTL_MS / 1000")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--jitter-ms", "20"],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    report: Dict = {"config": {"resume_ttl_s": args.resume_ttl, "speech_ttl_s": args.speech_ttl}}
+    try:
+        asyncio.run(_wait_http(f"{fake_base}/__stats", time.monotonic() + 30))
+        port = _free_port()
+        server = start_server(port, fake_base, args.resume_ttl, args.speech_ttl)
+        try:
+            report["sessions_on"] = asyncio.run(run_sessions(args, f"http://127.0.0.1:{port}"))
+        finally:
+            stop(server)
+        port = _free_port()
+        server = start_server(port, fake_base, 0, args.speech_ttl)
+        try:
+            report["sessions_off_blip"] = asyncio.run(run_without(f"http://127.0.0.1:{port}"))
+        finally:
+            stop(server)
+    finally:
+        stop(fake)
+
+    failures = [name for name, ok in report["sessions_on"]["checks"].items() if not ok]
+    report["passed"] = not failures
+    report["failures"] = failures
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
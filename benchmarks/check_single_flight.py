@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Single-flight check: identical concurrent requests must share one upstream call.
+Starts the fake upstreams (benchmarks/fake_upstreams.py) and a server, then:
+  text      N sockets send the same plain-text chat at once     -> 1 chat call
+  audio     N sockets upload the same clip at once              -> 1 transcription
+  resend    the same clip again after it was answered           -> 0 transcriptions
+  distinct  N different clips at once                           -> N transcriptions
+Every socket must still get its reply. Exits non-zero on failure.
+
+Usage (from the project root):
+    python -m benchmarks.check_single_flight [--clients 12]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Union
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import _free_port, _get_json, _unique, _wait_http, synth_clip  # noqa: E402
+
+
+async def _ask(url: str, payload: Union[str, bytes], timeout: float) -> bool:
+    import websockets
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(payload)
+        try:
+            while True:
+                if isinstance(await asyncio.wait_for(ws.recv(), timeout), str):
+                    return True
+        except asyncio.TimeoutError:
+            return False
+
+
+async def _upstream_calls(fake_base: str) -> Dict[str, int]:
+    return ((await _get_json(f"{fake_base}/__stats")) or {}).get("calls", {})
+
+
+async def _round(url: str, fake_base: str, payloads: List[Union[str, bytes]], timeout: float) -> Dict:
+    before = await _upstream_calls(fake_base)
+    started = time.perf_counter()
+    answered = await asyncio.gather(*(_ask(url, p, timeout) for p in payloads))
+    elapsed = time.perf_counter() - started
+    after = await _upstream_calls(fake_base)
+    delta = {k: after[k] - before.get(k, 0) for k in after if after[k] != before.get(k, 0)}
+    return {
+        "requests": len(payloads),
+        "answered": sum(answered),
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "chat_calls": delta.get("chat", 0) + delta.get("chat_fast", 0),
+        "stt_calls": delta.get("stt", 0),
+        "upstream_calls": delta,
+    }
+
+
+async def run_check(args: argparse.Namespace, base: str, fake_base: str) -> Dict:
+    await _wait_http(f"{fake_base}/__stats", time.monotonic() + 30)
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    url = base.replace("http", "ws", 1) + "/ws/audio"
+    clip = synth_clip(1.5, 300)
+    n = args.clients
+
+    rounds = {
+        "text": await _round(url, fake_base, ["What is the speed of light?"] * n, args.timeout),
+        "audio": await _round(url, fake_base, [clip] * n, args.timeout),
+        "resend": await _round(url, fake_base, [clip], args.timeout),
+        "distinct": await _round(url, fake_base, [_unique(clip) for _ in range(n)], args.timeout),
+    }
+    expected = {
+        "text": ("chat_calls", 1),
+        "audio": ("stt_calls", 1),
+        "resend": ("stt_calls", 0),
+        "distinct": ("stt_calls", n),
+    }
+    failures: List[str] = []
+    for name, (field, value) in expected.items():
+        result = rounds[name]
+        if result["answered"] != result["requests"]:
+            failures.append(f"{name}: {result['answered']}/{result['requests']} answered")
+        if result[field] != value:
+            failures.append(f"{name}: {field}={result[field]}, expected {value}")
+    server = await _get_json(f"{base}/api/metrics?prefix=singleflight.") or {}
+    return {
+        "clients": n,
+        "rounds": rounds,
+        "server_counters": server.get("counters", {}),
+        "passed": not failures,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check single-flight coalescing of identical upstream requests")
+    parser.add_argument("--clients", type=int, default=12)
+    parser.add_argument("--timeout", type=float, default=20.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+        "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+    })
+    # Slow enough upstreams that all identical requests overlap
+    procs: List[subprocess.Popen] = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+             "--chat-ms", "800", "--fast-chat-ms", "800", "--stt-ms", "800", "--jitter-ms", "0"],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ),
+    ]
+    try:
+        report = asyncio.run(run_check(args, base, fake_base))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Fake upstream APIs for load testing: Groq chat + Whisper transcription and OpenWeatherMap.
+Small chat models (names containing "instant" or "8b") get their own, shorter latency.
+Each route sleeps for a configurable latency (plus uniform jitter) and can fail a fraction
+of requests with HTTP 500, so server capacity can be measured without real API keys.
+For resilience tests a fraction of requests can be made very slow (--slow-rate/--slow-ms, a
+latency tail) and named models can be taken down entirely (--fail-models); all of these can
+be changed at runtime with POST /__config.
+
+With --recording, the transcripts and LLM replies captured by the session recorder are
+served back in order instead (deterministic replay, see benchmarks/replay_session.py).
+A WAV clip carrying a "gusp" RIFF chunk (tag_clip) is always transcribed as that chunk's
+text, so a benchmark can send specific utterances (e.g. an alarm) among the rotation.
+Audio made with speak_pcm is "heard" word by word: a transcription of the first part of
+such an utterance returns only the words spoken completely so far, like interim results
+of a real recognizer (see benchmarks/bench_speculation.py).
+
+Point the server at it with:
+    GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:9100
+    OPENWEATHER_API_KEY=fake OPENWEATHER_URL=http://127.0.0.1:9100/data/2.5/weather
+
+Usage (from the project root):
+    python -m benchmarks.fake_upstreams [--port 9100] [--chat-ms 400] [--stt-ms 250] [--weather-ms 80]
+"""
+
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import struct
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# What the fake Whisper "hears", in rotation. Chat dominates; the mode switches exercise the
+# canned-reply and robot-command paths. Each phrase produces exactly one reply frame.
+DEFAULT_PHRASES: List[str] = [
+    "What is the capital of France?",
+    "Explain how a transistor works.",
+    "Tell me a short joke.",
+    "Switch to study mode.",
+    "What is Ohm's law?",
+    "Give me a tip for my exams.",
+    "Back to normal mode.",
+    "How far away is the Moon?",
+]
+
+
+PHRASE_CHUNK = b"gusp"
+
+
+def tag_clip(clip: bytes, text: str) -> bytes:
+    """Append a "gusp" chunk holding the transcript the fake Whisper should return for clip."""
+    payload = text.encode("utf-8")
+    if len(payload) % 2:
+        payload += b" "  # RIFF chunks are word aligned
+    tagged = clip + PHRASE_CHUNK + struct.pack("<I", len(payload)) + payload
+    return tagged[:4] + struct.pack("<I", len(tagged) - 8) + tagged[8:]
+
+
+def _tagged_phrase(data: bytes) -> Optional[str]:
+    at = data.rfind(PHRASE_CHUNK)
+    if at < 12 or len(data) < at + 8:
+        return None
+    (length,) = struct.unpack_from("<I", data, at + 4)
+    return data[at + 8:at + 8 + length].decode("utf-8", "replace").strip() or None
+
+
+# A spoken word: this marker, the word's length in samples and byte count, the UTF-8 bytes one
+# per sample, then a quiet tone up to the word's length. Markers are louder than the tone.
+WORD_MARK = struct.pack("<4h", 32100, -32100, 32000, -32000)
+SAMPLE_RATE = 16000
+
+
+def speak_pcm(words: List[str], seconds_per_word: float = 0.35) -> bytes:
+    """16 kHz PCM that the fake Whisper transcribes as `words`, one word per seconds_per_word."""
+    per_word = int(seconds_per_word * SAMPLE_RATE)
+    out = bytearray()
+    for word in words:
+        payload = word.encode("utf-8")
+        header = WORD_MARK + struct.pack("<2h", per_word // 16, len(payload))
+        samples = list(payload) + [
+            int(3000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)) for i in range(per_word - 6 - len(payload))
+        ]
+        out += header + struct.pack(f"<{len(samples)}h", *samples)
+    return bytes(out)
+
+
+def silence_pcm(seconds: float) -> bytes:
+    return bytes(2 * int(seconds * SAMPLE_RATE))
+
+
+def _spoken_phrase(data: bytes) -> Optional[str]:
+    """Words of speak_pcm audio that are complete in data; None if it holds no spoken words."""
+    words: List[str] = []
+    at = data.find(WORD_MARK)
+    if at < 0:
+        return None
+    while at >= 0:
+        length, size = struct.unpack_from("<2h", data, at + len(WORD_MARK)) if len(data) >= at + 12 else (0, 0)
+        if not length or at + length * 32 > len(data):
+            break  # still being spoken
+        start = at + len(WORD_MARK) + 4
+        words.append(bytes(data[start:start + size * 2:2]).decode("utf-8", "replace"))
+        at = data.find(WORD_MARK, at + length * 32)
+    return " ".join(words)
+
+
+class FakeUpstreamConfig:
+    """Per-route latency in milliseconds, jitter and failure rate."""
+
+    def __init__(
+        self,
+        chat_ms: float = 400.0,
+        fast_chat_ms: float = 120.0,
+        stt_ms: float = 250.0,
+        weather_ms: float = 80.0,
+        jitter_ms: float = 50.0,
+        error_rate: float = 0.0,
+        phrases: Optional[List[str]] = None,
+        replies: Optional[List[str]] = None,
+        slow_rate: float = 0.0,
+        slow_ms: float = 3000.0,
+        fail_models: Optional[List[str]] = None,
+    ) -> None:
+        self.latency_ms: Dict[str, float] = {
+            "chat": chat_ms, "chat_fast": fast_chat_ms, "stt": stt_ms, "weather": weather_ms,
+        }
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.phrases = phrases or DEFAULT_PHRASES
+        self.replies = replies  # None: echo a canned answer to the question
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.fail_models = set(fail_models or ())  # answered with 503
+
+
+def build_app(config: FakeUpstreamConfig) -> FastAPI:
+    app = FastAPI(title="Gus fake upstreams")
+    phrases = itertools.cycle(config.phrases)
+    replies = itertools.cycle(config.replies) if config.replies else None
+    calls: Counter = Counter()
+    errors: Counter = Counter()
+
+    async def simulate(route: str, model: str = "") -> Optional[JSONResponse]:
+        calls[route] += 1
+        if model and model in config.fail_models:
+            errors[route] += 1
+            return JSONResponse({"error": {"message": f"{model} is over capacity"}}, status_code=503)
+        latency = config.latency_ms[route] + random.uniform(-1, 1) * config.jitter_ms
+        if config.slow_rate and random.random() < config.slow_rate:
+            calls[f"{route}_slow"] += 1
+            latency = config.slow_ms
+        await asyncio.sleep(max(0.0, latency) / 1000.0)
+        if config.error_rate and random.random() < config.error_rate:
+            errors[route] += 1
+            return JSONResponse({"error": {"message": f"injected {route} failure"}}, status_code=500)
+        return None
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        failure = await simulate("chat_fast" if ("instant" in model or "8b" in model) else "chat", model)
+        if failure:
+            return failure
+        question = body["messages"][-1]["content"]
+        answer = next(replies) if replies else f"Here is a short answer to: {question}"
+        return {
+            "id": f"chatcmpl-fake-{calls['chat']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "system_fingerprint": "fake",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 20, "total_tokens": 140},
+        }
+
+    @app.post("/openai/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()  # drain the upload like the real API would
+        failure = await simulate("stt", str(form.get("model", "")))
+        if failure:
+            return failure
+        upload = form.get("file")
+        data = await upload.read() if hasattr(upload, "read") else b""
+        spoken = _tagged_phrase(data)
+        if spoken is None:
+            spoken = _spoken_phrase(data)
+        return {"text": spoken if spoken is not None else next(phrases)}
+
+    @app.get("/data/2.5/weather")
+    async def weather():
+        failure = await simulate("weather")
+        if failure:
+            return failure
+        return {"main": {"temp": 28.0}, "weather": [{"description": "clear sky"}], "name": "Pune"}
+
+    @app.get("/__stats")
+    async def stats():
+        return {"calls": dict(calls), "errors": dict(errors), "latency_ms": config.latency_ms}
+
+    @app.post("/__config")
+    async def reconfigure(request: Request):
+        """Change fault injection at runtime: error_rate, slow_rate, slow_ms, fail_models, reset."""
+        body = await request.json()
+        for key in ("error_rate", "slow_rate", "slow_ms"):
+            if key in body:
+                setattr(config, key, float(body[key]))
+        if "fail_models" in body:
+            config.fail_models = set(body["fail_models"])
+        if body.get("reset"):
+            calls.clear()
+            errors.clear()
+        return {
+            "error_rate": config.error_rate, "slow_rate": config.slow_rate, "slow_ms": config.slow_ms,
+            "fail_models": sorted(config.fail_models),
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Groq / OpenWeatherMap server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--chat-ms", type=float, default=400.0)
+    parser.add_argument("--fast-chat-ms", type=float, default=120.0, help="latency of small models (*instant*, *8b*)")
+    parser.add_argument("--stt-ms", type=float, default=250.0)
+    parser.add_argument("--weather-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--fail-models", default="", help="comma-separated models answered with 503")
+    parser.add_argument("--recording", help="serve the transcripts and replies captured in this session recording")
+    args = parser.parse_args()
+
+    import uvicorn
+    phrases = replies = None
+    if args.recording:
+        from server.services.recorder import K_REPLY, K_TRANSCRIPT, RecordingReader
+        reader = RecordingReader(args.recording)
+        phrases, replies = reader.annotations(K_TRANSCRIPT), reader.annotations(K_REPLY)
+    config = FakeUpstreamConfig(
+        args.chat_ms, args.fast_chat_ms, args.stt_ms, args.weather_ms, args.jitter_ms, args.error_rate,
+        phrases, replies, args.slow_rate, args.slow_ms, [m for m in args.fail_models.split(",") if m],
+    )
+    uvicorn.run(build_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
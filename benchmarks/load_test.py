@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: N synthetic mics and M simulated robots against the server, with
+Groq and OpenWeatherMap replaced by local fakes (benchmarks/fake_upstreams.py).
+
+By default it starts the fakes and a server (uvicorn, --workers W) itself, wired together
+through GROQ_BASE_URL / OPENWEATHER_URL. Pass --server to target an already running server
+instead (configure its upstream URLs yourself; the fakes are still started on --fake-port).
+
+Each mic keeps one /ws/audio connection and loops: send a WAV clip, wait for the reply frame,
+think, repeat. Each robot connects to /ws/robot (binary protocol), acks commands and streams
+telemetry; the server holds one robot link, so commands go to the robot that connected last.
+
+The JSON report has throughput, end-to-end latency percentiles, server-side per-stage
+percentiles (GET /api/metrics: pipeline.*, upstream.*, robot.*), error rates and upstream
+call counts, for comparing runs.
+
+Usage (from the project root):
+    python -m benchmarks.load_test [--mics 8] [--robots 2] [--duration 30] [--workers 1]
+        [--clips DIR] [--chat-ms 400] [--fast-chat-ms 120] [--stt-ms 250] [--weather-ms 80]
+        [--error-rate 0] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import glob
+import io
+import json
+import math
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from server.services.metrics import LatencyHistogram  # noqa: E402
+from server.services.robot_protocol import BINARY_PROTOCOL, get_codec  # noqa: E402
+
+SAMPLE_RATE = 16000
+ERROR_REPLY = "I'm having trouble processing that right now. Please try again."
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def synth_clip(seconds: float, freq: float) -> bytes:
+    """16 kHz mono 16-bit WAV: a tone with a little noise, shaped like an utterance."""
+    n = int(seconds * SAMPLE_RATE)
+    samples = (
+        int(8000 * math.sin(2 * math.pi * freq * i / SAMPLE_RATE) * math.sin(math.pi * i / n) + random.gauss(0, 300))
+        for i in range(n)
+    )
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(b"".join(struct.pack("<h", max(-32768, min(32767, s))) for s in samples))
+    return buf.getvalue()
+
+
+def _unique(clip: bytes) -> bytes:
+    """Randomize the last sample so every send is a distinct utterance (the server dedups identical uploads)."""
+    return clip[:-2] + os.urandom(2)
+
+
+def load_clips(directory: Optional[str]) -> List[bytes]:
+    if directory:
+        clips = [open(path, "rb").read() for path in sorted(glob.glob(os.path.join(directory, "*.wav")))]
+        if not clips:
+            raise SystemExit(f"no .wav clips in {directory}")
+        return clips
+    return [synth_clip(1.0, 220), synth_clip(2.0, 330), synth_clip(3.0, 440)]
+
+
+class Stats:
+    """Client-side counters and latency shared by all synthetic clients."""
+
+    def __init__(self) -> None:
+        self.e2e = LatencyHistogram()
+        self.counters: Dict[str, int] = {
+            "turns_sent": 0, "turns_completed": 0, "timeouts": 0, "error_replies": 0, "connect_errors": 0,
+            "robot_commands": 0, "robot_duplicates": 0, "robot_audio_frames": 0, "telemetry_sent": 0,
+        }
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+
+async def run_mic(url: str, clips: List[bytes], stats: Stats, stop_at: float, think: float, timeout: float) -> None:
+    import websockets
+
+    try:
+        ws = await websockets.connect(url, max_size=None, open_timeout=10)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        stats.incr("connect_errors")
+        return
+    replies: asyncio.Queue = asyncio.Queue()
+
+    async def reader() -> None:
+        async for message in ws:
+            if isinstance(message, str):
+                replies.put_nowait(message)
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        while time.monotonic() < stop_at and not reader_task.done():
+            while not replies.empty():  # late frames of a timed-out turn
+                replies.get_nowait()
+            clip = _unique(random.choice(clips))
+            started = time.perf_counter()
+            stats.incr("turns_sent")
+            await ws.send(clip)
+            try:
+                reply = await asyncio.wait_for(replies.get(), timeout)
+            except asyncio.TimeoutError:
+                stats.incr("timeouts")
+                continue
+            stats.e2e.record(time.perf_counter() - started)
+            stats.incr("turns_completed")
+            try:
+                if json.loads(reply).get("text") == ERROR_REPLY:
+                    stats.incr("error_replies")
+            except (ValueError, AttributeError):
+                pass
+            await asyncio.sleep(random.uniform(0.5, 1.5) * think)
+    except websockets.exceptions.ConnectionClosed:
+        stats.incr("connect_errors")
+    finally:
+        reader_task.cancel()
+        await ws.close()
+
+
+async def run_robot(url: str, stats: Stats, stop_at: float, telemetry_hz: float) -> None:
+    import websockets
+
+    codec = get_codec(BINARY_PROTOCOL)
+    seen = set()
+    try:
+        ws = await websockets.connect(url, subprotocols=[BINARY_PROTOCOL], open_timeout=10)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        stats.incr("connect_errors")
+        return
+
+    async def telemetry() -> None:
+        while telemetry_hz > 0:
+            await ws.send(codec.encode_telemetry({
+                "battery": random.uniform(60, 100), "temperature": random.uniform(30, 45),
+                "rssi": random.randint(-80, -40), "mic_level": random.random(),
+            }))
+            stats.incr("telemetry_sent")
+            await asyncio.sleep(1.0 / telemetry_hz)
+
+    sender = asyncio.create_task(telemetry())
+    try:
+        while time.monotonic() < stop_at:
+            try:
+                frame = await asyncio.wait_for(ws.recv(), max(0.01, stop_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            data = codec.decode(frame)
+            if data.get("action") == "AUDIO_FRAME":
+                stats.incr("robot_audio_frames")
+                continue
+            seq = data.get("seq")
+            if seq:
+                await ws.send(codec.encode_ack(seq))
+                if seq in seen:
+                    stats.incr("robot_duplicates")
+                    continue
+                seen.add(seq)
+            stats.incr("robot_commands")
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        sender.cancel()
+        await ws.close()
+
+
+async def _wait_http(url: str, deadline: float) -> None:
+    import httpx
+
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+async def _get_json(url: str) -> Optional[dict]:
+    import httpx
+
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            return (await client.get(url)).json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def run_load(args: argparse.Namespace, base: str, fake_base: str) -> dict:
+    await _wait_http(f"{fake_base}/__stats", time.monotonic() + 30)
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+
+    clips = load_clips(args.clips)
+    stats = Stats()
+    ws_base = base.replace("http", "ws", 1)
+    started = time.monotonic()
+    stop_at = started + args.duration
+
+    robots = []
+    for i in range(args.robots):
+        robots.append(asyncio.create_task(
+            run_robot(f"{ws_base}/ws/robot?device_id=load-robot-{i}", stats, stop_at, args.telemetry_hz)
+        ))
+        await asyncio.sleep(0.05)
+    mics = [
+        asyncio.create_task(run_mic(f"{ws_base}/ws/audio", clips, stats, stop_at, args.think_ms / 1000.0, args.timeout))
+        for _ in range(args.mics)
+    ]
+    await asyncio.gather(*mics)
+    elapsed = time.monotonic() - started
+    await asyncio.gather(*robots)
+
+    server_metrics = await _get_json(f"{base}/api/metrics") or {}
+    c = stats.counters
+    sent = max(1, c["turns_sent"])
+    return {
+        "config": {
+            "mics": args.mics, "robots": args.robots, "duration_s": args.duration, "workers": args.workers,
+            "think_ms": args.think_ms, "clips": len(clips),
+            "upstream_ms": {
+                "chat": args.chat_ms, "chat_fast": args.fast_chat_ms, "stt": args.stt_ms, "weather": args.weather_ms,
+            },
+            "upstream_error_rate": args.error_rate,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "throughput": {
+            "turns_per_s": round(c["turns_completed"] / elapsed, 3),
+            "robot_commands_per_s": round(c["robot_commands"] / elapsed, 3),
+        },
+        "e2e_latency": stats.e2e.snapshot(),
+        "errors": {
+            "timeout_rate": round(c["timeouts"] / sent, 4),
+            "error_reply_rate": round(c["error_replies"] / sent, 4),
+            "connect_errors": c["connect_errors"],
+        },
+        "counters": c,
+        "server_stages": server_metrics.get("histograms", {}),
+        "server_counters": server_metrics.get("counters", {}),
+        "upstream_calls": await _get_json(f"{fake_base}/__stats"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test with fake upstreams")
+    parser.add_argument("--mics", type=int, default=8)
+    parser.add_argument("--robots", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="mean pause between a reply and the next clip")
+    parser.add_argument("--timeout", type=float, default=20.0, help="seconds to wait for a reply")
+    parser.add_argument("--telemetry-hz", type=float, default=1.0)
+    parser.add_argument("--clips", help="directory of .wav clips (default: synthesized 16 kHz tones)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the server")
+    parser.add_argument("--server", help="target a running server, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--fake-port", type=int, default=0, help="fake upstream port (default: random)")
+    parser.add_argument("--chat-ms", type=float, default=400.0)
+    parser.add_argument("--fast-chat-ms", type=float, default=120.0)
+    parser.add_argument("--stt-ms", type=float, default=250.0)
+    parser.add_argument("--weather-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_port = args.fake_port or _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    procs: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port),
+             "--chat-ms", str(args.chat_ms), "--fast-chat-ms", str(args.fast_chat_ms),
+             "--stt-ms", str(args.stt_ms), "--weather-ms", str(args.weather_ms),
+             "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate)],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        base = args.server
+        if not base:
+            port = _free_port()
+            base = f"http://127.0.0.1:{port}"
+            env = dict(os.environ)
+            env.update({
+                "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+                "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+            })
+            if args.workers > 1:
+                env.setdefault("STATE_BACKEND", "sqlite")
+                env.setdefault("STATE_SQLITE_PATH", os.path.join(tmp, "state.db"))
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+        try:
+            report = asyncio.run(run_load(args, base.rstrip("/"), fake_base))
+        finally:
+            for proc in reversed(procs):
+                proc.terminate()
+            for proc in procs:
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded session (RECORD_SESSIONS=1, see server/services/recorder.py) against the
+server as a repeatable benchmark.
+
+Every recorded /ws/audio and /ws/robot connection is reopened and its inbound frames are
+sent again on the original timeline, scaled by --speed (1 = real time, 4 = four times
+faster, 0 = as fast as possible). The upstreams are stubbed deterministically: Groq returns
+the transcripts and LLM replies captured in the recording, in order (fake_upstreams
+--recording), with a fixed --upstream-ms latency. Recorded robot acks are not replayed;
+the replayed robot acks the live commands instead.
+
+Prints a JSON report (reply latency percentiles, throughput, schedule lag, server stage
+metrics), like benchmarks/load_test.py, so runs can be compared.
+
+Usage (from the project root):
+    python -m benchmarks.replay_session shared/recordings/<run> [--speed 1] [--upstream-ms 0]
+        [--workers 1] [--server URL] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks.load_test import Stats, _free_port, _get_json, _wait_http  # noqa: E402
+from server.services.recorder import (  # noqa: E402
+    CH_AUDIO, CH_ROBOT, K_BYTES, K_CLOSE, K_OPEN, K_TEXT, Record, RecordingReader,
+)
+from server.services.robot_protocol import JSON_PROTOCOL, ProtocolError, get_codec  # noqa: E402
+
+
+class ReplayedStream:
+    """One reopened connection plus the task reading its replies."""
+
+    def __init__(self, channel: int, ws, codec=None) -> None:
+        self.channel = channel
+        self.ws = ws
+        self.codec = codec
+        self.pending: Deque[float] = collections.deque()  # send times of audio frames awaiting a reply
+        self.reader: Optional[asyncio.Task] = None
+
+
+async def _audio_reader(stream: ReplayedStream, stats: Stats) -> None:
+    async for message in stream.ws:
+        if isinstance(message, str) and stream.pending:
+            stats.e2e.record(time.perf_counter() - stream.pending.popleft())
+            stats.incr("turns_completed")
+
+
+async def _robot_reader(stream: ReplayedStream, stats: Stats) -> None:
+    seen = set()
+    async for frame in stream.ws:
+        try:
+            data = stream.codec.decode(frame)
+        except ProtocolError:
+            continue
+        if data.get("action") == "AUDIO_FRAME":
+            stats.incr("robot_audio_frames")
+            continue
+        seq = data.get("seq")
+        if seq:
+            await stream.ws.send(stream.codec.encode_ack(seq))
+            if seq in seen:
+                stats.incr("robot_duplicates")
+                continue
+            seen.add(seq)
+        stats.incr("robot_commands")
+
+
+async def _close_when_idle(stream: ReplayedStream, timeout: float) -> None:
+    """Close a mic connection once its turns are answered (the recording closed it after its replies)."""
+    deadline = time.perf_counter() + timeout
+    while stream.pending and not stream.reader.done() and time.perf_counter() < deadline:
+        await asyncio.sleep(0.02)
+    await stream.ws.close()
+
+
+async def _open(ws_base: str, record: Record, stats: Stats) -> Optional[ReplayedStream]:
+    import websockets
+
+    meta = json.loads(record.payload or b"{}")
+    protocol = meta.get("subprotocol")
+    try:
+        if record.channel == CH_AUDIO:
+            ws = await websockets.connect(
+                f"{ws_base}/ws/audio", subprotocols=[protocol] if protocol else None, max_size=None, open_timeout=10
+            )
+            stream = ReplayedStream(CH_AUDIO, ws)
+            stream.reader = asyncio.create_task(_audio_reader(stream, stats))
+        else:
+            query = urlencode({"device_id": meta.get("device_id", "gus")})
+            ws = await websockets.connect(
+                f"{ws_base}/ws/robot?{query}", subprotocols=[protocol] if protocol else None, open_timeout=10
+            )
+            stream = ReplayedStream(CH_ROBOT, ws, get_codec(protocol or JSON_PROTOCOL))
+            stream.reader = asyncio.create_task(_robot_reader(stream, stats))
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        stats.incr("connect_errors")
+        return None
+    return stream
+
+
+async def replay(records: List[Record], base: str, speed: float, timeout: float, stats: Stats) -> Dict:
+    import websockets
+
+    ws_base = base.replace("http", "ws", 1)
+    streams: Dict[Tuple[int, int], ReplayedStream] = {}
+    closers: List[asyncio.Task] = []
+    started = time.perf_counter()
+    max_lag = 0.0
+
+    for record in records:
+        if record.channel not in (CH_AUDIO, CH_ROBOT):
+            continue
+        if speed > 0:
+            due = started + record.t_us / 1e6 / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        key = (record.channel, record.stream)
+        if record.kind == K_OPEN:
+            stream = await _open(ws_base, record, stats)
+            if stream is not None:
+                streams[key] = stream
+            continue
+        stream = streams.get(key)
+        if stream is None:
+            continue
+        try:
+            if record.kind == K_CLOSE:
+                if stream.channel == CH_AUDIO:
+                    closers.append(asyncio.create_task(_close_when_idle(stream, timeout)))
+                elif speed > 0:
+                    await stream.ws.close()
+                # at max speed the robot stays connected until every turn is answered
+            elif record.kind in (K_TEXT, K_BYTES):
+                payload = record.text if record.kind == K_TEXT else record.payload
+                if stream.channel == CH_ROBOT:
+                    try:
+                        if stream.codec.decode(payload).get("type") == "ack":
+                            continue  # stale seq numbers; live commands are acked by the reader
+                    except ProtocolError:
+                        pass
+                    stats.incr("telemetry_sent")
+                else:
+                    stream.pending.append(time.perf_counter())
+                    stats.incr("turns_sent")
+                await stream.ws.send(payload)
+        except websockets.exceptions.ConnectionClosed:
+            stats.incr("connect_errors")
+
+    # Let outstanding turns finish, then close whatever the recording left open
+    await asyncio.gather(*closers)
+    deadline = time.perf_counter() + timeout
+    while any(s.pending and not s.reader.done() for s in streams.values()) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    for stream in streams.values():
+        stats.incr("timeouts", len(stream.pending))
+        await stream.ws.close()
+        stream.reader.cancel()
+    return {"elapsed_s": round(elapsed, 2), "max_schedule_lag_ms": round(max_lag * 1000, 1)}
+
+
+async def run_replay(args: argparse.Namespace, records: List[Record], base: str, fake_base: str) -> Dict:
+    await _wait_http(f"{fake_base}/__stats", time.monotonic() + 30)
+    await _wait_http(f"{base}/", time.monotonic() + 60)
+    stats = Stats()
+    timing = await replay(records, base, args.speed, args.timeout, stats)
+    server_metrics = await _get_json(f"{base}/api/metrics") or {}
+    c = stats.counters
+    return {
+        "recording": {
+            "path": args.recording,
+            "records": len(records),
+            "duration_s": round(records[-1].t_us / 1e6, 2) if records else 0,
+            "streams": len({(r.channel, r.stream) for r in records if r.kind == K_OPEN}),
+        },
+        "config": {"speed": args.speed or "max", "upstream_ms": args.upstream_ms, "workers": args.workers},
+        **timing,
+        "throughput": {"turns_per_s": round(c["turns_completed"] / max(timing["elapsed_s"], 1e-6), 3)},
+        "e2e_latency": stats.e2e.snapshot(),
+        "counters": c,
+        "server_stages": server_metrics.get("histograms", {}),
+        "server_counters": server_metrics.get("counters", {}),
+        "upstream_calls": await _get_json(f"{fake_base}/__stats"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded session as a benchmark")
+    parser.add_argument("recording", help="recording directory (contains index.jsonl)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale; 0 = as fast as possible")
+    parser.add_argument("--upstream-ms", type=float, default=0.0, help="fixed latency of the stubbed upstreams")
+    parser.add_argument("--timeout", type=float, default=20.0, help="seconds to wait for outstanding replies")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--server", help="target a running server (configure its upstream URLs yourself)")
+    parser.add_argument("--fake-port", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    records = list(RecordingReader(args.recording))
+    fake_port = args.fake_port or _free_port()
+    fake_base = f"http://127.0.0.1:{fake_port}"
+    ms = str(args.upstream_ms)
+    procs: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_upstreams", "--port", str(fake_port), "--recording", args.recording,
+             "--chat-ms", ms, "--fast-chat-ms", ms, "--stt-ms", ms, "--weather-ms", ms, "--jitter-ms", "0"],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        base = args.server
+        if not base:
+            port = _free_port()
+            base = f"http://127.0.0.1:{port}"
+            env = dict(os.environ)
+            env.pop("RECORD_SESSIONS", None)  # don't record the replay
+            env.update({
+                "GROQ_API_KEY": "fake", "GROQ_BASE_URL": fake_base,
+                "OPENWEATHER_API_KEY": "fake", "OPENWEATHER_URL": f"{fake_base}/data/2.5/weather",
+            })
+            if args.workers > 1:
+                env.setdefault("STATE_BACKEND", "sqlite")
+                env.setdefault("STATE_SQLITE_PATH", os.path.join(tmp, "state.db"))
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server.main:app", "--port", str(port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+        try:
+            report = asyncio.run(run_replay(args, records, base.rstrip("/"), fake_base))
+        finally:
+            for proc in reversed(procs):
+                proc.terminate()
+            for proc in procs:
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ Database configuration and session management.
 Sets up SQLite connection using SQLAlchemy.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -17,6 +18,22 @@ engine = create_engine(
     connect_args={"check_same_thread": False}  # Required for SQLite with FastAPI
 )
 
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets several server workers share the file: readers never block the writer.
+    Incremental auto-vacuum (effective for new files; the retention job converts old ones)
+    lets pages freed by retention be returned to the OS a few at a time.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -36,6 +53,19 @@ def get_db():
         db.close()
 
 
-def init_db():
-    """Initialize database by creating all tables."""
-    Base.metadata.create_all(bind=engine)
+def init_db(attempts: int = 3):
+    """
+    Initialize database by creating all tables and the history search index.
+    Workers started together on a fresh file race to create the same tables; the loser
+    gets "already exists" and simply runs again, finding them in place this time.
+    """
+    from server.services.history import install_search_index
+
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            install_search_index(engine)
+            return
+        except OperationalError as e:
+            if "already exists" not in str(e) or attempt == attempts - 1:
+                raise
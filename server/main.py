@@ -2,21 +2,76 @@
 Gus System - THE BRAIN (Server)
 Entry point for the FastAPI backend server.
 Handles initialization, CORS configuration, and router registration.
+Importing this module has no side effects: the database, warm-up work and background
+tasks run in the lifespan hook, and services are built lazily by the container.
 """
 
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from server.routers import api_router, websocket_router, hardware_router
+from server.routers import admin_router, api_router, websocket_router, hardware_router
 from server.database import init_db
+from server.services.canned_responses import get_canned_responses
+from server.services.cluster import get_cluster
+from server.services.container import get_container
+from server.services.diagnostics import ENABLED as DIAGNOSTICS_ENABLED, get_diagnostics
+from server.services.history import get_history_store
+from server.services.llm_backend import LOCAL_PRELOAD
+from server.services.recorder import get_recorder
+from server.services.retention import get_retention
+from server.services.telemetry import get_telemetry_store
+
+# Voice turns run their blocking upstream calls via asyncio.to_thread; the default executor
+# (cpu_count + 4 threads) would serialize concurrent turns on small machines.
+PIPELINE_THREADS = int(os.getenv("PIPELINE_THREADS", "32"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup: create tables, pre-build canned frames, join the cluster, open the session
+    recorder (if enabled), start the telemetry and interaction history flushers and the
+    retention job; with ADMIN_TOKEN set, track task ages for /api/admin/tasks; start loading
+    the local LLM (if configured) on its own worker thread.
+    Shutdown: flush telemetry and history, stop retention, release robot ownership, close the recording, the shared HTTP client and the local LLM worker."""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="pipeline")
+    )
+    if DIAGNOSTICS_ENABLED:
+        get_diagnostics().install_task_factory(asyncio.get_running_loop())
+    await asyncio.to_thread(init_db)
+    await get_canned_responses().warm_up()
+    await get_cluster().start()
+    local_llm = await asyncio.to_thread(lambda: get_container().local_llm)
+    if local_llm is not None and LOCAL_PRELOAD:
+        local_llm.load()  # does not wait: the first local turn queues behind the load
+    recorder = get_recorder()  # None unless RECORD_SESSIONS=1
+    background = [
+        asyncio.create_task(get_telemetry_store().run_flusher()),
+        asyncio.create_task(get_history_store().run_flusher()),
+        asyncio.create_task(get_retention().run_forever()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await get_cluster().stop()
+        if recorder is not None:
+            await asyncio.to_thread(recorder.close)
+        get_container().close()
 
-# Initialize database on startup
-init_db()
 
 # Initialize FastAPI application
 app = FastAPI(
     title="Gus IoT Robot Assistant - THE BRAIN",
     description="Backend server for real-time audio processing, AI, and database management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS for React frontend running on localhost:5173
@@ -32,6 +87,7 @@ app.add_middleware(
 app.include_router(api_router.router, prefix="/api", tags=["api"])
 app.include_router(websocket_router.router, prefix="/ws", tags=["websocket"])
 app.include_router(hardware_router.router, prefix="", tags=["hardware"])
+app.include_router(admin_router.router, prefix="/api/admin", tags=["admin"])
 
 
 @app.get("/")
@@ -42,4 +98,6 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from server.services.upload_buffer import WS_MAX_SIZE
+
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_max_size=WS_MAX_SIZE)
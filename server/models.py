@@ -3,7 +3,7 @@ Database models for Gus System.
 Defines all SQLAlchemy table schemas.
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, Text, UniqueConstraint
 from sqlalchemy.sql import func
 from server.database import Base
 
@@ -25,7 +25,8 @@ class SystemState(Base):
 class InteractionLogs(Base):
     """
     Logs all user-robot interactions (voice commands and responses).
-    Timestamped for historical tracking.
+    Timestamped for historical tracking; full-text searchable through the
+    interaction_logs_fts index (see services/history.py).
     """
     __tablename__ = "interaction_logs"
 
@@ -34,6 +35,26 @@ class InteractionLogs(Base):
     user_text = Column(Text, nullable=False)  # Transcribed user speech
     robot_response = Column(Text, nullable=True)  # AI-generated response
     audio_duration = Column(Float, nullable=True)  # Duration in seconds
+    mode = Column(String(50), nullable=True)  # AI mode when the turn happened
+
+
+class InteractionDailyRollups(Base):
+    """
+    Per-day, per-mode interaction aggregates (UTC days), written by the retention job
+    (services/retention.py). They outlive the raw rows, which are archived after
+    RETENTION_DAYS, and back the history analytics endpoint.
+    """
+    __tablename__ = "interaction_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "mode", name="uq_interaction_day_mode"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    mode = Column(String(50), nullable=False)
+    turns = Column(Integer, nullable=False, default=0)
+    audio_turns = Column(Integer, nullable=False, default=0)  # turns with a known audio duration
+    audio_seconds = Column(Float, nullable=False, default=0.0)
 
 
 class Reminders(Base):
@@ -47,3 +68,26 @@ class Reminders(Base):
     task_name = Column(String(255), nullable=False)  # Reminder description
     status = Column(String(50), default="pending")  # pending, completed, cancelled
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TelemetryRollups(Base):
+    """
+    Downsampled robot telemetry (battery, temperature, RSSI, mic level).
+    One row per device, metric, resolution and time bucket; sums are stored so
+    partial buckets from different flushes merge additively.
+    """
+    __tablename__ = "telemetry_rollups"
+    __table_args__ = (
+        UniqueConstraint("device_id", "metric", "resolution", "bucket_start", name="uq_telemetry_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(String(64), nullable=False)
+    metric = Column(String(32), nullable=False)  # battery, temperature, rssi, mic_level
+    resolution = Column(Integer, nullable=False)  # bucket width in seconds: 60, 3600, 86400
+    bucket_start = Column(DateTime, nullable=False)  # UTC
+    count = Column(Integer, nullable=False, default=0)
+    sum_value = Column(Float, nullable=False, default=0.0)
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    last_value = Column(Float, nullable=True)
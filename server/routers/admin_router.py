@@ -0,0 +1,111 @@
+"""
+Admin Router - profiling and memory diagnostics for a running server (services/diagnostics.py).
+Disabled unless ADMIN_TOKEN is set (every route answers 404); requests must then carry it in
+the X-Admin-Token header.
+
+    GET  /api/admin/profile/cpu?seconds=10    collapsed stacks (flamegraph.pl, speedscope)
+    POST /api/admin/memory/start              start tracemalloc
+    POST /api/admin/memory/snapshot           keep a snapshot, return the top allocation sites
+    GET  /api/admin/memory/diff?base=<id>     growth since snapshot <id> (to the newest)
+    POST /api/admin/memory/stop               stop tracemalloc, drop the snapshots
+    GET  /api/admin/memory                    tracing status and kept snapshots
+    GET  /api/admin/tasks                     asyncio tasks, oldest first, with where they wait
+"""
+
+import asyncio
+import hmac
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from server.services.diagnostics import (
+    ADMIN_TOKEN,
+    ENABLED,
+    KEY_TYPES,
+    MEMORY_FRAMES,
+    PROFILE_INTERVAL,
+    PROFILE_MAX_SECONDS,
+    Busy,
+    get_diagnostics,
+)
+
+
+def require_admin(x_admin_token: str = Header(default="")) -> None:
+    if not ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+diagnostics = get_diagnostics()
+
+
+def _key_type(key_type: str) -> str:
+    if key_type not in KEY_TYPES:
+        raise HTTPException(status_code=400, detail=f"key_type must be one of {', '.join(KEY_TYPES)}")
+    return key_type
+
+
+@router.get("/profile/cpu")
+async def profile_cpu(seconds: float = 10.0, interval_ms: float = PROFILE_INTERVAL * 1000, format: str = "collapsed"):
+    """
+    Sample every thread's stack for `seconds` (at most PROFILE_MAX_SECONDS) and return collapsed
+    stacks, one "thread;frame;...;frame count" line each; format=json adds sample counts.
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    try:
+        result = await asyncio.to_thread(diagnostics.profile_cpu, seconds, interval_ms / 1000.0)
+    except Busy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return result
+    return PlainTextResponse(result["collapsed"], headers={
+        "X-Profile-Samples": str(result["samples"]), "X-Profile-Seconds": str(result["seconds"]),
+    })
+
+
+@router.post("/memory/start")
+async def memory_start(frames: int = MEMORY_FRAMES) -> Dict[str, Any]:
+    """Start tracemalloc, recording `frames` frames per allocation (slows allocations while on)."""
+    started = diagnostics.start_tracing(max(1, min(frames, 64)))
+    return {"started": started, **diagnostics.memory_status()}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(top: int = 25, key_type: str = "lineno", match: str = "") -> Dict[str, Any]:
+    """Keep a snapshot; returns its id and the largest allocation sites (match: a filename substring)."""
+    try:
+        return await asyncio.to_thread(diagnostics.take_snapshot, top, _key_type(key_type), match)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/diff")
+async def memory_diff(
+    base: str, target: Optional[str] = None, top: int = 25, key_type: str = "lineno", match: str = ""
+) -> Dict[str, Any]:
+    """Allocation growth from snapshot `base` to `target` (default: the newest)."""
+    try:
+        return await asyncio.to_thread(diagnostics.diff, base, target, top, _key_type(key_type), match)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot {e}")
+
+
+@router.post("/memory/stop")
+async def memory_stop() -> Dict[str, Any]:
+    diagnostics.stop_tracing()
+    return diagnostics.memory_status()
+
+
+@router.get("/memory")
+async def memory_status() -> Dict[str, Any]:
+    return {**diagnostics.memory_status(), "profiling": diagnostics.profiling}
+
+
+@router.get("/tasks")
+async def asyncio_tasks(limit: int = 200) -> Dict[str, Any]:
+    """Every asyncio task: coroutine, age in seconds and the line it is suspended at."""
+    return diagnostics.tasks(limit)
@@ -5,17 +5,28 @@ Handles requests from React frontend (GET /status, POST /command).
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
 from server.database import get_db
 from server.models import SystemState, InteractionLogs, Reminders
-from server.services.hardware_bridge import execute_frontend_command
+from server.services.cluster import get_cluster
+from server.services.container import get_container
+from server.services.hardware_bridge import execute_frontend_command, get_hardware_bridge
+from server.services.metrics import get_metrics
+from server.services.admission import get_admission
 from server.services.ai_engine import get_ai_engine
+from server.services.history import MAX_PAGE_SIZE, PAGE_SIZE, InvalidQuery, daily_stats, search_history
+from server.services.resilience import get_resilience
+from server.services.retention import RETENTION_DAYS, get_retention
+from server.services.speculation import speculation_stats
+from server.services.telemetry import METRICS, RESOLUTIONS, get_telemetry_store
+from server.services.upload_buffer import upload_stats
 
 router = APIRouter()
 
 
 @router.get("/status")
-async def get_status(db: Session = Depends(get_db)) -> Dict[str, Any]:
+def get_status(db: Session = Depends(get_db)) -> Dict[str, Any]:
     """
     Get current system status.
     Returns mode, volume, battery_level, and recent interaction count.
@@ -30,7 +41,6 @@ async def get_status(db: Session = Depends(get_db)) -> Dict[str, Any]:
         db.refresh(state)
 
     # Get recent interaction count (last 24 hours)
-    from datetime import datetime, timedelta
     recent_count = db.query(InteractionLogs).filter(
         InteractionLogs.timestamp >= datetime.utcnow() - timedelta(days=1)
     ).count()
@@ -40,6 +50,9 @@ async def get_status(db: Session = Depends(get_db)) -> Dict[str, Any]:
         "volume": state.volume,
         "battery_level": state.battery_level,
         "recent_interactions": recent_count,
+        "ai_mode": get_ai_engine().current_mode,
+        "robot_connected": get_hardware_bridge().active_connection is not None,
+        "worker_id": get_cluster().worker_id,
         "status": "online"
     }
 
@@ -52,7 +65,9 @@ async def send_command(
     """
     Process commands from the frontend.
     Expected commands: "study_mode", "privacy_mode", "trigger_alarm", "set_volume"
+    The reply names the worker that handled the command (see /status).
     """
+    worker_id = get_cluster().worker_id
     cmd_type = command.get("type")
     value = command.get("value")
 
@@ -66,34 +81,224 @@ async def send_command(
         db.commit()
         await execute_frontend_command("study_mode")
         get_ai_engine().set_mode("study")
-        return {"status": "success", "message": "Study mode activated"}
+        return {"status": "success", "message": "Study mode activated", "worker_id": worker_id}
 
     elif cmd_type == "privacy_mode":
         state.mode = "privacy"
         db.commit()
         await execute_frontend_command("privacy_mode")
         get_ai_engine().set_mode("privacy")
-        return {"status": "success", "message": "Privacy mode activated"}
+        return {"status": "success", "message": "Privacy mode activated", "worker_id": worker_id}
 
     elif cmd_type == "trigger_alarm":
         state.mode = "alarm"
         db.commit()
         await execute_frontend_command("trigger_alarm")
         get_ai_engine().set_mode("alarm")
-        return {"status": "success", "message": "Alarm triggered"}
+        return {"status": "success", "message": "Alarm triggered", "worker_id": worker_id}
 
     elif cmd_type == "set_volume" and value is not None:
-        state.volume = max(0.0, min(1.0, float(value)))
-        db.commit()
-        await execute_frontend_command("set_volume", str(state.volume))
-        return {"status": "success", "message": f"Volume set to {state.volume}"}
+        volume = max(0.0, min(1.0, float(value)))
+        state.volume = volume
+        db.commit()  # returns the pooled connection; don't touch `state` again while awaiting
+        await execute_frontend_command("set_volume", str(volume))
+        return {"status": "success", "message": f"Volume set to {volume}", "worker_id": worker_id}
 
     elif cmd_type == "normal_mode":
         state.mode = "normal"
         db.commit()
         await execute_frontend_command("normal_mode")
         get_ai_engine().set_mode("normal")
-        return {"status": "success", "message": "Normal mode activated"}
+        return {"status": "success", "message": "Normal mode activated", "worker_id": worker_id}
 
     else:
         raise HTTPException(status_code=400, detail=f"Unknown command: {cmd_type}")
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """Normalize a query datetime to naive UTC (how timestamps are stored)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/telemetry")
+def get_telemetry(
+    metric: str,
+    device_id: str = "gus",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get robot telemetry for a time range (UTC), served from the 1m/1h/1d rollups.
+    Defaults to the last hour; resolution is chosen automatically unless given ("1m", "1h", "1d").
+    Sync on purpose: FastAPI runs it in the threadpool, so the SQLite query never blocks the
+    event loop.
+    """
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {metric}")
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution: {resolution}")
+
+    end = _utc_naive(end) if end else datetime.utcnow()
+    start = _utc_naive(start) if start else end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    store = get_telemetry_store()
+    width, points = store.query(device_id, metric, start, end, RESOLUTIONS.get(resolution))
+    return {
+        "device_id": device_id,
+        "metric": metric,
+        "resolution": next(name for name, w in RESOLUTIONS.items() if w == width),
+        "latest": store.latest.get(device_id, {}).get(metric),
+        "points": points,
+    }
+
+
+@router.get("/history/search")
+def search_interactions(
+    q: Optional[str] = None,
+    mode: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Search interaction history, newest first. `q` matches words in what the user said or
+    Gus answered (all of them; `word*` matches as a prefix); filter by mode and time range
+    [start, end) (UTC).
+    Pass `next_cursor` from a response as `cursor` to get the next page.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    start = _utc_naive(start) if start else None
+    end = _utc_naive(end) if end else None
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    try:
+        return search_history(db, q=q, mode=mode, since=start, until=end, cursor=cursor, limit=limit)
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/history/stats")
+def interaction_stats(days: int = 30, db: Session = Depends(get_db)) -> Dict[str, Any]:
+    """
+    Interaction analytics per UTC day (turns, average audio duration, mode mix) for the last
+    `days` days, served from the daily rollups kept by the retention job.
+    """
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+    stats = daily_stats(db, days)
+    stats["retention"] = {"raw_days": RETENTION_DAYS, "last_run": get_retention().last_run}
+    return stats
+
+
+@router.get("/metrics")
+async def get_all_metrics(prefix: str = "") -> Dict[str, Any]:
+    """
+    All latency histograms and counters of this worker, optionally filtered by name prefix:
+    pipeline.* (per-stage voice pipeline), upstream.* (Groq, weather), ai.* (model tiers),
+    robot.* (command acks).
+    """
+    return get_metrics().snapshot(prefix)
+
+
+@router.get("/ai/tiers")
+async def get_ai_tiers() -> Dict[str, Any]:
+    """
+    Model tiering: configured models, how many turns each tier served, its latency
+    and token usage, and how often a fast answer was escalated to the large model.
+    """
+    router_ = get_ai_engine().router
+    metrics = get_metrics()
+    counters = metrics.snapshot("ai.")["counters"]
+    return {
+        "routing": router_.routing,
+        "escalated": counters.get("ai.escalated", 0),
+        "tiers": {
+            tier: {
+                "model": model,
+                "turns": counters.get(f"ai.route.{tier}", 0),
+                "latency": metrics.histogram(f"upstream.groq.chat.{tier}").snapshot(),
+                "prompt_tokens": counters.get(f"ai.tokens.{tier}.prompt", 0),
+                "completion_tokens": counters.get(f"ai.tokens.{tier}.completion", 0),
+            }
+            for tier, model in router_.models.items()
+        },
+    }
+
+
+@router.get("/upstream/health")
+async def get_upstream_health() -> Dict[str, Any]:
+    """
+    Upstream resilience: circuit-breaker state per route plus retry, hedge and
+    short-circuit counters (see services/resilience.py), and the local LLM used for
+    privacy mode and as the fallback (see services/llm_backend.py).
+    """
+    resilience = get_resilience()
+    local_llm = get_container().local_llm
+    return {
+        "hedging": resilience.hedging,
+        "max_attempts": resilience.max_attempts,
+        "breakers": resilience.snapshot(),
+        "counters": get_metrics().snapshot("resilience.")["counters"],
+        "fallbacks": {
+            name: count
+            for name, count in get_metrics().snapshot()["counters"].items()
+            if ".fallback" in name
+        },
+        "local_llm": local_llm.status() if local_llm is not None else None,
+    }
+
+
+@router.get("/admission")
+async def get_admission_status() -> Dict[str, Any]:
+    """
+    Admission control: free slots, active/queued work per class, plus admitted/shed counts
+    and queue wait percentiles (see services/admission.py).
+    """
+    snapshot = get_metrics().snapshot("admission.")
+    return {**get_admission().snapshot(), "counters": snapshot["counters"], "wait": snapshot["histograms"]}
+
+
+@router.get("/speculation")
+async def get_speculation_status() -> Dict[str, Any]:
+    """
+    Speculative chat replies on streamed utterances: hit rate (committed / decided), counters
+    and the latency saved by committed speculations (see services/speculation.py).
+    """
+    return speculation_stats()
+
+
+@router.get("/uploads")
+async def get_upload_status() -> Dict[str, Any]:
+    """
+    Audio upload buffers on /ws/audio: size limits, pooled memory and spill-file usage
+    against their budgets, and spilled/refused counts (see services/upload_buffer.py).
+    """
+    return upload_stats()
+
+
+@router.get("/robot/metrics")
+async def get_robot_metrics() -> Dict[str, Any]:
+    """
+    Robot link health: per-action command round-trip latency (send to ack),
+    sent/acked/retransmitted/failed counters, the current in-flight window and the session
+    replay buffer (robot.replay.* / robot.sessions.* counters).
+    """
+    bridge = get_hardware_bridge()
+    snapshot = get_metrics().snapshot("robot.")
+    return {
+        "connected": bridge.active_connection is not None,
+        "protocol": bridge.codec.name,
+        "acks_enabled": bridge.acks_enabled,
+        "in_flight": bridge.inflight_count,
+        "session": bridge.session_status(),
+        "latency": snapshot["histograms"],
+        "counters": snapshot["counters"],
+    }
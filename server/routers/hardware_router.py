@@ -1,14 +1,23 @@
 """
 Hardware Router - WebSocket endpoint for the ESP32 robot.
-Single connection managed by HardwareBridge.
+Single connection managed by HardwareBridge and registered as this worker's in the
+cluster, so other workers can route commands here; the wire codec (binary or JSON) is negotiated
+through the WebSocket subprotocol header. Negotiated robots get a session token and may
+resume with ?session= after a drop (see HardwareBridge).
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from server.services.hardware_bridge import get_hardware_bridge
+from server.services.cluster import get_cluster
+from server.services.hardware_bridge import RESUME_TTL, get_hardware_bridge
+from server.services.recorder import CH_ROBOT, get_recorder
+from server.services.robot_protocol import ProtocolError, negotiate
+from server.services.telemetry import get_telemetry_store
 
 router = APIRouter()
 bridge = get_hardware_bridge()
+cluster = get_cluster()
+telemetry = get_telemetry_store()
 
 
 @router.websocket("/ws/robot")
@@ -16,17 +25,52 @@ async def websocket_robot_endpoint(websocket: WebSocket) -> None:
     """
     WebSocket endpoint for the physical (or virtual) ESP32 robot.
     Only one active connection is held; new connection replaces the previous.
+    Robots offering "gus.bin.v1" get compact binary frames; everyone else gets JSON.
+    Telemetry frames sent by the robot are ingested under ?device_id= (default "gus").
+    ?session= carries the token of the session to resume after a dropped link.
     """
-    await websocket.accept()
-    bridge.connect(websocket)
-    print(f"🤖 Robot connected: {websocket.client}")
+    device_id = websocket.query_params.get("device_id", "gus")
+    protocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=protocol)
+    bridge.connect(websocket, protocol, device_id=device_id, resume=websocket.query_params.get("session"))
+    await bridge.open_session()
+    await cluster.claim_robot()
+    recorder = get_recorder()
+    stream = recorder.open_stream(
+        CH_ROBOT, path="/ws/robot", subprotocol=protocol, device_id=device_id
+    ) if recorder is not None else 0
+    print(f"🤖 Robot connected: {websocket.client} ({bridge.codec.name})")
 
     try:
         while True:
-            # Keep connection alive and detect disconnects
-            await websocket.receive_text()
+            # Keep connection alive and detect disconnects (text or binary frames)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            frame = message.get("bytes") if message.get("bytes") is not None else message.get("text")
+            if not frame:
+                continue
+            if recorder is not None:
+                recorder.frame(CH_ROBOT, stream, frame)
+            try:
+                data = bridge.codec.decode(frame)
+            except ProtocolError as e:
+                print(f"⚠️ Bad frame from robot: {e}")
+                continue
+            if data.get("type") == "ack":
+                if isinstance(data.get("seq"), int):
+                    bridge.handle_ack(data["seq"])
+            elif data.get("type") == "telemetry":
+                telemetry.ingest(device_id, data)
     except WebSocketDisconnect:
         pass
     finally:
-        bridge.disconnect()
+        bridge.disconnect(websocket)
+        if recorder is not None:
+            recorder.close_stream(CH_ROBOT, stream)
+        if bridge.active_connection is None:
+            if bridge.resumable:
+                await cluster.park_robot(RESUME_TTL)  # released when the session expires
+            else:
+                await cluster.release_robot()
         print("🤖 Robot disconnected")
@@ -1,144 +1,130 @@
 """
 WebSocket Router for real-time audio streaming.
 Handles "/ws/audio" connection from ESP32 or browser; text commands and binary audio.
+Turns are admitted by priority (see services/admission.py): alarm intents take a fast path
+straight to the robot, and chat turns get a quick "busy" reply when the server is saturated.
+Answered turns are logged to the searchable interaction history (services/history.py).
+Mics may negotiate a compressed uplink codec (IMA-ADPCM, Opus) with the WebSocket
+subprotocol header; see services/audio_uplink.py. Utterances may also be streamed in
+chunks, in which case the chat reply is speculated on interim transcripts while the user is
+still talking (services/speculation.py). Uploads are held in pooled, size-capped buffers that
+spill to disk under memory pressure (services/upload_buffer.py).
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+from typing import Callable, List, Optional
+import asyncio
 import json
 import os
 import re  # Added for regex
+import time
 
-# 1. Import the Brain, Hardware Bridge, and Transcriber
-from server.services.ai_engine import get_ai_engine
+# 1. Import the service container (Brain, Transcriber), Hardware Bridge and canned replies
+from server.services.admission import CHAT, COMMAND, LISTEN, SAFETY, Overloaded, get_admission
+from server.services.audio_uplink import UplinkError, decode_to_pcm, decode_to_wav, get_uplink, negotiate
+from server.services.canned_responses import get_canned_responses
+from server.services.container import get_container
 from server.services.hardware_bridge import execute_frontend_command, get_hardware_bridge
-from server.services.transcriber import Transcriber
+from server.services.history import get_history_store
+from server.services.metrics import get_metrics
+from server.services.recorder import CH_AUDIO, get_recorder
+from server.services.resilience import Deadline
+from server.services.speculation import CHAT_INTENT, UtteranceStream
+from server.services.transcriber import wav_duration
+from server.services.upload_buffer import MAX_BYTES as UPLOAD_MAX_BYTES, UploadBuffer, UploadRejected
 
 router = APIRouter()
 
 # Store active WebSocket connections
 active_connections: List[WebSocket] = []
 
-# 2. Shared brain and transcriber
-brain = get_ai_engine()
-transcriber = Transcriber()
+# 2. Shared services; brain and transcriber are built on first use, not at import
+services = get_container()
 bridge = get_hardware_bridge()
+canned = get_canned_responses()
+metrics = get_metrics()
+admission = get_admission()
+history = get_history_store()
+
+
+def detect_intent(lower_text: str, waiting_for_age: bool) -> str:
+    """
+    Which branch of the voice pipeline a transcript takes: alarm, age (the answer to the
+    age question), child, study, normal or chat. Also run on interim transcripts.
+    """
+    if "alarm" in lower_text or "emergency" in lower_text or "security" in lower_text:
+        return "alarm"
+    if waiting_for_age:
+        return "age"
+    if "child mode" in lower_text or "kids mode" in lower_text or "junior" in lower_text:
+        return "child"
+    if "study" in lower_text or "focus" in lower_text:
+        return "study"
+    if "normal" in lower_text or "relax" in lower_text:
+        return "normal"
+    return CHAT_INTENT
 
-# Global state to track if we are waiting for the user's age
-waiting_for_age = False
 
 @router.websocket("/audio")
 async def websocket_audio_endpoint(websocket: WebSocket):
     """
     WebSocket endpoint for ESP32 audio stream.
-    Receives raw PCM audio bytes OR text commands.
+    Receives audio files (WAV/WebM) or compressed utterances in the negotiated uplink codec,
+    utterances streamed in chunks between utterance_start/utterance_end frames,
+    OR text commands.
     """
-    global waiting_for_age
-    await websocket.accept()
+    brain = services.ai_engine
+    transcriber = services.transcriber
+    protocol = negotiate(websocket.scope.get("subprotocols", []))
+    uplink = get_uplink(protocol)
+    await websocket.accept(subprotocol=protocol)
     active_connections.append(websocket)
-    print(f"✅ Client Connected: {websocket.client}")
+    print(f"✅ Client Connected: {websocket.client}" + (f" ({uplink.name} uplink)" if uplink else ""))
+    recorder = get_recorder()
+    stream = recorder.open_stream(CH_AUDIO, path="/ws/audio", subprotocol=protocol) if recorder is not None else 0
+    utterance: Optional[UtteranceStream] = None  # streamed utterance in progress
+    discarding = False  # chunks of a refused streamed utterance are dropped until utterance_end
 
     try:
         while True:
             # Receive data
             data = await websocket.receive()
+            if recorder is not None:
+                if data.get("bytes") is not None:
+                    recorder.frame(CH_AUDIO, stream, data["bytes"])
+                elif data.get("text") is not None:
+                    recorder.frame(CH_AUDIO, stream, data["text"])
 
-            # CASE A: Binary Audio – Voice Commands
+            # CASE A: Binary Audio – Voice Commands (a whole utterance, or a chunk of a streamed one)
             if "bytes" in data:
-                audio_bytes = data["bytes"]
-
-                # 1. Transcribe
-                text = transcriber.transcribe_audio(audio_bytes)
-
-                if text:
-                    print(f"🎤 Voice Heard: {text}")
-                    lower_text = text.lower()
-
-                    # === 1. CHECK IF WAITING FOR AGE ===
-                    if waiting_for_age:
-                        # Extract number from response (e.g., "I am 8", "Eight", "8")
-                        age_match = re.search(r"\d+", lower_text)
-
-                        # Handle text numbers (simple case for "eight", "ten" - optional, sticking to digits for robustness)
-                        # You can expand this if needed, but regex \d+ catches "8", "10" etc.
-
-                        if age_match:
-                            age = int(age_match.group(0))
-                            brain.set_age(age)
-                            brain.set_mode("child")
-                            waiting_for_age = False  # Reset state
-
-                            response_text = f"Got it! You are {age} years old. I am now Gus Junior! 🎈 Ready to play?"
-
-                            # Playful hardware feedback
-                            await bridge.send_command("LED", "GREEN_BLINK")
-                            await websocket.send_json({"type": "ai_response", "text": response_text})
-                            await bridge.send_command("SAY", response_text)
-                            continue  # Skip the rest of the loop
-                        else:
-                            # User didn't say a number
-                            response_text = "I didn't catch that number. How old are you?"
-                            await websocket.send_json({"type": "ai_response", "text": response_text})
-                            await bridge.send_command("SAY", response_text)
-                            continue
-
-                    # === 2. STANDARD COMMANDS ===
-
-                    # Command: Switch to Child Mode
-                    if "child mode" in lower_text or "kids mode" in lower_text or "junior" in lower_text:
-                        print("🤖 Intent Detected: CHILD MODE")
-                        if brain.user_age:
-                            # We already know the age
-                            brain.set_mode("child")
-                            response_text = f"Switching to Child Mode for age {brain.user_age}! 🌟"
-                            await bridge.send_command("LED", "GREEN_BLINK")
-                            await websocket.send_json({"type": "ai_response", "text": response_text})
-                            await bridge.send_command("SAY", response_text)
-                        else:
-                            # We need to ask for age
-                            waiting_for_age = True
-                            response_text = "Sure thing! But first, how old are you?"
-                            await websocket.send_json({"type": "ai_response", "text": response_text})
-                            await bridge.send_command("SAY", response_text)
-
-                    # Command: Study Mode
-                    elif "study" in lower_text or "focus" in lower_text:
-                        print("🤖 Intent Detected: STUDY")
-                        waiting_for_age = False # Cancel age wait if they switch mode
-                        brain.set_mode("study")
-                        await bridge.send_command("LED", "BLUE")
-                        response_text = "Study Mode Activated. Blue LED is on. I am now your strict tutor."
-                        await websocket.send_json({"type": "ai_response", "text": response_text})
-                        await bridge.send_command("SAY", response_text)
-
-                    # Command: Alarm / Emergency
-                    elif "alarm" in lower_text or "emergency" in lower_text or "security" in lower_text:
-                        print("🤖 Intent Detected: ALARM")
-                        waiting_for_age = False
-                        brain.set_mode("alarm")
-                        await bridge.send_command("BUZZER", "ON")
-                        await bridge.send_command("LED", "RED_BLINK")
-                        await websocket.send_json({"type": "alert", "message": "SECURITY BREACH DETECTED"})
-                        response_text = "ALARM TRIGGERED. Security protocols active."
-                        await websocket.send_json({"type": "ai_response", "text": response_text})
-                        await bridge.send_command("SAY", response_text)
-
-                    # Command: Normal Mode
-                    elif "normal" in lower_text or "relax" in lower_text:
-                        print("🤖 Intent Detected: NORMAL")
-                        waiting_for_age = False
-                        brain.set_mode("normal")
-                        await bridge.send_command("LED", "GREEN")
-                        response_text = "Returning to Normal Mode. Systems green."
-                        await websocket.send_json({"type": "ai_response", "text": response_text})
-                        await bridge.send_command("SAY", response_text)
-
-                    # No Command? Just Chat.
-                    else:
-                        ai_response = brain.process_user_input(text)
-                        print(f"💡 AI Says: {ai_response}")
-                        await websocket.send_json({"type": "ai_response", "text": ai_response})
-                        await bridge.send_command("SAY", ai_response)
+                audio_bytes, data = data["bytes"], None  # only the upload buffer keeps the audio
+                received_at = time.perf_counter()
+                if discarding:
+                    continue
+                if utterance is not None:
+                    try:
+                        if uplink is not None:
+                            audio_bytes = await asyncio.to_thread(decode_to_pcm, uplink, audio_bytes)
+                        utterance.append(audio_bytes)
+                    except UplinkError as e:
+                        print(f"⚠️ Bad {uplink.name} upload: {e}")
+                    except UploadRejected as e:
+                        utterance.close()
+                        utterance, discarding = None, True
+                        await reject_upload(websocket, e)
+                    continue
+                upload = UploadBuffer()
+                try:
+                    upload.write(audio_bytes)
+                except UploadRejected as e:
+                    await reject_upload(websocket, e)
+                    continue
+                finally:
+                    audio_bytes = None
+                try:
+                    await handle_utterance(websocket, lambda: load_upload(upload, uplink), received_at)
+                finally:
+                    upload.close()
 
             # CASE B: Text / JSON (Frontend Buttons)
             elif "text" in data:
@@ -149,6 +135,27 @@ async def websocket_audio_endpoint(websocket: WebSocket):
                     # Attempt to parse as JSON
                     message = json.loads(raw_text)
 
+                    # Streamed utterance: binary chunks follow until utterance_end
+                    if message.get("type") == "utterance_start":
+                        if utterance is not None:
+                            utterance.close()
+                            utterance = None
+                        declared = message.get("bytes")
+                        discarding = isinstance(declared, int) and declared > UPLOAD_MAX_BYTES
+                        if discarding:  # refused before any audio is sent
+                            await reject_upload(websocket, UploadRejected("too_large"))
+                            continue
+                        utterance = UtteranceStream(
+                            brain, transcriber, lambda t: detect_intent(t.lower(), brain.waiting_for_age)
+                        )
+                        continue
+                    if message.get("type") == "utterance_end":
+                        discarding = False
+                        if utterance is not None:
+                            current, utterance = utterance, None
+                            await handle_utterance(websocket, current.wav, time.perf_counter(), current)
+                        continue
+
                     if message.get("type") == "command":
                         cmd_type = message.get("command")
                         val = message.get("value")
@@ -156,32 +163,38 @@ async def websocket_audio_endpoint(websocket: WebSocket):
                         if cmd_type:
                             # Hardware/Mode Actions from Buttons
                             if cmd_type == "study_mode":
-                                waiting_for_age = False
+                                brain.set_waiting_for_age(False)
                                 await bridge.send_command("LED", "BLUE")
                                 brain.set_mode("study")
                             elif cmd_type == "trigger_alarm":
-                                waiting_for_age = False
-                                await bridge.send_command("BUZZER", "ON")
-                                await bridge.send_command("LED", "RED_BLINK")
+                                brain.set_waiting_for_age(False)
+                                await bridge.send_command("BUZZER", "ON", priority=SAFETY)
+                                await bridge.send_command("LED", "RED_BLINK", priority=SAFETY)
                                 brain.set_mode("alarm")
-                                await websocket.send_json({"type": "alert", "message": "MANUAL ALARM TRIGGERED"})
+                                await websocket.send_text(canned.alert("manual_alarm"))
                             elif cmd_type == "normal_mode":
-                                waiting_for_age = False
+                                brain.set_waiting_for_age(False)
                                 await bridge.send_command("LED", "GREEN")
                                 brain.set_mode("normal")
                             elif cmd_type == "privacy_mode":
-                                waiting_for_age = False
+                                brain.set_waiting_for_age(False)
                                 await bridge.send_command("LED", "OFF")
                                 brain.set_mode("privacy")
 
                             # Note: If you add a "Child Mode" button later, handle it here too
 
-                        await websocket.send_json({"status": "ack", "msg": "Command Executed"})
+                        await websocket.send_text(canned.ack_frame)
 
                 except json.JSONDecodeError:
                     # Plain text chat fallback
-                    ai_response = brain.process_user_input(raw_text)
+                    try:
+                        async with admission.admit(CHAT):
+                            ai_response = await asyncio.to_thread(brain.process_user_input, raw_text)
+                    except Overloaded:
+                        await websocket.send_text(canned["busy"].client_frame)
+                        continue
                     await websocket.send_json({"type": "ai_response", "text": ai_response})
+                    history.record(raw_text, ai_response, brain.current_mode)
 
     except WebSocketDisconnect:
         if websocket in active_connections:
@@ -190,4 +203,159 @@ async def websocket_audio_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"⚠️ WebSocket error: {e}")
         if websocket in active_connections:
-            active_connections.remove(websocket)
\ No newline at end of file
+            active_connections.remove(websocket)
+    finally:
+        if utterance is not None:
+            utterance.close()
+        if recorder is not None:
+            recorder.close_stream(CH_AUDIO, stream)
+
+
+def load_upload(upload: UploadBuffer, uplink) -> bytes:
+    """A whole-message upload as WAV/WebM bytes, decoded from the uplink codec if negotiated."""
+    audio_bytes = upload.read()
+    return decode_to_wav(uplink, audio_bytes) if uplink is not None else audio_bytes
+
+
+async def reject_upload(websocket: WebSocket, error: UploadRejected) -> None:
+    """Tell the mic its utterance was refused: too long, or no room for it right now."""
+    print(f"⚠️ Upload refused: {error}")
+    await websocket.send_text(canned["too_long" if error.reason == "too_large" else "busy"].client_frame)
+
+
+async def handle_utterance(
+    websocket: WebSocket, load: Callable[[], bytes], received_at: float, utterance: Optional[UtteranceStream] = None
+) -> None:
+    """
+    Voice pipeline for one utterance: transcribe, match intents, then run the command or
+    chat turn and reply. `load` returns the WAV/WebM bytes; it is called in a worker thread
+    once the turn holds a LISTEN slot, so queued turns keep their audio in the upload buffer.
+    For a streamed utterance, a reply speculated on its interim transcript is committed if
+    the final transcript matches it.
+    """
+    brain = services.ai_engine
+    transcriber = services.transcriber
+    deadline = Deadline()  # end-to-end upstream budget for this turn
+    try:
+        # 1. Transcribe (blocking upstream call, kept off the event loop; any
+        #    utterance may be an alarm, so this outranks queued chat turns)
+        try:
+            async with admission.admit(LISTEN):
+                audio_bytes = await asyncio.to_thread(load)
+                text = await asyncio.to_thread(transcriber.transcribe_audio, audio_bytes, deadline)
+        except Overloaded:
+            await websocket.send_text(canned["busy"].client_frame)
+            return
+        except UplinkError as e:
+            print(f"⚠️ Bad upload: {e}")
+            return
+        if not text:
+            metrics.incr("pipeline.no_transcript")
+
+        if text:
+            print(f"🎤 Voice Heard: {text}")
+            lower_text = text.lower()
+            duration = wav_duration(audio_bytes)
+            intent = detect_intent(lower_text, brain.waiting_for_age)
+
+            # === 0. SAFETY FAST PATH (beats everything, even a pending age question) ===
+            if intent == "alarm":
+                print("🚨 Intent Detected: ALARM")
+                await bridge.send_command("BUZZER", "ON", priority=SAFETY)
+                await bridge.send_command("LED", "RED_BLINK", priority=SAFETY)
+                metrics.histogram("pipeline.alarm").record(time.perf_counter() - received_at)
+                brain.set_waiting_for_age(False)
+                brain.set_mode("alarm")
+                await websocket.send_text(canned.alert("security_breach"))
+                await websocket.send_text(canned["alarm"].client_frame)
+                await bridge.say_canned(canned["alarm"], priority=SAFETY)
+                history.record(text, canned["alarm"].text, brain.current_mode, duration)
+                return
+
+            # === 1. CHECK IF WAITING FOR AGE ===
+            if intent == "age":
+                # Extract number from response (e.g., "I am 8", "Eight", "8")
+                age_match = re.search(r"\d+", lower_text)
+
+                # Handle text numbers (simple case for "eight", "ten" - optional, sticking to digits for robustness)
+                # You can expand this if needed, but regex \d+ catches "8", "10" etc.
+
+                if age_match:
+                    age = int(age_match.group(0))
+                    brain.set_age(age)
+                    brain.set_mode("child")
+                    brain.set_waiting_for_age(False)  # Reset state
+
+                    response_text = f"Got it! You are {age} years old. I am now Gus Junior! 🎈 Ready to play?"
+
+                    # Playful hardware feedback
+                    await bridge.send_command("LED", "GREEN_BLINK")
+                    await websocket.send_json({"type": "ai_response", "text": response_text})
+                    await bridge.say(response_text, priority=COMMAND)
+                    history.record(text, response_text, brain.current_mode, duration)
+                    return  # Skip the rest of the pipeline
+                else:
+                    # User didn't say a number
+                    await websocket.send_text(canned["age_retry"].client_frame)
+                    await bridge.say_canned(canned["age_retry"], priority=COMMAND)
+                    return
+
+            # === 2. STANDARD COMMANDS ===
+
+            # Command: Switch to Child Mode
+            if intent == "child":
+                print("🤖 Intent Detected: CHILD MODE")
+                if brain.user_age:
+                    # We already know the age
+                    brain.set_mode("child")
+                    response_text = f"Switching to Child Mode for age {brain.user_age}! 🌟"
+                    await bridge.send_command("LED", "GREEN_BLINK")
+                    await websocket.send_json({"type": "ai_response", "text": response_text})
+                    await bridge.say(response_text, priority=COMMAND)
+                    history.record(text, response_text, brain.current_mode, duration)
+                else:
+                    # We need to ask for age
+                    brain.set_waiting_for_age(True)
+                    await websocket.send_text(canned["ask_age"].client_frame)
+                    await bridge.say_canned(canned["ask_age"], priority=COMMAND)
+
+            # Command: Study Mode
+            elif intent == "study":
+                print("🤖 Intent Detected: STUDY")
+                brain.set_waiting_for_age(False)  # Cancel age wait if they switch mode
+                brain.set_mode("study")
+                await bridge.send_command("LED", "BLUE")
+                await websocket.send_text(canned["study"].client_frame)
+                await bridge.say_canned(canned["study"], priority=COMMAND)
+                history.record(text, canned["study"].text, brain.current_mode, duration)
+
+            # Command: Normal Mode
+            elif intent == "normal":
+                print("🤖 Intent Detected: NORMAL")
+                brain.set_waiting_for_age(False)
+                brain.set_mode("normal")
+                await bridge.send_command("LED", "GREEN")
+                await websocket.send_text(canned["normal"].client_frame)
+                await bridge.say_canned(canned["normal"], priority=COMMAND)
+                history.record(text, canned["normal"].text, brain.current_mode, duration)
+
+            # No Command? Just Chat (lowest priority; shed with a quick reply when saturated).
+            else:
+                # A reply speculated on the interim transcript of a streamed utterance
+                ai_response = await utterance.commit(text) if utterance is not None else None
+                if ai_response is None:
+                    try:
+                        async with admission.admit(CHAT):
+                            ai_response = await asyncio.to_thread(
+                                brain.process_user_input, text, None, deadline
+                            )
+                    except Overloaded:
+                        await websocket.send_text(canned["busy"].client_frame)
+                        return
+                print(f"💡 AI Says: {ai_response}")
+                await websocket.send_json({"type": "ai_response", "text": ai_response})
+                history.record(text, ai_response, brain.current_mode, duration)
+                await bridge.say(ai_response)
+    finally:
+        if utterance is not None:
+            utterance.close()  # nothing speculative outlives its utterance
@@ -0,0 +1,171 @@
+"""
+Admission Control - priority classes and load shedding for voice turns.
+Work is classified, highest priority first:
+
+    SAFETY   alarm / emergency intents: never queued, robot commands preempt speech
+    COMMAND  mode switches: never queued (no upstream work), ahead of speech on the robot link
+    LISTEN   transcription of an utterance (it might be an alarm, so it outranks chat)
+    CHAT     LLM turns: bounded queue, shed with a quick "busy" reply when it is full or a
+             turn has waited longer than ADMISSION_CHAT_WAIT_MS
+
+LISTEN and CHAT share ADMISSION_SLOTS concurrent slots; CHAT may hold at most
+ADMISSION_CHAT_SLOTS of them, so a free slot is always left for the next transcription. A
+freed slot goes to the highest-priority waiter. ADMISSION_CONTROL=0 turns all of this off
+(everything admitted immediately, robot commands in arrival order) for A/B runs.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from server.services.metrics import get_metrics
+
+SAFETY = 0
+COMMAND = 1
+LISTEN = 2
+CHAT = 3
+CLASS_NAMES = {SAFETY: "safety", COMMAND: "command", LISTEN: "listen", CHAT: "chat"}
+
+ENABLED = os.getenv("ADMISSION_CONTROL", "1").lower() in ("1", "true", "yes")
+SLOTS = int(os.getenv("ADMISSION_SLOTS", "32"))
+CHAT_SLOTS = int(os.getenv("ADMISSION_CHAT_SLOTS", "28"))
+CHAT_QUEUE = int(os.getenv("ADMISSION_CHAT_QUEUE", "8"))
+CHAT_MAX_WAIT = float(os.getenv("ADMISSION_CHAT_WAIT_MS", "3000")) / 1000.0
+LISTEN_QUEUE = int(os.getenv("ADMISSION_LISTEN_QUEUE", "64"))
+
+
+class Overloaded(Exception):
+    """The work was shed: its class queue is full or it waited too long."""
+
+
+class AdmissionController:
+    """Priority-ordered slots for LISTEN/CHAT work (event-loop only, not thread-safe)."""
+
+    def __init__(
+        self,
+        slots: int = SLOTS,
+        limits: Optional[Dict[int, int]] = None,
+        queues: Optional[Dict[int, int]] = None,
+        max_wait: Optional[Dict[int, float]] = None,
+        enabled: bool = ENABLED,
+    ) -> None:
+        self.enabled = enabled
+        self.slots = slots
+        self.free = slots
+        self.limits = limits if limits is not None else {CHAT: min(CHAT_SLOTS, slots)}
+        self.queue_limits = queues if queues is not None else {LISTEN: LISTEN_QUEUE, CHAT: CHAT_QUEUE}
+        self.max_wait = max_wait if max_wait is not None else {CHAT: CHAT_MAX_WAIT}
+        self.active: Dict[int, int] = {cls: 0 for cls in CLASS_NAMES}
+        self.queued: Dict[int, int] = {cls: 0 for cls in CLASS_NAMES}
+        self._waiters: List[list] = []  # heap of [priority, n, future]
+        self._counter = itertools.count()
+
+    async def acquire(self, cls: int) -> None:
+        """Wait for a slot; raises Overloaded if the work is shed."""
+        metrics = get_metrics()
+        name = CLASS_NAMES[cls]
+        if not self.enabled or cls <= COMMAND:
+            metrics.incr(f"admission.{name}.admitted")
+            return
+        if self.queued[cls] >= self.queue_limits.get(cls, self.slots):
+            metrics.incr(f"admission.{name}.shed")
+            raise Overloaded(f"{name} queue full")
+
+        started = time.monotonic()
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued[cls] += 1
+        heapq.heappush(self._waiters, [cls, next(self._counter), future])
+        self._dispatch()
+        try:
+            if not future.done():
+                await asyncio.wait({future}, timeout=self.max_wait.get(cls))
+        except asyncio.CancelledError:  # the connection went away while queued
+            if future.done():
+                self.release(cls)
+            else:
+                future.cancel()
+                self.queued[cls] -= 1
+            raise
+        if not future.done() or future.cancelled():
+            future.cancel()  # the entry is skipped by _dispatch
+            self.queued[cls] -= 1
+            metrics.incr(f"admission.{name}.shed")
+            raise Overloaded(f"{name} waited too long")
+        metrics.histogram(f"admission.wait.{name}").record(time.monotonic() - started)
+        metrics.incr(f"admission.{name}.admitted")
+
+    def try_acquire(self, cls: int) -> bool:
+        """Take a free slot only if nobody is waiting for one (speculative work never queues)."""
+        if not self.enabled or cls <= COMMAND:
+            return True
+        if self.free <= 0 or self._waiters or self.active[cls] >= self.limits.get(cls, self.slots):
+            get_metrics().incr(f"admission.{CLASS_NAMES[cls]}.declined")
+            return False
+        self.active[cls] += 1
+        self.free -= 1
+        return True
+
+    def release(self, cls: int) -> None:
+        if not self.enabled or cls <= COMMAND:
+            return
+        self.active[cls] -= 1
+        self.free += 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, cls: int) -> AsyncIterator[None]:
+        """async with admission.admit(CHAT): ...  (raises Overloaded when shed)"""
+        await self.acquire(cls)
+        try:
+            yield
+        finally:
+            self.release(cls)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the best waiters whose class is under its limit."""
+        deferred = []
+        while self._waiters and self.free > 0:
+            entry = heapq.heappop(self._waiters)
+            cls, _, future = entry
+            if future.done():
+                continue  # timed out
+            if self.active[cls] >= self.limits.get(cls, self.slots):
+                deferred.append(entry)
+                continue
+            self.queued[cls] -= 1
+            self.active[cls] += 1
+            self.free -= 1
+            future.set_result(None)
+        for entry in deferred:
+            heapq.heappush(self._waiters, entry)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slots": self.slots,
+            "free": self.free,
+            "classes": {
+                CLASS_NAMES[cls]: {
+                    "active": self.active[cls],
+                    "queued": self.queued[cls],
+                    "limit": self.limits.get(cls, self.slots),
+                    "queue_limit": self.queue_limits.get(cls),
+                }
+                for cls in (LISTEN, CHAT)
+            },
+        }
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller."""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
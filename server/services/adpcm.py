@@ -0,0 +1,139 @@
+"""
+IMA-ADPCM codec for 16-bit mono PCM.
+Compresses audio 4:1 into self-contained frames the ESP32 can decode with a few table lookups.
+
+Frame layout (little endian):
+    int16  predictor   - decoder state at the start of the frame
+    uint8  step_index  - decoder state at the start of the frame
+    uint8  reserved    - always 0
+    bytes  data        - 4-bit codes, two samples per byte, first sample in the high nibble
+"""
+
+import struct
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import audioop  # C implementation (removed from the stdlib in Python 3.13)
+except ImportError:
+    audioop = None
+
+FRAME_HEADER = struct.Struct("<hBB")
+FRAME_SAMPLES = 640  # 40 ms at 16 kHz -> 320 data bytes + 4 header bytes
+
+_INDEX_TABLE = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+
+_STEP_TABLE = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487,
+    12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+)
+
+State = Tuple[int, int]  # (predictor, step_index)
+
+
+def _encode_py(pcm: bytes, state: State) -> Tuple[bytes, State]:
+    """Pure-Python IMA-ADPCM encoder, bit-exact with audioop.lin2adpcm."""
+    valpred, index = state
+    step = _STEP_TABLE[index]
+    out = bytearray()
+    high: Optional[int] = None
+    for (val,) in struct.iter_unpack("<h", pcm):
+        diff = val - valpred
+        sign = 8 if diff < 0 else 0
+        if sign:
+            diff = -diff
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        half = step >> 1
+        if diff >= half:
+            delta |= 2
+            diff -= half
+            vpdiff += half
+        quarter = step >> 2
+        if diff >= quarter:
+            delta |= 1
+            vpdiff += quarter
+        valpred = valpred - vpdiff if sign else valpred + vpdiff
+        valpred = max(-32768, min(32767, valpred))
+        delta |= sign
+        index = max(0, min(88, index + _INDEX_TABLE[delta]))
+        step = _STEP_TABLE[index]
+        if high is None:
+            high = (delta << 4) & 0xF0
+        else:
+            out.append(high | (delta & 0x0F))
+            high = None
+    return bytes(out), (valpred, index)
+
+
+def _decode_py(data: bytes, state: State) -> Tuple[bytes, State]:
+    """Pure-Python IMA-ADPCM decoder, bit-exact with audioop.adpcm2lin."""
+    valpred, index = state
+    step = _STEP_TABLE[index]
+    samples: List[int] = []
+    for byte in data:
+        for delta in (byte >> 4, byte & 0x0F):
+            index = max(0, min(88, index + _INDEX_TABLE[delta]))
+            vpdiff = step >> 3
+            if delta & 4:
+                vpdiff += step
+            if delta & 2:
+                vpdiff += step >> 1
+            if delta & 1:
+                vpdiff += step >> 2
+            valpred = valpred - vpdiff if delta & 8 else valpred + vpdiff
+            valpred = max(-32768, min(32767, valpred))
+            step = _STEP_TABLE[index]
+            samples.append(valpred)
+    return struct.pack(f"<{len(samples)}h", *samples), (valpred, index)
+
+
+def encode_block(pcm: bytes, state: State = (0, 0)) -> Tuple[bytes, State]:
+    """Encode raw 16-bit PCM; returns (adpcm_bytes, new_state)."""
+    if audioop is not None:
+        return audioop.lin2adpcm(pcm, 2, state)
+    return _encode_py(pcm, state)
+
+
+def decode_block(data: bytes, state: State = (0, 0)) -> Tuple[bytes, State]:
+    """Decode IMA-ADPCM codes back to 16-bit PCM; returns (pcm_bytes, new_state)."""
+    if audioop is not None:
+        return audioop.adpcm2lin(data, 2, state)
+    return _decode_py(data, state)
+
+
+def encode_frames(pcm: bytes, frame_samples: int = FRAME_SAMPLES) -> List[bytes]:
+    """
+    Split 16-bit mono PCM into independently decodable ADPCM frames.
+    Each frame carries the decoder state, so a lost frame only costs its own 40 ms.
+    """
+    frames: List[bytes] = []
+    state: State = (0, 0)
+    frame_bytes = frame_samples * 2
+    for offset in range(0, len(pcm) - len(pcm) % 2, frame_bytes):
+        chunk = pcm[offset:offset + frame_bytes]
+        header = FRAME_HEADER.pack(state[0], state[1], 0)
+        data, state = encode_block(chunk, state)
+        frames.append(header + data)
+    return frames
+
+
+def decode_frame(frame: bytes) -> bytes:
+    """Decode a single frame produced by encode_frames() to 16-bit PCM."""
+    if len(frame) < FRAME_HEADER.size:
+        return b""
+    predictor, index, _ = FRAME_HEADER.unpack_from(frame)
+    pcm, _ = decode_block(frame[FRAME_HEADER.size:], (predictor, min(index, 88)))
+    return pcm
+
+
+def decode_frames(frames: Iterable[bytes]) -> bytes:
+    """Decode a sequence of frames and concatenate the PCM."""
+    return b"".join(decode_frame(f) for f in frames)
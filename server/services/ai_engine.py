@@ -1,50 +1,102 @@
 """
 AI Engine Service for Groq API integration.
 Handles LLM processing and response generation with mode context and real-world awareness.
+Replies come from Groq or, in privacy mode and when Groq is unavailable, from a local CPU
+model (see llm_backend).
 """
 
-import os
-from typing import Optional
+import json
+from typing import Any, Optional
 from dotenv import load_dotenv
-from groq import Groq
 
+from server.services.cluster import get_cluster
+from server.services.container import get_container
+from server.services.metrics import get_metrics
+from server.services.model_router import LARGE, ModelRouter
+from server.services.llm_backend import (
+    LLM_BACKEND,
+    LOCAL_FALLBACK,
+    LOCAL_RESERVE,
+    PRIVACY_LLM,
+    ChatBackend,
+    GroqBackend,
+)
+from server.services.recorder import K_REPLY, get_recorder
+from server.services.resilience import Deadline, UpstreamError
+from server.services.single_flight import SingleFlight, content_key
 from server.services.world_context import get_world_context
 
 load_dotenv()
 
-_engine_instance: Optional["AIEngine"] = None
-
 class AIEngine:
     """
     Service class for interacting with Groq API.
     Uses current_mode and world context (time, weather) to build dynamic system prompts.
+    Each turn is routed to a fast or large model by ModelRouter; identical concurrent
+    prompts are coalesced into one call. Privacy-mode turns, and turns Groq cannot answer,
+    go to the local model when one is configured.
     """
 
     def __init__(self):
-        """Initialize Groq client with API key from environment."""
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY environment variable not set")
-
-        self.client = Groq(api_key=api_key)
-        self.model = "llama-3.3-70b-versatile"  # Default Groq model
+        """Set up mode state; the Groq client is resolved from the container on first use."""
+        self.router = ModelRouter()  # fast/large model tiers
+        self.groq = GroqBackend(self.router)
+        self.local = get_container().local_llm  # None unless LOCAL_LLM_MODEL is set
+        if self.local is None and PRIVACY_LLM == "local":
+            print("🔒 No local LLM configured: privacy-mode turns are answered by Groq")
+        self._flight: SingleFlight[str] = SingleFlight("chat")
         self.current_mode: str = "normal"
         self.user_age: Optional[int] = None  # New: Stores the user's age
+        self.waiting_for_age: bool = False
+
+    @property
+    def client(self) -> Any:
+        """Shared Groq client (raises ValueError if GROQ_API_KEY is not set)."""
+        return get_container().groq_client
 
-    def set_mode(self, mode: str) -> None:
+    def set_mode(self, mode: str, propagate: bool = True) -> None:
         """Update the current AI personality mode (study, alarm, normal, privacy, child)."""
         self.current_mode = (mode or "normal").lower()
         print(f"🧠 AI Mode switched to: {self.current_mode}")
+        if propagate:
+            get_cluster().publish_state(mode=self.current_mode)
 
-    def set_age(self, age: int) -> None:
+    def set_age(self, age: int, propagate: bool = True) -> None:
         """Set the user's age for adaptive learning."""
         self.user_age = age
         print(f"🎂 User Age set to: {self.user_age}")
-
-    def process_user_input(self, user_text: str, context: Optional[dict] = None) -> str:
+        if propagate:
+            get_cluster().publish_state(age=self.user_age)
+
+    def set_waiting_for_age(self, waiting: bool, propagate: bool = True) -> None:
+        """Track whether Gus has asked for the user's age and awaits the answer."""
+        if waiting == self.waiting_for_age:
+            return
+        self.waiting_for_age = waiting
+        if propagate:
+            get_cluster().publish_state(waiting_for_age=waiting)
+
+    def export_state(self) -> dict:
+        """Conversation state shared with the other workers."""
+        return {"mode": self.current_mode, "age": self.user_age, "waiting_for_age": self.waiting_for_age}
+
+    def apply_state(self, state: dict) -> None:
+        """Apply conversation state received from another worker (not re-broadcast)."""
+        if "mode" in state and state["mode"] != self.current_mode:
+            self.set_mode(state["mode"], propagate=False)
+        if "age" in state and state["age"] != self.user_age:
+            self.set_age(state["age"], propagate=False)
+        if "waiting_for_age" in state:
+            self.set_waiting_for_age(bool(state["waiting_for_age"]), propagate=False)
+
+    def process_user_input(
+        self, user_text: str, context: Optional[dict] = None, deadline: Optional[Deadline] = None
+    ) -> str:
         """
         Generate a response using Groq with a dynamic system prompt.
+        deadline is the turn's end-to-end budget (a fresh UPSTREAM_BUDGET_MS one if omitted).
         """
+        deadline = deadline or Deadline()
         # STEP A: Determine Personality based on Mode & Age
         if self.current_mode == "child":
             # === GUS JR. (Child Mode) ===
@@ -65,8 +117,9 @@ class AIEngine:
             base_personality = "You are Gus, a witty and helpful IoT robot assistant for Rohan, an engineering student."
 
         # STEP B: Real-world context
-        world = get_world_context()
-        real_world_context = world.get_full_context()
+        metrics = get_metrics()
+        with metrics.timer("pipeline.context"):
+            real_world_context = get_world_context().get_full_context(deadline)
 
         # STEP C: Combined system message
         system_message = (
@@ -79,30 +132,58 @@ class AIEngine:
         if context:
             system_message += f"\nExtra: Mode={context.get('mode', 'normal')}"
 
-        # STEP D: Send to Groq
+        # STEP D: Send to Groq (fast or large model, see model_router)
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_text},
-                ],
-                temperature=0.7,
-                max_tokens=150,
+            messages = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_text},
+            ]
+            # Identical concurrent prompts (same text, mode and context) share one upstream call
+            backend = self.backend_for(self.current_mode)
+            key = content_key(
+                json.dumps(messages, sort_keys=True), self.current_mode, backend.name, *self.router.models.values()
             )
-            return completion.choices[0].message.content
+            return self._flight.do(key, lambda: self._complete(backend, messages, user_text, deadline))
         except Exception as e:
             print(f"AI Engine error: {e}")
+            metrics.incr("upstream.groq.chat.errors")
             return "I'm having trouble processing that right now. Please try again."
 
+    def backend_for(self, mode: str) -> ChatBackend:
+        """The local model for privacy mode (or everything, LLM_BACKEND=local), else Groq."""
+        if self.local is not None and (LLM_BACKEND == "local" or (mode == "privacy" and PRIVACY_LLM == "local")):
+            return self.local
+        return self.groq
+
+    def _complete(self, backend: ChatBackend, messages: list, user_text: str, deadline: Deadline) -> str:
+        metrics = get_metrics()
+        metrics.incr(f"ai.backend.{backend.name}")
+        if backend is self.local or self.local is None or not LOCAL_FALLBACK:
+            reply = backend.complete(messages, user_text, self.current_mode, 150, deadline)
+        else:
+            try:
+                # Keep part of the budget back so the local model can still answer in time
+                upstream = deadline.within(max(0.0, deadline.remaining() - LOCAL_RESERVE))
+                reply = backend.complete(messages, user_text, self.current_mode, 150, upstream)
+            except UpstreamError as e:
+                print(f"⚠️ Groq unavailable ({e}); answering with the local model")
+                metrics.incr("ai.fallback.local")
+                reply = self.local.complete(messages, user_text, self.current_mode, 150, deadline)
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.annotate(K_REPLY, reply or "")
+        return reply
+
+    @property
+    def model(self) -> str:
+        """The large-tier Groq model."""
+        return self.router.models[LARGE]
+
     def set_model(self, model_name: str):
-        """Change the Groq model being used."""
-        self.model = model_name
+        """Change the Groq model used for the large tier."""
+        self.router.models[LARGE] = model_name
 
 
 def get_ai_engine() -> AIEngine:
     """Return the shared singleton AI engine."""
-    global _engine_instance
-    if _engine_instance is None:
-        _engine_instance = AIEngine()
-    return _engine_instance
\ No newline at end of file
+    return get_container().ai_engine
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Audio Cache Service - content-addressed on-disk cache for synthesized speech.
+Keys are SHA-256 hashes of (voice id, codec, text); least recently used entries are evicted
+once the cache grows past its byte budget.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "shared", "tts_cache")
+
+_LEN = struct.Struct("<H")
+
+
+def cache_key(voice_id: str, codec: str, text: str) -> str:
+    """Return the content address for a rendered phrase."""
+    digest = hashlib.sha256()
+    for part in (voice_id, codec, text.strip()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def pack_frames(frames: List[bytes]) -> bytes:
+    """Serialize a list of audio frames as length-prefixed records."""
+    return b"".join(_LEN.pack(len(f)) + f for f in frames)
+
+
+def unpack_frames(blob: bytes) -> List[bytes]:
+    """Inverse of pack_frames(); stops at the first truncated record."""
+    frames: List[bytes] = []
+    offset = 0
+    while offset + _LEN.size <= len(blob):
+        (length,) = _LEN.unpack_from(blob, offset)
+        offset += _LEN.size
+        if offset + length > len(blob):
+            break
+        frames.append(blob[offset:offset + length])
+        offset += length
+    return frames
+
+
+class AudioCache:
+    """
+    Disk-backed LRU cache of encoded audio frames.
+    The in-memory index only holds file sizes in recency order; audio stays on disk.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _load_index(self) -> None:
+        """Rebuild recency order from file mtimes so LRU survives restarts."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """Return cached frames for key, or None on a miss."""
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._index.pop(key, 0)
+            return None
+        return unpack_frames(blob)
+
+    def put(self, key: str, frames: List[bytes]) -> None:
+        """Store frames under key (atomic rename) and evict down to the byte budget."""
+        blob = pack_frames(frames)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Audio cache write failed: {e}")
+            return
+        with self._lock:
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = len(blob)
+            self._total += len(blob)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    @property
+    def size_bytes(self) -> int:
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._index)
@@ -0,0 +1,175 @@
+"""
+Audio Uplink Codecs - compressed utterance uploads on /ws/audio.
+The codec is negotiated per connection with the WebSocket subprotocol header, like the
+robot link (services/robot_protocol.py):
+
+    gus.audio.opus.v1    Opus, 20 ms packets at 16 kHz (~16 kbit/s), each prefixed with its
+                         uint16 little-endian length. Offered only when opuslib and libopus
+                         are installed on the server.
+    gus.audio.adpcm.v1   IMA-ADPCM frames from services/adpcm.py, back to back (4:1, 324
+                         bytes per 40 ms); a few table lookups per sample on the ESP32.
+    (none)               one WAV (or browser WebM) file per message, as before.
+
+Each binary message is one utterance, or one chunk of an utterance streamed between
+utterance_start/utterance_end frames (services/speculation.py). The server decodes it to 16 kHz mono 16-bit PCM in
+memory and wraps it in a WAV header, which the transcriber sends to Whisper as-is: no
+FFmpeg, no temp files. Mic clients use the same classes to encode.
+"""
+
+import io
+import struct
+import time
+import wave
+from typing import Iterable, Optional, Union
+
+from server.services.adpcm import FRAME_HEADER, FRAME_SAMPLES, decode_frames, encode_frames
+from server.services.metrics import get_metrics
+
+try:
+    import opuslib  # needs the libopus shared library
+except Exception:  # ImportError, or opuslib's own error when libopus is missing
+    opuslib = None
+
+SAMPLE_RATE = 16000
+OPUS_PROTOCOL = "gus.audio.opus.v1"
+ADPCM_PROTOCOL = "gus.audio.adpcm.v1"
+OPUS_FRAME_SAMPLES = 320  # 20 ms
+OPUS_BITRATE = 16000
+PACKET_LENGTH = struct.Struct("<H")
+
+
+class UplinkError(ValueError):
+    """A message cannot be decoded with the connection's negotiated codec."""
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Wrap 16-bit mono PCM in a WAV header (in memory)."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+WAV_HEADER_BYTES = 44
+
+
+def wav_header(pcm_bytes: int, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """The header pcm_to_wav writes in front of `pcm_bytes` of 16-bit mono PCM."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + pcm_bytes, b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, sample_rate * 2, 2, 16, b"data", pcm_bytes,
+    )
+
+
+def wav_to_pcm(wav_bytes: bytes) -> bytes:
+    """16-bit mono PCM samples of a 16 kHz mono WAV file."""
+    with wave.open(io.BytesIO(wav_bytes)) as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2 or w.getframerate() != SAMPLE_RATE:
+            raise UplinkError("expected 16 kHz mono 16-bit WAV")
+        return w.readframes(w.getnframes())
+
+
+class AdpcmUplink:
+    """IMA-ADPCM: self-contained 40 ms frames, 4 bits per sample."""
+
+    name = "adpcm"
+    protocol = ADPCM_PROTOCOL
+    frame_bytes = FRAME_HEADER.size + FRAME_SAMPLES // 2
+
+    def encode(self, pcm: bytes) -> bytes:
+        if len(pcm) % 4:  # whole bytes of codes: an even number of samples
+            pcm += b"\x00" * (4 - len(pcm) % 4)
+        return b"".join(encode_frames(pcm))
+
+    def decode(self, message: bytes) -> bytes:
+        frames = [message[i:i + self.frame_bytes] for i in range(0, len(message), self.frame_bytes)]
+        if not frames or len(frames[-1]) <= FRAME_HEADER.size:
+            raise UplinkError(f"truncated ADPCM frame ({len(message)} bytes)")
+        return decode_frames(frames)
+
+
+class OpusUplink:
+    """Opus VOIP mode: length-prefixed 20 ms packets."""
+
+    name = "opus"
+    protocol = OPUS_PROTOCOL
+
+    def __init__(self, bitrate: int = OPUS_BITRATE) -> None:
+        self.bitrate = bitrate
+
+    def encode(self, pcm: bytes) -> bytes:
+        encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        encoder.bitrate = self.bitrate
+        frame = OPUS_FRAME_SAMPLES * 2
+        if len(pcm) % frame:
+            pcm += b"\x00" * (frame - len(pcm) % frame)
+        out = bytearray()
+        for offset in range(0, len(pcm), frame):
+            packet = encoder.encode(pcm[offset:offset + frame], OPUS_FRAME_SAMPLES)
+            out += PACKET_LENGTH.pack(len(packet)) + packet
+        return bytes(out)
+
+    def decode(self, message: bytes) -> bytes:
+        decoder = opuslib.Decoder(SAMPLE_RATE, 1)
+        pcm = bytearray()
+        offset = 0
+        try:
+            while offset < len(message):
+                (length,) = PACKET_LENGTH.unpack_from(message, offset)
+                offset += PACKET_LENGTH.size
+                if length == 0 or offset + length > len(message):
+                    raise UplinkError("truncated Opus packet")
+                pcm += decoder.decode(message[offset:offset + length], OPUS_FRAME_SAMPLES)
+                offset += length
+        except (struct.error, opuslib.OpusError) as e:
+            raise UplinkError(f"bad Opus stream: {e}")
+        return bytes(pcm)
+
+
+Uplink = Union[AdpcmUplink, OpusUplink]
+
+# Server preference order
+_UPLINKS = {ADPCM_PROTOCOL: AdpcmUplink()}
+if opuslib is not None:
+    _UPLINKS = {OPUS_PROTOCOL: OpusUplink(), **_UPLINKS}
+SUPPORTED_PROTOCOLS = tuple(_UPLINKS)
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """
+    Pick the uplink subprotocol to accept from those the mic offered.
+    Returns None for clients that offered none (they send WAV/WebM files).
+    """
+    offered = list(offered)
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return None
+
+
+def get_uplink(protocol: Optional[str]) -> Optional[Uplink]:
+    """Return the shared codec for a negotiated subprotocol (None for plain files)."""
+    return _UPLINKS.get(protocol) if protocol else None
+
+
+def decode_to_wav(uplink: Uplink, message: bytes) -> bytes:
+    """Decode one uploaded utterance to a 16 kHz mono WAV file; raises UplinkError."""
+    return pcm_to_wav(decode_to_pcm(uplink, message))
+
+
+def decode_to_pcm(uplink: Uplink, message: bytes) -> bytes:
+    """Decode one uploaded message (an utterance or a streamed chunk) to PCM; raises UplinkError."""
+    metrics = get_metrics()
+    started = time.perf_counter()
+    try:
+        pcm = uplink.decode(message)
+    except UplinkError:
+        metrics.incr(f"uplink.{uplink.name}.errors")
+        raise
+    metrics.histogram(f"uplink.{uplink.name}.decode").record(time.perf_counter() - started)
+    metrics.incr(f"uplink.{uplink.name}.bytes", len(message))
+    metrics.incr(f"uplink.{uplink.name}.pcm_bytes", len(pcm))
+    return pcm
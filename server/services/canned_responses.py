@@ -0,0 +1,124 @@
+"""
+Canned Responses Service - pre-built frames for fixed replies.
+Every static reply, alert and hardware command used by the intent handlers is serialized once
+at startup (and its speech pre-rendered when a TTS backend is configured), so handlers only
+push ready-made frames onto the sockets.
+"""
+
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+
+from server.services.robot_protocol import prebuild_all
+from server.services.tts_engine import get_tts_engine, split_sentences
+
+# Static replies spoken by Gus, keyed by intent
+CANNED_TEXT: Dict[str, str] = {
+    "ask_age": "Sure thing! But first, how old are you?",
+    "age_retry": "I didn't catch that number. How old are you?",
+    "study": "Study Mode Activated. Blue LED is on. I am now your strict tutor.",
+    "alarm": "ALARM TRIGGERED. Security protocols active.",
+    "normal": "Returning to Normal Mode. Systems green.",
+    "busy": "I'm a bit busy right now. Ask me again in a moment.",
+    "too_long": "That was too long for me to take in. Could you say it in shorter bits?",
+}
+
+# Dashboard alert banners
+CANNED_ALERTS: Dict[str, str] = {
+    "security_breach": "SECURITY BREACH DETECTED",
+    "manual_alarm": "MANUAL ALARM TRIGGERED",
+}
+
+# Hardware commands issued by mode switches
+CANNED_COMMANDS: List[Tuple[str, str]] = [
+    ("LED", "BLUE"),
+    ("LED", "GREEN"),
+    ("LED", "GREEN_BLINK"),
+    ("LED", "RED_BLINK"),
+    ("LED", "OFF"),
+    ("BUZZER", "ON"),
+    ("SERVO", "DOWN"),
+]
+
+COMMAND_ACK = {"status": "ack", "msg": "Command Executed"}
+
+
+def dumps(payload: dict) -> str:
+    """Serialize a frame exactly like Starlette's send_json does."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class CannedResponse:
+    """One static reply with its client frame and optional pre-rendered speech audio."""
+
+    def __init__(self, key: str, text: str) -> None:
+        self.key = key
+        self.text = text
+        self.client_frame = dumps({"type": "ai_response", "text": text})
+        self.audio_frames: Optional[List[bytes]] = None
+        self.audio_format: Optional[str] = None
+
+    def render_audio(self) -> None:
+        """Synthesize speech through the TTS cache (blocking; run in a worker thread)."""
+        tts = get_tts_engine()
+        if tts is None:
+            return
+        frames: List[bytes] = []
+        for sentence in split_sentences(self.text):
+            frames.extend(tts.render(sentence, cacheable=True))
+        self.audio_frames = frames
+        self.audio_format = f"{tts.codec}/{tts.sample_rate}"
+
+    def robot_commands(self) -> List[Tuple[str, str]]:
+        """Robot commands this reply sends, for pre-encoding in every wire codec."""
+        if self.audio_frames is None:
+            return [("SAY", self.text)]
+        return [("AUDIO_START", self.audio_format), ("AUDIO_END", str(len(self.audio_frames)))]
+
+
+class CannedResponses:
+    """Registry of pre-built frames; warm_up() adds the pre-rendered speech."""
+
+    def __init__(self) -> None:
+        self.responses: Dict[str, CannedResponse] = {
+            key: CannedResponse(key, text) for key, text in CANNED_TEXT.items()
+        }
+        self.alert_frames: Dict[str, str] = {
+            key: dumps({"type": "alert", "message": message}) for key, message in CANNED_ALERTS.items()
+        }
+        self.ack_frame = dumps(COMMAND_ACK)
+        self.warmed = False
+
+    def __getitem__(self, key: str) -> CannedResponse:
+        return self.responses[key]
+
+    def alert(self, key: str) -> str:
+        return self.alert_frames[key]
+
+    async def warm_up(self) -> None:
+        """Pre-render speech for every canned reply and pre-encode every robot command."""
+        if self.warmed:
+            return
+        if get_tts_engine() is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(None, response.render_audio) for response in self.responses.values()
+            ))
+        commands = list(CANNED_COMMANDS)
+        for response in self.responses.values():
+            commands.extend(response.robot_commands())
+        prebuild_all(commands)
+        self.warmed = True
+        rendered = sum(1 for r in self.responses.values() if r.audio_frames)
+        print(f"🗣️ Canned responses ready: {len(self.responses)} replies, {rendered} pre-rendered")
+
+
+_canned_instance: Optional[CannedResponses] = None
+
+
+def get_canned_responses() -> CannedResponses:
+    """Return the shared canned-response registry."""
+    global _canned_instance
+    if _canned_instance is None:
+        _canned_instance = CannedResponses()
+    return _canned_instance
@@ -0,0 +1,178 @@
+"""
+Cluster Service - coordinates workers through the shared state backend.
+  - Robot ownership: the worker holding the /ws/robot socket registers itself under
+    ROBOT_OWNER_KEY (with a heartbeat TTL); other workers route robot commands to it.
+    Only a live link is heartbeated. While a dropped robot may still resume its session,
+    its worker gives up ROBOT_OWNER_KEY and parks under ROBOT_PARKED_KEY for the resume TTL,
+    so commands from other workers still reach its replay buffer.
+  - Sessions are per worker: a robot that reconnects to another worker starts a new session
+    there. The claim is broadcast on ROBOT_CLAIM_CHANNEL, and the parked worker drops its
+    buffer, which can no longer be replayed.
+  - Conversation state: AI mode, user age and the "waiting for age" flag are applied
+    locally and broadcast, so every worker answers in the same mode.
+With the default in-process backend this all short-circuits to local calls.
+"""
+
+import asyncio
+import json
+from typing import Optional
+
+from server.services.admission import CHAT, COMMAND
+from server.services.state_backend import StateBackend, create_backend
+
+ROBOT_OWNER_KEY = "robot:owner"
+ROBOT_PARKED_KEY = "robot:parked"
+ROBOT_CLAIM_CHANNEL = "robot:claimed"
+STATE_KEY = "conversation:state"
+STATE_CHANNEL = "conversation"
+OWNER_TTL = 30.0
+HEARTBEAT_SECONDS = 10.0
+
+
+class Cluster:
+    """This worker's view of the cluster."""
+
+    def __init__(self, backend: Optional[StateBackend] = None) -> None:
+        self.backend = backend or create_backend()
+        self.worker_id = self.backend.worker_id
+        self.owns_robot = False
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._started = False
+
+    @property
+    def robot_channel(self) -> str:
+        return f"robot:{self.worker_id}"
+
+    async def start(self) -> None:
+        """Subscribe to cluster channels and load the shared conversation state."""
+        if self._started:
+            return
+        self.backend.subscribe(STATE_CHANNEL, self._on_state)
+        self.backend.subscribe(self.robot_channel, self._on_robot_message)
+        self.backend.subscribe(ROBOT_CLAIM_CHANNEL, self._on_robot_claimed)
+        await self.backend.start()
+        self._started = True
+        raw = await self.backend.get(STATE_KEY)
+        if raw:
+            self._apply_state(json.loads(raw))
+        print(f"🕸️ Cluster ready: worker {self.worker_id} ({self.backend.name} backend)")
+
+    async def stop(self) -> None:
+        await self.release_robot()
+        await self.backend.stop()
+        self._started = False
+
+    # ---- Robot ownership and command routing ----
+
+    async def claim_robot(self) -> None:
+        """Called when the robot connects to this worker."""
+        self.owns_robot = True
+        await self.backend.set(ROBOT_OWNER_KEY, self.worker_id, ttl=OWNER_TTL)
+        await self.backend.delete(ROBOT_PARKED_KEY)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        await self.backend.publish(ROBOT_CLAIM_CHANNEL, {})
+
+    async def park_robot(self, ttl: float) -> None:
+        """
+        Called when this worker's robot socket closes but the robot may resume here within
+        `ttl`: stop owning it, but keep taking its commands for the replay buffer.
+        """
+        await self._stop_owning()
+        owner = await self.backend.get(ROBOT_OWNER_KEY)
+        if owner and owner != self.worker_id:
+            # It already reconnected to another worker before this one noticed the dead socket
+            await self._on_robot_claimed({"sender": owner})
+            return
+        await self.backend.set(ROBOT_PARKED_KEY, self.worker_id, ttl=ttl)
+
+    async def release_robot(self) -> None:
+        """Called when this worker's robot socket closes for good (or its session expired)."""
+        await self._stop_owning()
+        await self.backend.delete(ROBOT_PARKED_KEY, only_if=self.worker_id)
+
+    async def _stop_owning(self) -> None:
+        self.owns_robot = False
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        await self.backend.delete(ROBOT_OWNER_KEY, only_if=self.worker_id)
+
+    async def _heartbeat_loop(self) -> None:
+        while self.owns_robot:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            await self.backend.set(ROBOT_OWNER_KEY, self.worker_id, ttl=OWNER_TTL)
+
+    async def route_to_robot(self, message: dict) -> bool:
+        """
+        Forward a robot operation to the worker that owns the robot socket, or, while the
+        robot is away, to the worker holding its session. Returns False when no other worker
+        has the robot.
+        """
+        owner = await self.backend.get(ROBOT_OWNER_KEY) or await self.backend.get(ROBOT_PARKED_KEY)
+        if not owner or owner == self.worker_id:
+            return False
+        await self.backend.publish(f"robot:{owner}", message)
+        return True
+
+    async def _on_robot_message(self, message: dict) -> None:
+        from server.services.canned_responses import get_canned_responses
+        from server.services.hardware_bridge import get_hardware_bridge
+
+        bridge = get_hardware_bridge()
+        kind = message.get("kind")
+        if kind == "command":
+            priority = message.get("priority", COMMAND)
+            await bridge.send_command(message["action"], message["value"], priority=priority)
+        elif kind == "say":
+            await bridge.say(message["text"], priority=message.get("priority", CHAT))
+        elif kind == "say_canned":
+            await bridge.say_canned(get_canned_responses()[message["key"]], priority=message.get("priority", CHAT))
+
+    async def _on_robot_claimed(self, message: dict) -> None:
+        from server.services.hardware_bridge import get_hardware_bridge
+
+        if message.get("sender") == self.worker_id:
+            return
+        # The robot started a new session elsewhere: ours can never be resumed
+        get_hardware_bridge().drop_parked_sessions()
+        await self.backend.delete(ROBOT_PARKED_KEY, only_if=self.worker_id)
+
+    # ---- Conversation state ----
+
+    def publish_state(self, **fields) -> None:
+        """Broadcast local conversation-state changes (fire-and-forget from sync code)."""
+        if not self._started:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(self._publish_state(fields))
+
+    async def _publish_state(self, fields: dict) -> None:
+        from server.services.ai_engine import get_ai_engine
+
+        await self.backend.publish(STATE_CHANNEL, fields)
+        await self.backend.set(STATE_KEY, json.dumps(get_ai_engine().export_state()))
+
+    async def _on_state(self, message: dict) -> None:
+        if message.get("sender") == self.worker_id:
+            return
+        self._apply_state(message)
+
+    def _apply_state(self, fields: dict) -> None:
+        from server.services.ai_engine import get_ai_engine
+
+        get_ai_engine().apply_state(fields)
+
+
+_cluster: Optional[Cluster] = None
+
+
+def get_cluster() -> Cluster:
+    """Return this worker's cluster coordinator."""
+    global _cluster
+    if _cluster is None:
+        _cluster = Cluster()
+    return _cluster
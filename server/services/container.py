@@ -0,0 +1,107 @@
+"""
+Service Container - lazily constructed, lifespan-managed shared services.
+Importing the server must stay cheap: nothing here touches the network, the database or
+heavy SDKs until a service is first used. The container owns one pooled HTTP client that
+every upstream caller (Groq, OpenWeatherMap) reuses, and closes it on shutdown.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:  # imported lazily at runtime
+    import httpx
+    from server.services.ai_engine import AIEngine
+    from server.services.llm_backend import LocalBackend
+    from server.services.transcriber import Transcriber
+
+HTTP_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "30"))
+
+
+class ServiceContainer:
+    """Holds the process-wide service instances; each is built on first access."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()  # groq_client builds http_client while holding it
+        self._http_client: Optional["httpx.Client"] = None
+        self._groq_client: Optional[Any] = None
+        self._ai_engine: Optional["AIEngine"] = None
+        self._transcriber: Optional["Transcriber"] = None
+        self._local_llm: Optional["LocalBackend"] = None
+        self._local_llm_built = False
+
+    @property
+    def http_client(self) -> "httpx.Client":
+        """Shared keep-alive HTTP connection pool for all upstream APIs."""
+        if self._http_client is None:
+            with self._lock:
+                if self._http_client is None:
+                    import httpx
+                    self._http_client = httpx.Client(
+                        timeout=HTTP_TIMEOUT,
+                        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                    )
+        return self._http_client
+
+    @property
+    def groq_client(self) -> Any:
+        """Single Groq SDK client (chat + Whisper) on top of the shared HTTP pool."""
+        if self._groq_client is None:
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY environment variable not set")
+            with self._lock:
+                if self._groq_client is None:
+                    from groq import Groq
+                    # Retries and timeouts are handled per call by the resilience layer
+                    self._groq_client = Groq(api_key=api_key, http_client=self.http_client, max_retries=0)
+        return self._groq_client
+
+    @property
+    def ai_engine(self) -> "AIEngine":
+        if self._ai_engine is None:
+            with self._lock:
+                if self._ai_engine is None:
+                    from server.services.ai_engine import AIEngine
+                    self._ai_engine = AIEngine()
+        return self._ai_engine
+
+    @property
+    def transcriber(self) -> "Transcriber":
+        if self._transcriber is None:
+            with self._lock:
+                if self._transcriber is None:
+                    from server.services.transcriber import Transcriber
+                    self._transcriber = Transcriber()
+        return self._transcriber
+
+    @property
+    def local_llm(self) -> Optional["LocalBackend"]:
+        """The on-CPU model backend, or None unless LOCAL_LLM_MODEL is set (see llm_backend)."""
+        if not self._local_llm_built:
+            with self._lock:
+                if not self._local_llm_built:
+                    from server.services.llm_backend import build_local_backend
+                    self._local_llm = build_local_backend()
+                    self._local_llm_built = True
+        return self._local_llm
+
+    def close(self) -> None:
+        """Release pooled connections and the local model worker (called from the FastAPI lifespan on shutdown)."""
+        if self._http_client is not None:
+            self._http_client.close()
+        self._http_client = None
+        self._groq_client = None
+        if self._local_llm is not None:
+            self._local_llm.close()
+
+
+_container: Optional[ServiceContainer] = None
+
+
+def get_container() -> ServiceContainer:
+    """Return the process-wide service container."""
+    global _container
+    if _container is None:
+        _container = ServiceContainer()
+    return _container
@@ -0,0 +1,254 @@
+"""
+Diagnostics Service - on-demand CPU profiles, memory snapshots and task dumps.
+Nothing here costs anything until an admin asks for it (routers/admin_router.py, enabled by
+setting ADMIN_TOKEN):
+
+  - CPU: a sampling profiler thread reads every thread's stack (sys._current_frames) every
+    PROFILE_INTERVAL_MS for a bounded number of seconds and returns collapsed stacks
+    ("thread;module:function;... count" lines), the input format of flamegraph.pl and
+    speedscope. One profile at a time.
+  - Memory: tracemalloc is started on request (it slows allocations while on), then named
+    snapshots can be taken and compared, top allocation sites first. The last
+    MEMORY_SNAPSHOTS snapshots are kept.
+  - Tasks: every asyncio task with its coroutine, where it is suspended and how long it has
+    existed. Creation times come from a task factory installed at startup when diagnostics
+    are enabled; tasks created before it have no age.
+"""
+
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ENABLED = bool(ADMIN_TOKEN)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+MEMORY_SNAPSHOTS = int(os.getenv("MEMORY_SNAPSHOTS", "4"))
+MEMORY_FRAMES = int(os.getenv("MEMORY_FRAMES", "8"))  # traceback depth recorded by tracemalloc
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+
+class Busy(Exception):
+    """A CPU profile is already running."""
+
+
+class Diagnostics:
+    """CPU sampling profiler, tracemalloc snapshots and asyncio task ages."""
+
+    def __init__(self) -> None:
+        self._profile_lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+        self._snapshot_ids = itertools.count(1)  # never reused, even within one millisecond
+        self._snapshot_times: Dict[str, float] = {}
+        self._born: "weakref.WeakKeyDictionary[asyncio.Task, float]" = weakref.WeakKeyDictionary()
+
+    # ---- CPU ----
+
+    def profile_cpu(self, seconds: float, interval: float = PROFILE_INTERVAL) -> dict:
+        """
+        Sample all threads for `seconds` (blocking; run it in a worker thread). Returns the
+        collapsed stacks plus sample counts.
+        """
+        seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+        interval = max(0.001, interval)
+        if not self._profile_lock.acquire(blocking=False):
+            raise Busy("a CPU profile is already running")
+        try:
+            stacks: Counter = Counter()
+            me = threading.get_ident()
+            names = {}
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            while time.perf_counter() < deadline:
+                if len(names) != threading.active_count():
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stacks[_collapse(names.get(ident, f"thread-{ident}"), frame)] += 1
+                samples += 1
+                time.sleep(interval)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._profile_lock.release()
+        return {
+            "seconds": round(elapsed, 2),
+            "samples": samples,
+            "interval_ms": round(elapsed / max(1, samples) * 1000, 2),
+            "collapsed": "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()),
+        }
+
+    @property
+    def profiling(self) -> bool:
+        return self._profile_lock.locked()
+
+    # ---- Memory ----
+
+    def start_tracing(self, frames: int = MEMORY_FRAMES) -> bool:
+        """Start tracemalloc; returns False if it was already tracing."""
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        return True
+
+    def stop_tracing(self) -> None:
+        """Stop tracemalloc and drop the snapshots (their traces reference its data)."""
+        tracemalloc.stop()
+        self._snapshots.clear()
+        self._snapshot_times.clear()
+
+    def take_snapshot(self, top: int = 25, key_type: str = "lineno", match: str = "") -> dict:
+        """Take and keep a snapshot; returns its id and the largest allocation sites."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running; start it first")
+        snapshot = _filtered(tracemalloc.take_snapshot())
+        snapshot_id = f"s{next(self._snapshot_ids)}"
+        self._snapshots[snapshot_id] = snapshot
+        self._snapshot_times[snapshot_id] = time.time()
+        while len(self._snapshots) > MEMORY_SNAPSHOTS:
+            old, _ = self._snapshots.popitem(last=False)
+            self._snapshot_times.pop(old, None)
+        stats = [s for s in snapshot.statistics(key_type) if _matches(s.traceback, match)]
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "id": snapshot_id,
+            "traced_mb": round(current / 1e6, 2),
+            "peak_mb": round(peak / 1e6, 2),
+            "top": [_stat(s) for s in stats[:top]],
+        }
+
+    def diff(self, base: str, target: Optional[str] = None, top: int = 25, key_type: str = "lineno",
+             match: str = "") -> dict:
+        """Growth from snapshot `base` to `target` (default: the newest), biggest first."""
+        if base not in self._snapshots:
+            raise KeyError(base)
+        target = target or next(reversed(self._snapshots))
+        if target not in self._snapshots:
+            raise KeyError(target)
+        stats = [
+            s for s in self._snapshots[target].compare_to(self._snapshots[base], key_type)
+            if _matches(s.traceback, match)
+        ]
+        return {
+            "base": base,
+            "target": target,
+            "seconds_between": round(self._snapshot_times[target] - self._snapshot_times[base], 1),
+            "total_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+            "top": [
+                {**_stat(s), "size_diff_kb": round(s.size_diff / 1024, 1), "count_diff": s.count_diff}
+                for s in stats[:top]
+            ],
+        }
+
+    def memory_status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "traced_mb": round(current / 1e6, 2),
+            "peak_mb": round(peak / 1e6, 2),
+            "snapshots": list(self._snapshots),
+        }
+
+    # ---- Tasks ----
+
+    def install_task_factory(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Record each new task's creation time (a WeakKeyDictionary entry per task)."""
+        born = self._born
+
+        def factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+            born[task] = time.monotonic()
+            return task
+
+        loop.set_task_factory(factory)
+
+    def tasks(self, limit: int = 200) -> dict:
+        """Current asyncio tasks, oldest first, with where each one is suspended."""
+        now = time.monotonic()
+        current = asyncio.current_task()
+        rows = []
+        for task in asyncio.all_tasks():
+            if task is current:
+                continue
+            born = self._born.get(task)
+            coro = task.get_coro()
+            stack = task.get_stack()  # outermost coroutine first
+            rows.append({
+                "name": task.get_name(),
+                "coro": getattr(coro, "__qualname__", repr(coro)),
+                "age_s": round(now - born, 1) if born is not None else None,
+                "awaiting": _where(stack[-1]) if stack else None,
+                "done": task.done(),
+            })
+        rows.sort(key=lambda r: -(r["age_s"] if r["age_s"] is not None else float("inf")))
+        by_coro = Counter(r["coro"] for r in rows)
+        return {"count": len(rows), "by_coro": dict(by_coro.most_common()), "tasks": rows[:limit]}
+
+
+def _collapse(thread: str, frame) -> str:
+    parts: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{_module(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.append(thread.replace(" ", "_"))
+    return ";".join(reversed(parts))
+
+
+def _module(path: str) -> str:
+    """Short, stable name for a source file: package-relative where possible."""
+    at = path.rfind("site-packages" + os.sep)
+    if at >= 0:
+        path = path[at + len("site-packages") + 1:]
+    else:
+        at = max(path.rfind("server" + os.sep), path.rfind("benchmarks" + os.sep))
+        path = path[at:] if at >= 0 else os.path.basename(path)
+    return path.replace(" ", "_")
+
+
+def _where(frame) -> str:
+    return f"{_module(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    """Leave out tracemalloc's own and the import machinery's allocations."""
+    return snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _matches(traceback: tracemalloc.Traceback, match: str) -> bool:
+    return not match or any(match in frame.filename for frame in traceback)
+
+
+def _stat(stat) -> dict:
+    frame = stat.traceback[-1] if stat.traceback else None  # most recent call
+    return {
+        "where": f"{_module(frame.filename)}:{frame.lineno}" if frame else "?",
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+        "traceback": [f"{_module(f.filename)}:{f.lineno}" for f in stat.traceback][-6:],
+    }
+
+
+_diagnostics: Optional[Diagnostics] = None
+
+
+def get_diagnostics() -> Diagnostics:
+    """Return the process-wide diagnostics helper."""
+    global _diagnostics
+    if _diagnostics is None:
+        _diagnostics = Diagnostics()
+    return _diagnostics
@@ -1,12 +1,146 @@
 """
 Hardware Bridge Service.
 Singleton that manages a single active WebSocket connection to the ESP32 robot.
-Sends JSON commands (action, value) to the connected hardware.
+Sends commands (action, value) to the connected hardware in the wire format negotiated
+at connect time (see robot_protocol), and streams server-side TTS audio when a TTS
+backend is configured.
+
+On negotiated connections commands are sequence-numbered and acknowledged by the robot:
+up to ROBOT_ACK_WINDOW commands may be in flight, unacknowledged ones are retransmitted
+(same seq, so the robot deduplicates) and round-trip latency is recorded per action.
+
+Commands carry an admission priority (see admission.py): when the window is full, waiting
+commands are released highest priority first, so mode commands overtake queued speech;
+SAFETY commands skip the window entirely and cut off any speech being streamed.
+
+With several workers only one holds the robot socket; the others forward commands and
+speech to it through the cluster (see cluster.py).
+
+Sessions: a negotiated robot is given a session token on connect (see robot_protocol). When
+its link drops, commands it has not acked and commands sent while it is away go to a bounded
+per-device replay buffer (ROBOT_REPLAY_BUFFER) keyed by seq, the idempotency key. State
+commands (LED, SERVO, BUZZER, VOLUME) are keyed by action instead, so a newer state
+supersedes the buffered one; SAY expires after ROBOT_REPLAY_SPEECH_TTL_MS and streamed
+audio is never replayed. A robot reconnecting with its token within ROBOT_RESUME_TTL_S gets
+the buffer replayed with the original seqs (it re-acks what it already executed); after
+that the session and its buffer are dropped and this worker gives up the robot.
+Sessions live in the worker that held the link: while the robot is away that worker is
+parked in the cluster rather than owning the robot, and if the robot reconnects to another
+worker (which starts a new session) the parked buffer is dropped, not handed over.
 """
 
-from typing import Optional
+import asyncio
+import heapq
+import itertools
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import AsyncIterable, Dict, List, Optional, Tuple, Union
 from fastapi import WebSocket
 
+from server.services.admission import CHAT, COMMAND, ENABLED as PRIORITIES_ENABLED, SAFETY
+from server.services.canned_responses import CannedResponse
+from server.services.cluster import get_cluster
+from server.services.metrics import get_metrics
+from server.services.robot_protocol import SESSION_ACTION, Frame, ProtocolError, get_codec
+from server.services.tts_engine import get_tts_engine
+
+ACK_TIMEOUT = float(os.getenv("ROBOT_ACK_TIMEOUT_MS", "500")) / 1000.0
+MAX_ATTEMPTS = int(os.getenv("ROBOT_MAX_ATTEMPTS", "3"))
+ACK_WINDOW = int(os.getenv("ROBOT_ACK_WINDOW", "32"))
+RESUME_TTL = float(os.getenv("ROBOT_RESUME_TTL_S", "30"))  # 0 disables sessions
+REPLAY_BUFFER = int(os.getenv("ROBOT_REPLAY_BUFFER", "32"))
+SPEECH_TTL = float(os.getenv("ROBOT_REPLAY_SPEECH_TTL_MS", "5000")) / 1000.0
+
+STATE_ACTIONS = frozenset({"LED", "SERVO", "BUZZER", "VOLUME"})  # only the latest one matters
+UNREPLAYABLE = frozenset({"AUDIO_START", "AUDIO_END", SESSION_ACTION})  # audio frames are not buffered
+
+
+class InFlightCommand:
+    """A sent command waiting for its ack."""
+
+    __slots__ = (
+        "seq", "action", "value", "priority", "frame", "first_sent", "last_sent", "attempts", "done", "windowed"
+    )
+
+    def __init__(
+        self, seq: int, action: str, value: str, frame: Frame, windowed: bool = True, priority: int = COMMAND
+    ) -> None:
+        self.seq = seq
+        self.action = action
+        self.value = value
+        self.priority = priority
+        self.frame = frame
+        self.first_sent = self.last_sent = time.monotonic()
+        self.attempts = 1
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.windowed = windowed  # holds a window slot (SAFETY commands don't)
+
+
+class PendingCommand:
+    """A command waiting in a session's replay buffer."""
+
+    __slots__ = ("seq", "action", "value", "priority", "queued_at", "expires_at")
+
+    def __init__(self, seq: int, action: str, value: str, priority: int, ttl: float) -> None:
+        self.seq = seq
+        self.action = action
+        self.value = value
+        self.priority = priority
+        self.queued_at = time.monotonic()
+        self.expires_at = self.queued_at + ttl
+
+
+class RobotSession:
+    """A device's resumable session: its token and the commands it has not received."""
+
+    def __init__(self, device_id: str) -> None:
+        self.device_id = device_id
+        self.token = secrets.token_urlsafe(12)
+        self.pending: "OrderedDict[Union[str, int], PendingCommand]" = OrderedDict()
+        self.resumed = False
+        self.detached_at: Optional[float] = None  # set while the robot is away
+        self.expirer: Optional[asyncio.Task] = None
+
+    def status(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "resumed": self.resumed,
+            "away_s": round(time.monotonic() - self.detached_at, 1) if self.detached_at is not None else None,
+            "pending": [f"#{p.seq} {p.action} {p.value}"[:60] for p in self.pending.values()],
+        }
+
+
+class PriorityWindow:
+    """Counting semaphore whose waiters are served by priority, then arrival order."""
+
+    def __init__(self, size: int) -> None:
+        self.free = size
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # granted just as we were cancelled
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
 
 class HardwareBridge:
     """Singleton bridge to the ESP32 robot over WebSocket."""
@@ -22,35 +156,390 @@ class HardwareBridge:
         if hasattr(self, "_initialized") and self._initialized:
             return
         self.active_connection: Optional[WebSocket] = None
+        self.codec = get_codec(None)
+        self.acks_enabled = False
+        self._seq = 0
+        self._inflight: Dict[int, InFlightCommand] = {}
+        self._window: Optional[PriorityWindow] = None
+        self._retransmitter: Optional[asyncio.Task] = None
+        self._speech_epoch = 0  # bumped by SAFETY commands to cut off streaming speech
+        self._sessions: Dict[str, RobotSession] = {}
+        self._session: Optional[RobotSession] = None  # the connected (or last connected) robot's
         self._initialized = True
 
-    def connect(self, websocket: WebSocket) -> None:
-        """Accept and store the single active robot connection."""
+    def connect(
+        self,
+        websocket: WebSocket,
+        protocol: Optional[str] = None,
+        device_id: str = "gus",
+        resume: Optional[str] = None,
+    ) -> None:
+        """
+        Store the single active robot connection and the subprotocol it negotiated.
+        On negotiated links this also starts or resumes the device's session (the token from
+        ?session= is `resume`); call open_session() next to tell the robot and replay.
+        """
+        if self.active_connection is not None:
+            self._detach()  # replaced before its socket was noticed dead
         self.active_connection = websocket
+        self.codec = get_codec(protocol)
+        # Legacy robots (no subprotocol) never ack, so only sequence negotiated links
+        self.acks_enabled = protocol is not None
+        if self.acks_enabled:
+            self._window = PriorityWindow(ACK_WINDOW)
+            if self._retransmitter is None or self._retransmitter.done():
+                self._retransmitter = asyncio.create_task(self._retransmit_loop())
+        self._session = self._attach(device_id, resume) if self.acks_enabled and RESUME_TTL > 0 else None
 
-    def disconnect(self) -> None:
-        """Clear the active connection (call when robot disconnects)."""
+    def disconnect(self, websocket: Optional[WebSocket] = None) -> None:
+        """
+        Clear the active connection (call when robot disconnects).
+        Passing the closing socket makes this a no-op if a newer robot already replaced it.
+        """
+        if websocket is not None and websocket is not self.active_connection:
+            return
         self.active_connection = None
+        self._detach()
+        if self._retransmitter is not None:
+            self._retransmitter.cancel()
+            self._retransmitter = None
+
+    # ---- Sessions ----
 
-    async def send_command(self, action: str, value: str) -> bool:
+    @property
+    def resumable(self) -> bool:
+        """True while a disconnected robot may still resume (commands are being buffered)."""
+        return self.active_connection is None and self._session is not None
+
+    def _attach(self, device_id: str, token: Optional[str]) -> RobotSession:
+        session = self._sessions.get(device_id)
+        metrics = get_metrics()
+        if session is not None and token is not None and secrets.compare_digest(token, session.token):
+            session.resumed = True
+            metrics.incr("robot.sessions.resumed")
+            if session.detached_at is not None:
+                metrics.histogram("robot.sessions.away").record(time.monotonic() - session.detached_at)
+        else:
+            if session is not None:
+                self._drop_session(session)
+            session = RobotSession(device_id)
+            self._sessions[device_id] = session
+            metrics.incr("robot.sessions.new")
+        session.detached_at = None
+        if session.expirer is not None:
+            session.expirer.cancel()
+            session.expirer = None
+        return session
+
+    def _detach(self) -> None:
+        """The link is gone: park unacked commands for replay and start the resume clock."""
+        session = self._session
+        inflight, self._inflight = self._inflight, {}
+        for command in inflight.values():
+            if session is not None:
+                self._buffer(session, command.seq, command.action, command.value, command.priority)
+            else:
+                get_metrics().incr("robot.commands.failed")
+            self._complete(command, False)
+        if session is not None and session.detached_at is None:
+            session.detached_at = time.monotonic()
+            session.expirer = asyncio.create_task(self._expire(session))
+
+    async def _expire(self, session: RobotSession) -> None:
+        await asyncio.sleep(RESUME_TTL)
+        if session.detached_at is None:
+            return
+        session.expirer = None
+        self._drop_session(session)
+        print(f"[HardwareBridge] Session of {session.device_id} expired")
+        if self.active_connection is None and self._session is None:
+            await get_cluster().release_robot()
+
+    def _drop_session(self, session: RobotSession) -> None:
+        get_metrics().incr("robot.replay.discarded", len(session.pending))
+        session.pending.clear()
+        if self._sessions.get(session.device_id) is session:
+            del self._sessions[session.device_id]
+        if self._session is session:
+            self._session = None
+        if session.expirer is not None:
+            session.expirer.cancel()
+            session.expirer = None
+
+    def drop_parked_sessions(self) -> None:
+        """The robot started a new session on another worker: sessions left here cannot resume."""
+        for session in list(self._sessions.values()):
+            if session.detached_at is not None:
+                get_metrics().incr("robot.sessions.claimed_elsewhere")
+                print(f"[HardwareBridge] {session.device_id} reconnected to another worker, "
+                      f"dropping {len(session.pending)} buffered commands")
+                self._drop_session(session)
+
+    def _buffer(self, session: RobotSession, seq: int, action: str, value: str, priority: int) -> bool:
+        """Queue a command for replay; False if it is not worth replaying."""
+        metrics = get_metrics()
+        if action in UNREPLAYABLE:
+            metrics.incr("robot.replay.dropped")
+            return False
+        key = action if action in STATE_ACTIONS else seq
+        if session.pending.pop(key, None) is not None:
+            metrics.incr("robot.replay.superseded")
+        ttl = SPEECH_TTL if action == "SAY" else RESUME_TTL
+        session.pending[key] = PendingCommand(seq, action, value, priority, ttl)
+        metrics.incr("robot.replay.buffered")
+        while len(session.pending) > REPLAY_BUFFER:
+            session.pending.popitem(last=False)
+            metrics.incr("robot.replay.overflow")
+        return True
+
+    async def open_session(self) -> None:
+        """Send the robot its session token, then replay what it missed if it resumed."""
+        session = self._session
+        if session is None or self.active_connection is None:
+            return
+        state = "resumed" if session.resumed else "new"
+        if not await self.send_frame(self.codec.encode_command(SESSION_ACTION, f"{session.token}/{state}")):
+            return
+        print(f"[HardwareBridge] Session {state} for {session.device_id} ({len(session.pending)} to replay)")
+        if session.pending:
+            asyncio.create_task(self._replay(session))
+
+    async def _replay(self, session: RobotSession) -> None:
+        """Resend buffered commands oldest first, with their original seqs."""
+        metrics = get_metrics()
+        while session.pending and session is self._session and self.active_connection is not None:
+            _, entry = session.pending.popitem(last=False)
+            now = time.monotonic()
+            if now > entry.expires_at:
+                metrics.incr("robot.replay.expired")
+                continue
+            metrics.histogram("robot.replay.age").record(now - entry.queued_at)
+            metrics.incr("robot.replay.replayed")
+            try:
+                if await self._send_sequenced(entry.seq, entry.action, entry.value, entry.priority) is None:
+                    return
+            except ProtocolError as e:
+                self._unencodable(entry.action, e)
+
+    def session_status(self) -> dict:
+        return {
+            "current": self._session.status() if self._session is not None else None,
+            "resumable": self.resumable,
+            "devices": sorted(self._sessions),
+        }
+
+    def _next_seq(self) -> int:
+        """Sequence numbers are uint16 on the wire; 0 means "unsequenced"."""
+        self._seq = self._seq % 65535 + 1
+        return self._seq
+
+    async def send_command(
+        self, action: str, value: str, wait_ack: bool = False, priority: int = COMMAND
+    ) -> bool:
         """
-        Send a JSON payload to the connected robot.
-        Payload format: {"action": action, "value": value}
-        Returns True if sent, False if no connection.
+        Send a command to the connected robot in its negotiated wire format.
+        JSON payload format: {"action": action, "value": value, "seq": n}
+        priority is an admission class (SAFETY, COMMAND, CHAT for speech).
+        Returns True once written (or, with wait_ack=True, once acknowledged);
+        False if there is no connection or the robot never acked.
         """
         if self.active_connection is None:
+            message = {"kind": "command", "action": action, "value": value, "priority": priority}
+            if await get_cluster().route_to_robot(message):
+                return True
+            if self._session is not None:
+                seq = self._next_seq()
+                if self._buffer(self._session, seq, action, value, priority):
+                    print(f"[HardwareBridge] Robot away, queued #{seq} for replay: {action} {value}")
+                    return not wait_ack
             print("[HardwareBridge] No robot connected, skipping command")
             return False
-        payload = {"action": action, "value": value}
+        if not self.acks_enabled:
+            if PRIORITIES_ENABLED and priority == SAFETY:
+                self.preempt_speech()
+            try:
+                frame = self.codec.encode_command(action, value)
+            except ProtocolError as e:
+                self._unencodable(action, e)
+                return False
+            if await self.send_frame(frame):
+                print(f"[HardwareBridge] Sent: {action} {value}")
+                return True
+            return False
+
+        if self._session is not None and action in STATE_ACTIONS and self._session.pending.pop(action, None):
+            get_metrics().incr("robot.replay.superseded")  # a replay is still running
         try:
-            await self.active_connection.send_json(payload)
-            print(f"[HardwareBridge] Sent: {payload}")
+            command = await self._send_sequenced(self._next_seq(), action, value, priority)
+        except ProtocolError as e:
+            self._unencodable(action, e)
+            return False
+        if command is None:
+            return False
+        print(f"[HardwareBridge] Sent #{command.seq}: {action} {value}")
+        if wait_ack:
+            return await asyncio.shield(command.done)
+        return True
+
+    async def _send_sequenced(self, seq: int, action: str, value: str, priority: int) -> Optional[InFlightCommand]:
+        """
+        Send through the ack window; None if the link went away (the command is buffered if it can be).
+        Raises ProtocolError, before taking a window slot, if the codec cannot encode the command.
+        """
+        frame = self.codec.encode_command(action, value, seq)
+        urgent = PRIORITIES_ENABLED and priority == SAFETY
+        if urgent:
+            self.preempt_speech()
+        window = self._window
+        if not urgent:
+            # bounded pipelining: wait while the window is full, best priority first
+            await window.acquire(priority if PRIORITIES_ENABLED else COMMAND)
+            if self.active_connection is None or window is not self._window:
+                window.release()
+                if self._session is not None:
+                    self._buffer(self._session, seq, action, value, priority)
+                return None
+        command = InFlightCommand(seq, action, value, frame, windowed=not urgent, priority=priority)
+        self._inflight[seq] = command
+        get_metrics().incr("robot.commands.sent")
+        if not await self.send_frame(command.frame):
+            return None  # disconnect() parked it for replay
+        return command
+
+    def _unencodable(self, action: str, error: ProtocolError) -> None:
+        get_metrics().incr("robot.commands.unencodable")
+        print(f"[HardwareBridge] Dropped {action}: {error}")
+
+    def handle_ack(self, seq: int) -> None:
+        """Complete an in-flight command; duplicate or late acks are ignored."""
+        command = self._inflight.pop(seq, None)
+        if command is None:
+            get_metrics().incr("robot.acks.duplicate")
+            return
+        metrics = get_metrics()
+        metrics.histogram(f"robot.ack_latency.{command.action}").record(time.monotonic() - command.first_sent)
+        metrics.incr("robot.acks.received")
+        self._complete(command, True)
+
+    def _complete(self, command: InFlightCommand, ok: bool) -> None:
+        if not command.done.done():
+            command.done.set_result(ok)
+        if self._window is not None and command.windowed:
+            self._window.release()
+
+    async def _retransmit_loop(self) -> None:
+        """Resend commands whose ack is overdue; give up after MAX_ATTEMPTS."""
+        while True:
+            await asyncio.sleep(ACK_TIMEOUT / 2)
+            now = time.monotonic()
+            for command in list(self._inflight.values()):
+                if now - command.last_sent < ACK_TIMEOUT:
+                    continue
+                if command.attempts >= MAX_ATTEMPTS:
+                    self._inflight.pop(command.seq, None)
+                    get_metrics().incr("robot.commands.failed")
+                    print(f"[HardwareBridge] No ack for #{command.seq} ({command.action}) after {command.attempts} attempts")
+                    self._complete(command, False)
+                    continue
+                command.attempts += 1
+                command.last_sent = now
+                get_metrics().incr("robot.commands.retransmitted")
+                if not await self.send_frame(command.frame):
+                    return
+
+    def preempt_speech(self) -> None:
+        """Stop any speech being streamed (its remaining audio frames are dropped)."""
+        self._speech_epoch += 1
+        get_metrics().incr("robot.preemptions")
+
+    @property
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+    async def send_frame(self, frame: Frame) -> bool:
+        """Send an already-encoded frame (text for JSON, bytes for binary) to the robot."""
+        if self.active_connection is None:
+            return False
+        try:
+            if isinstance(frame, bytes):
+                await self.active_connection.send_bytes(frame)
+            else:
+                await self.active_connection.send_text(frame)
             return True
         except Exception as e:
             print(f"[HardwareBridge] Send failed: {e}")
             self.disconnect()
             return False
 
+    async def send_audio_frame(self, frame: bytes) -> bool:
+        """Send one binary audio frame to the connected robot."""
+        if self.active_connection is None:
+            return False
+        try:
+            await self.active_connection.send_bytes(self.codec.encode_audio(frame))
+            return True
+        except Exception as e:
+            print(f"[HardwareBridge] Audio send failed: {e}")
+            self.disconnect()
+            return False
+
+    async def say(
+        self, text: Union[str, AsyncIterable[str]], cacheable: bool = False, priority: int = CHAT
+    ) -> bool:
+        """
+        Make the robot speak.
+        Without a TTS backend this is a plain SAY command; with one, the text is synthesized
+        sentence by sentence and streamed as AUDIO_START, binary frames, AUDIO_END.
+        Pass cacheable=True for fixed phrases so their audio is served from the disk cache.
+        Streaming stops early if a SAFETY command preempts it.
+        """
+        tts = get_tts_engine()
+        if tts is None:
+            if not isinstance(text, str):
+                text = "".join([chunk async for chunk in text])
+            return await self.send_command("SAY", text, priority=priority)
+        if self.active_connection is None:
+            if not isinstance(text, str):
+                text = "".join([chunk async for chunk in text])
+            if await get_cluster().route_to_robot({"kind": "say", "text": text, "priority": priority}):
+                return True
+            print("[HardwareBridge] No robot connected, skipping speech")
+            return False
+
+        epoch = self._speech_epoch
+        if not await self.send_command("AUDIO_START", f"{tts.codec}/{tts.sample_rate}", priority=priority):
+            return False
+        sent = 0
+        async for frame in tts.stream(text, cacheable=cacheable):
+            if self._speech_epoch != epoch:
+                get_metrics().incr("robot.speech.preempted")
+                break
+            if not await self.send_audio_frame(frame):
+                return False
+            sent += 1
+        return await self.send_command("AUDIO_END", str(sent), priority=priority)
+
+    async def say_canned(self, response: CannedResponse, priority: int = CHAT) -> bool:
+        """Speak a canned reply using its pre-built frames (and pre-rendered audio, if any)."""
+        if response.audio_frames is None:
+            return await self.send_command("SAY", response.text, priority=priority)
+        if self.active_connection is None:
+            # The robot may be attached to another worker, which has the same frames
+            message = {"kind": "say_canned", "key": response.key, "priority": priority}
+            return await get_cluster().route_to_robot(message)
+        epoch = self._speech_epoch
+        if not await self.send_command("AUDIO_START", response.audio_format, priority=priority):
+            return False
+        sent = 0
+        for frame in response.audio_frames:
+            if self._speech_epoch != epoch:
+                get_metrics().incr("robot.speech.preempted")
+                break
+            if not await self.send_audio_frame(frame):
+                return False
+            sent += 1
+        return await self.send_command("AUDIO_END", str(sent), priority=priority)
+
 
 async def execute_frontend_command(cmd_type: str, value: Optional[str] = None) -> None:
     """
@@ -64,8 +553,8 @@ async def execute_frontend_command(cmd_type: str, value: Optional[str] = None) -
         await bridge.send_command("SERVO", "DOWN")
         await bridge.send_command("LED", "OFF")
     elif cmd_type == "trigger_alarm":
-        await bridge.send_command("BUZZER", "ON")
-        await bridge.send_command("LED", "RED_BLINK")
+        await bridge.send_command("BUZZER", "ON", priority=SAFETY)
+        await bridge.send_command("LED", "RED_BLINK", priority=SAFETY)
     elif cmd_type == "normal_mode":
         await bridge.send_command("LED", "GREEN")
     # set_volume can be sent to robot if needed later
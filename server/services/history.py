@@ -0,0 +1,348 @@
+"""
+Interaction History - logging and full-text search of voice/chat turns.
+Turns are buffered in memory and written to `interaction_logs` in batches by a background
+flusher (like telemetry), so the WebSocket handlers never wait on SQLite.
+
+Search uses an FTS5 external-content table (`interaction_logs_fts`) over user_text and
+robot_response. Triggers on interaction_logs keep it in sync on insert, update and delete,
+so every writer (including ad-hoc SQL) is indexed without extra code. Results are newest
+first and paged with an opaque keyset cursor on (timestamp, id) instead of OFFSET, so deep
+pages cost the same as the first one.
+
+Analytics (turns per day, audio duration, mode mix) come from the daily rollups written by
+the retention job (services/retention.py); only days it has not rolled up yet are
+aggregated from raw rows.
+
+A text search picks its plan from a capped count of the matches. Rare terms sort their few
+matches by time. Common terms walk the (timestamp, id) index newest first and stop after one
+page, checking each row against the FTS index (one doclist seek per row for whole words,
+membership in the materialized match list for prefix queries, whose seeks are expensive).
+"""
+
+import asyncio
+import base64
+import math
+import os
+import re
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, Integer, String, Text, bindparam, func, text
+from sqlalchemy.engine import Engine
+
+from server.database import SessionLocal
+from server.models import InteractionDailyRollups, InteractionLogs
+from server.services.metrics import get_metrics
+
+FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "2"))
+MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+FTS_TABLE = "interaction_logs_fts"
+TS_INDEX = "ix_interaction_logs_ts_id"
+MODE_INDEX = "ix_interaction_logs_mode_ts_id"
+# Cost of checking one walked index entry, relative to sorting one match (measured on 1M
+# rows): walking the index wins once matches exceed sqrt(page * rows * step cost)
+PROBE_STEP_COST = 5.0
+MEMBER_STEP_COST = 0.1
+
+_SCHEMA = [
+    f"CREATE INDEX IF NOT EXISTS {TS_INDEX} ON interaction_logs (timestamp, id)",
+    f"CREATE INDEX IF NOT EXISTS {MODE_INDEX} ON interaction_logs (mode, timestamp, id)",
+    f"""CREATE TRIGGER IF NOT EXISTS interaction_logs_ai AFTER INSERT ON interaction_logs BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, user_text, robot_response)
+        VALUES (new.id, new.user_text, coalesce(new.robot_response, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS interaction_logs_ad AFTER DELETE ON interaction_logs BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, user_text, robot_response)
+        VALUES ('delete', old.id, old.user_text, coalesce(old.robot_response, ''));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS interaction_logs_au AFTER UPDATE OF user_text, robot_response
+        ON interaction_logs BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, user_text, robot_response)
+        VALUES ('delete', old.id, old.user_text, coalesce(old.robot_response, ''));
+        INSERT INTO {FTS_TABLE}(rowid, user_text, robot_response)
+        VALUES (new.id, new.user_text, coalesce(new.robot_response, ''));
+    END""",
+]
+
+_COLUMNS = {
+    "id": Integer, "timestamp": DateTime, "user_text": Text, "robot_response": Text,
+    "mode": String, "audio_duration": Float,
+}
+_SELECT = "SELECT l.id, l.timestamp, l.user_text, l.robot_response, l.mode, l.audio_duration FROM interaction_logs l"
+_MATCHES = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"
+_DAILY = text(
+    "SELECT date(timestamp) AS day, coalesce(mode, 'normal') AS mode, count(*) AS turns, "
+    "count(audio_duration) AS audio_turns, coalesce(sum(audio_duration), 0.0) AS audio_seconds "
+    "FROM interaction_logs WHERE timestamp >= :lo AND timestamp < :hi GROUP BY 1, 2"
+).bindparams(bindparam("lo", type_=DateTime), bindparam("hi", type_=DateTime))
+_PROBE = f"EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q AND rowid = l.id)"
+
+
+class InvalidQuery(ValueError):
+    """The search text, cursor or filters cannot be used."""
+
+
+def install_search_index(engine: Engine) -> None:
+    """
+    Bring an interaction_logs table up to the searchable schema (idempotent): add the mode
+    column to databases created before it existed, the keyset indexes, the FTS5 table and
+    its sync triggers. A newly created index is rebuilt from the existing rows.
+    """
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(interaction_logs)")}
+        if "mode" not in columns:
+            conn.exec_driver_sql("ALTER TABLE interaction_logs ADD COLUMN mode VARCHAR(50)")
+        created = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first() is None
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "user_text, robot_response, content='interaction_logs', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        for statement in _SCHEMA:
+            conn.exec_driver_sql(statement)
+        if created:
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def to_fts_query(q: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match; a word ending in * matches
+    as a prefix ("photo*"). FTS5 operators in user input are treated as words.
+    """
+    words = re.findall(r"\w+\*?", q.lower())
+    if not words:
+        raise InvalidQuery("search text has no words")
+    return " ".join(f'"{w[:-1]}"*' if w.endswith("*") else f'"{w}"' for w in words)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidQuery("malformed cursor")
+
+
+def search_history(
+    db,
+    q: Optional[str] = None,
+    mode: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+) -> dict:
+    """
+    One page of interactions, newest first, optionally matching `q` (all words; a word
+    ending in * as a prefix, see to_fts_query) and filtered by mode and [since, until) in
+    naive UTC. Pass the returned next_cursor to get the following page; it is None on the
+    last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    where: List[str] = []
+    params: dict = {"limit": limit + 1}
+    datetimes = []
+    source = ""
+    if q:
+        params["q"] = to_fts_query(q)
+        prefix = params["q"].endswith("*") or '"* ' in params["q"]
+        if not _is_common(db, params["q"], limit + 1, MEMBER_STEP_COST if prefix else PROBE_STEP_COST):
+            where.append(f"l.id IN ({_MATCHES})")
+        else:
+            where.append(f"l.id IN ({_MATCHES})" if prefix else _PROBE)
+            source = f" INDEXED BY {MODE_INDEX if mode else TS_INDEX}"
+    if mode:
+        where.append("l.mode = :mode")
+        params["mode"] = mode.lower()
+    if since:
+        where.append("l.timestamp >= :since")
+        params["since"] = since
+        datetimes.append("since")
+    if until:
+        where.append("l.timestamp < :until")
+        params["until"] = until
+        datetimes.append("until")
+    if cursor:
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+        where.append("(l.timestamp, l.id) < (:cursor_ts, :cursor_id)")
+        datetimes.append("cursor_ts")
+
+    sql = _SELECT + source
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY l.timestamp DESC, l.id DESC LIMIT :limit"
+    stmt = text(sql).bindparams(*(bindparam(name, type_=DateTime) for name in datetimes)).columns(**_COLUMNS)
+
+    rows = db.execute(stmt, params).mappings().all()
+    page, more = rows[:limit], len(rows) > limit
+    items = [
+        {
+            "id": row["id"],
+            "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None,
+            "mode": row["mode"],
+            "user_text": row["user_text"],
+            "robot_response": row["robot_response"],
+            "audio_duration": row["audio_duration"],
+        }
+        for row in page
+    ]
+    last = page[-1] if page else None
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(last["timestamp"], last["id"]) if more and last else None,
+    }
+
+
+def _is_common(db, fts_query: str, page: int, step_cost: float) -> bool:
+    """True if the query matches enough rows that walking the time index beats sorting its matches."""
+    rows = db.execute(text("SELECT max(id) FROM interaction_logs")).scalar() or 0
+    threshold = int(math.sqrt(page * rows * step_cost)) + 1
+    matches = db.execute(
+        text(f"SELECT count(*) FROM ({_MATCHES} LIMIT :cap)"), {"q": fts_query, "cap": threshold}
+    ).scalar()
+    return matches >= threshold
+
+
+def daily_aggregates(conn, first: date, end: date) -> List[dict]:
+    """Per (UTC day, mode) aggregates of the raw rows for days in [first, end)."""
+    result = conn.execute(_DAILY, {"lo": datetime.combine(first, dtime()), "hi": datetime.combine(end, dtime())})
+    return [
+        {
+            "day": date.fromisoformat(r.day), "mode": r.mode, "turns": r.turns,
+            "audio_turns": r.audio_turns, "audio_seconds": r.audio_seconds,
+        }
+        for r in result
+    ]
+
+
+def daily_stats(db, days: int) -> dict:
+    """
+    Turns, average audio duration and mode mix for each of the last `days` UTC days (today
+    included), oldest first: rolled-up days from interaction_daily_rollups, the rest (today,
+    at least) from raw rows.
+    """
+    today = datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    rows = [
+        {"day": r.day, "mode": r.mode, "turns": r.turns, "audio_turns": r.audio_turns, "audio_seconds": r.audio_seconds}
+        for r in db.query(InteractionDailyRollups).filter(InteractionDailyRollups.day >= first)
+    ]
+    newest = db.query(func.max(InteractionDailyRollups.day)).scalar()
+    live_from = max(first, newest + timedelta(days=1)) if newest else first
+    rows += daily_aggregates(db, live_from, today + timedelta(days=1))
+
+    per_day: Dict[date, dict] = {}
+    for r in rows:
+        day = per_day.setdefault(r["day"], {"turns": 0, "audio_turns": 0, "audio_seconds": 0.0, "modes": {}})
+        day["turns"] += r["turns"]
+        day["audio_turns"] += r["audio_turns"]
+        day["audio_seconds"] += r["audio_seconds"]
+        day["modes"][r["mode"]] = day["modes"].get(r["mode"], 0) + r["turns"]
+
+    series = []
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        agg = per_day.get(day, {"turns": 0, "audio_turns": 0, "audio_seconds": 0.0, "modes": {}})
+        series.append({
+            "day": day.isoformat(),
+            "turns": agg["turns"],
+            "avg_audio_duration": round(agg["audio_seconds"] / agg["audio_turns"], 2) if agg["audio_turns"] else None,
+            "modes": agg["modes"],
+        })
+    totals: Dict[str, int] = {}
+    for agg in per_day.values():
+        for mode, turns in agg["modes"].items():
+            totals[mode] = totals.get(mode, 0) + turns
+    return {
+        "days": series,
+        "turns": sum(d["turns"] for d in series),
+        "modes": totals,
+        "rolled_up_through": newest.isoformat() if newest else None,
+    }
+
+
+class HistoryStore:
+    """Buffers finished turns and writes them to interaction_logs in batches."""
+
+    def __init__(self, max_pending: int = MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._pending: List[dict] = []
+        self.logged = 0
+
+    def record(
+        self,
+        user_text: str,
+        robot_response: Optional[str],
+        mode: Optional[str] = None,
+        audio_duration: Optional[float] = None,
+    ) -> None:
+        """Queue one turn (event loop only; never blocks). Oldest turns are dropped if the DB is stuck."""
+        if not user_text:
+            return
+        if len(self._pending) >= self.max_pending:
+            self._pending.pop(0)
+            get_metrics().incr("history.dropped")
+        self._pending.append({
+            "timestamp": datetime.utcnow(),
+            "user_text": user_text,
+            "robot_response": robot_response,
+            "mode": (mode or "normal").lower(),
+            "audio_duration": audio_duration,
+        })
+
+    def persist(self, rows: List[dict]) -> None:
+        """Insert a batch (blocking; run in a worker thread). The FTS triggers index it."""
+        db = SessionLocal()
+        try:
+            db.execute(InteractionLogs.__table__.insert(), rows)
+            db.commit()
+        finally:
+            db.close()
+
+    async def flush(self) -> int:
+        """Write buffered turns to the database; returns the number of rows written."""
+        rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.persist, rows)
+        except Exception as e:
+            print(f"⚠️ History flush failed: {e}")
+            self._pending = (rows + self._pending)[-self.max_pending:]
+            return 0
+        self.logged += len(rows)
+        get_metrics().incr("history.logged", len(rows))
+        return len(rows)
+
+    async def run_flusher(self, interval: float = FLUSH_SECONDS) -> None:
+        """Background task: flush buffered turns every `interval` seconds until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+
+_store_instance: Optional[HistoryStore] = None
+
+
+def get_history_store() -> HistoryStore:
+    """Return the shared interaction history store."""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = HistoryStore()
+    return _store_instance
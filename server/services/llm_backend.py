@@ -0,0 +1,222 @@
+"""
+LLM Backends - where AIEngine gets its chat replies.
+
+    GroqBackend   the Groq API through ModelRouter (fast/large tiers, resilience layer)
+    LocalBackend  a small quantized GGUF model on this machine's CPU via llama-cpp-python
+
+The local model is loaded once, on a dedicated worker thread that also runs every generation
+(a llama.cpp context is not thread-safe), so neither loading nor inference runs on the event
+loop or holds more than one pipeline thread; turns queue for it in arrival order, at most
+LOCAL_LLM_QUEUE deep. Generation is streamed, so time to first token and per-token decode
+time are recorded (llm.local.ttft, llm.local.per_token), and a turn whose deadline runs out
+mid-answer gets what was generated so far, cut at a sentence end.
+
+AIEngine decides which backend answers a turn:
+    privacy mode   the local model (PRIVACY_LLM=groq keeps sending these turns upstream)
+    other modes    Groq; when Groq is unavailable (no API key, breaker open, retries or
+                   deadline exhausted) the local model answers instead, with
+                   LOCAL_LLM_RESERVE_MS of the turn's budget kept back for it
+    LLM_BACKEND=local sends every turn to the local model (offline operation)
+
+Configuration:
+    LOCAL_LLM_MODEL     path to a GGUF file (unset: no local backend), e.g. a Q4_K_M build
+                        of Qwen2.5-1.5B-Instruct or Llama-3.2-1B-Instruct
+    LOCAL_LLM_THREADS   inference threads (default: half the CPUs, at most 8)
+    LOCAL_LLM_CTX       context window in tokens (default 2048)
+    LOCAL_LLM_PRELOAD   1 (default): load at startup instead of on the first local turn
+"""
+
+import importlib.util
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, List, Optional
+
+from server.services.metrics import get_metrics
+from server.services.model_router import ModelRouter
+from server.services.resilience import Deadline, UpstreamError, UpstreamUnavailable
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").strip().lower()
+PRIVACY_LLM = os.getenv("PRIVACY_LLM", "local").strip().lower()
+LOCAL_FALLBACK = os.getenv("LOCAL_LLM_FALLBACK", "1").lower() in ("1", "true", "yes")
+LOCAL_RESERVE = float(os.getenv("LOCAL_LLM_RESERVE_MS", "4000")) / 1000.0
+LOCAL_MODEL = os.getenv("LOCAL_LLM_MODEL", "")
+LOCAL_THREADS = int(os.getenv("LOCAL_LLM_THREADS", "0")) or max(1, min(8, (os.cpu_count() or 2) // 2))
+LOCAL_CTX = int(os.getenv("LOCAL_LLM_CTX", "2048"))
+LOCAL_QUEUE = int(os.getenv("LOCAL_LLM_QUEUE", "4"))
+LOCAL_PRELOAD = os.getenv("LOCAL_LLM_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+_SENTENCE_END = re.compile(r"[.!?…](?=[\"')\]]*(\s|$))")
+
+
+class ChatBackend:
+    """Base class for chat backends: OpenAI-style messages in, reply text out."""
+
+    name = "base"
+
+    def complete(self, messages: List[dict], text: str, mode: str, max_tokens: int, deadline: Deadline) -> str:
+        """Answer the turn; raises UpstreamError when the backend cannot."""
+        raise NotImplementedError
+
+    def status(self) -> dict:
+        return {"name": self.name}
+
+
+class GroqBackend(ChatBackend):
+    """Groq chat completions, routed between the fast and large tiers."""
+
+    name = "groq"
+
+    def __init__(self, router: ModelRouter) -> None:
+        self.router = router
+
+    def complete(self, messages: List[dict], text: str, mode: str, max_tokens: int, deadline: Deadline) -> str:
+        from server.services.container import get_container
+
+        try:
+            client = get_container().groq_client
+        except ValueError as e:  # no API key: offline install
+            raise UpstreamUnavailable(f"groq: {e}") from e
+        return self.router.complete(client, messages, text, mode, max_tokens=max_tokens, deadline=deadline)
+
+
+class LocalBackend(ChatBackend):
+    """A llama.cpp model served from one dedicated worker thread."""
+
+    name = "local"
+
+    def __init__(self, model_path: str, threads: int = LOCAL_THREADS, n_ctx: int = LOCAL_CTX,
+                 queue: int = LOCAL_QUEUE) -> None:
+        self.model_path = model_path
+        self.threads = threads
+        self.n_ctx = n_ctx
+        self.queue_limit = queue
+        self.queued = 0
+        self.load_seconds: Optional[float] = None
+        self._llm: Any = None
+        self._loading: Optional[Future] = None
+        self._lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-llm")
+
+    def load(self) -> Future:
+        """Start loading the model on the worker thread (once); returns the load future."""
+        with self._lock:
+            if self._loading is None:
+                self._loading = self._worker.submit(self._load)
+            return self._loading
+
+    def _load(self) -> None:
+        from llama_cpp import Llama
+
+        started = time.perf_counter()
+        try:
+            self._llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.threads, verbose=False)
+        except Exception as e:
+            print(f"⚠️ Local LLM failed to load ({e})")
+            raise
+        self.load_seconds = time.perf_counter() - started
+        print(f"🦙 Local LLM loaded: {os.path.basename(self.model_path)} "
+              f"({self.threads} threads, {self.load_seconds:.1f}s)")
+
+    @property
+    def loaded(self) -> bool:
+        return self._llm is not None
+
+    def complete(self, messages: List[dict], text: str, mode: str, max_tokens: int, deadline: Deadline) -> str:
+        self.load()
+        with self._lock:
+            if self.queued >= self.queue_limit:
+                get_metrics().incr("llm.local.busy")
+                raise UpstreamUnavailable("local: queue full")
+            self.queued += 1
+        try:
+            future = self._worker.submit(self._generate, messages, max_tokens, deadline)
+        except RuntimeError as e:  # the worker was shut down
+            self._release()
+            raise UpstreamUnavailable(f"local: {e}") from e
+        # The slot is held until the generation ends, not until this caller gives up on it
+        future.add_done_callback(self._release)
+        try:
+            # _generate stops by itself at the deadline; the slack covers its last token
+            return future.result(timeout=deadline.remaining() + 5.0)
+        except FutureTimeout:
+            future.cancel()  # only unqueues it; a running generation keeps going to its end
+            raise UpstreamError("local: no answer before the deadline")
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self.queued -= 1
+
+    def _generate(self, messages: List[dict], max_tokens: int, deadline: Deadline) -> str:
+        if self._llm is None:
+            raise UpstreamUnavailable("local: model not loaded")
+        if deadline.expired():
+            raise UpstreamUnavailable("local: deadline exhausted while queued")
+        metrics = get_metrics()
+        started = time.perf_counter()
+        first: Optional[float] = None
+        parts: List[str] = []
+        cut_short = False
+        stream = self._llm.create_chat_completion(
+            messages=messages, max_tokens=max_tokens, temperature=0.7, stream=True
+        )
+        try:
+            for chunk in stream:
+                piece = chunk["choices"][0].get("delta", {}).get("content")
+                if piece:
+                    if first is None:
+                        first = time.perf_counter()
+                        metrics.histogram("llm.local.ttft").record(first - started)
+                    parts.append(piece)
+                if deadline.expired():
+                    cut_short = True
+                    break
+        finally:
+            stream.close()  # stops generation if we broke out early
+        ended = time.perf_counter()
+        metrics.histogram("llm.local.turn").record(ended - started)
+        metrics.incr("llm.local.tokens", len(parts))
+        if first is not None and len(parts) > 1:
+            metrics.histogram("llm.local.per_token").record((ended - first) / (len(parts) - 1))
+        reply = "".join(parts).strip()
+        if cut_short:
+            metrics.incr("llm.local.cut_short")
+            reply = _trim_to_sentence(reply)
+        return reply
+
+    def status(self) -> dict:
+        per_token = get_metrics().histogram("llm.local.per_token").percentile(50)
+        return {
+            "name": self.name,
+            "model": os.path.basename(self.model_path),
+            "threads": self.threads,
+            "loaded": self.loaded,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "queued": self.queued,
+            "ttft_p50_ms": get_metrics().histogram("llm.local.ttft").percentile(50),
+            "tokens_per_s_p50": round(1000.0 / per_token, 1) if per_token else None,
+        }
+
+    def close(self) -> None:
+        self._worker.shutdown(wait=False, cancel_futures=True)
+
+
+def _trim_to_sentence(text: str) -> str:
+    """Drop a trailing half sentence; keep everything if there is no sentence end yet."""
+    ends = list(_SENTENCE_END.finditer(text))
+    return text[:ends[-1].end()] if ends else (text + "…" if text else text)
+
+
+def build_local_backend() -> Optional[LocalBackend]:
+    """The local backend if LOCAL_LLM_MODEL points at a model and llama-cpp-python is installed."""
+    if not LOCAL_MODEL:
+        return None
+    if not os.path.isfile(LOCAL_MODEL):
+        print(f"⚠️ LOCAL_LLM_MODEL not found: {LOCAL_MODEL}")
+        return None
+    if importlib.util.find_spec("llama_cpp") is None:
+        print("⚠️ LOCAL_LLM_MODEL is set but llama-cpp-python is not installed (pip install llama-cpp-python)")
+        return None
+    return LocalBackend(LOCAL_MODEL)
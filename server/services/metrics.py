@@ -0,0 +1,110 @@
+"""
+Metrics Service - lightweight in-process latency histograms and counters.
+Fixed log-spaced buckets keep recording O(log n) and memory constant, so histograms can sit
+on hot paths (robot acks, upstream calls) and still answer percentile queries.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Bucket upper bounds in milliseconds (last bucket is open-ended)
+DEFAULT_BOUNDS_MS: List[float] = [
+    1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 750,
+    1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000,
+]
+
+
+class LatencyHistogram:
+    """Bucketed latency distribution with count, sum, min and max."""
+
+    def __init__(self, bounds_ms: Optional[List[float]] = None) -> None:
+        self.bounds_ms = list(bounds_ms or DEFAULT_BOUNDS_MS)
+        self.counts = [0] * (len(self.bounds_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Record one observation given in seconds."""
+        ms = seconds * 1000.0
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.min_ms = min(self.min_ms, ms)
+            self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Approximate q-th percentile (0-100) in ms, interpolated within the bucket."""
+        if self.count == 0:
+            return None
+        target = self.count * q / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= target:
+                lower = self.bounds_ms[i - 1] if i > 0 else 0.0
+                upper = self.bounds_ms[i] if i < len(self.bounds_ms) else self.max_ms
+                lower, upper = max(lower, self.min_ms), min(upper, self.max_ms)
+                return round(lower + (upper - lower) * (target - seen) / n, 3)
+            seen += n
+        return round(self.max_ms, 3)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "min_ms": round(self.min_ms, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3) if self.count else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Named histograms and counters, grouped by a dotted prefix (e.g. "robot.ack.LED")."""
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, LatencyHistogram())
+        return hist
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Record the duration of the with-block (including failed attempts) into histogram(name)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).record(time.perf_counter() - started)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def snapshot(self, prefix: str = "") -> dict:
+        return {
+            "histograms": {k: h.snapshot() for k, h in sorted(self.histograms.items()) if k.startswith(prefix)},
+            "counters": {k: v for k, v in sorted(self.counters.items()) if k.startswith(prefix)},
+        }
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    return _registry
@@ -0,0 +1,171 @@
+"""
+Model Router - picks the Groq model tier for each chat turn.
+Small talk, child-mode and privacy-mode turns rarely need the 70B model; a small model
+answers them several times faster. Each turn is scored by a tiny hand-weighted linear
+classifier over cheap features (length, mode, keywords, digits); low scores go to the fast
+tier. A fast answer that looks inadequate (truncated, empty, evasive) is escalated to the
+large model, and when one tier is down (see resilience) the other one answers.
+
+Configuration:
+    GROQ_MODEL          large tier (default llama-3.3-70b-versatile)
+    GROQ_FAST_MODEL     fast tier (default llama-3.1-8b-instant)
+    MODEL_ROUTING       auto (default) | fast | large  - force a tier, e.g. for A/B runs
+    MODEL_ROUTING_THRESHOLD  score at or above which a turn goes to the large model (default 1.0)
+    UPSTREAM_CHAT_TIMEOUT_MS per-attempt cap for chat calls (default 8000)
+"""
+
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from server.services.metrics import get_metrics
+from server.services.resilience import Deadline, UpstreamError, get_resilience
+
+LARGE_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+FAST_MODEL = os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant")
+ROUTING = os.getenv("MODEL_ROUTING", "auto").strip().lower()
+THRESHOLD = float(os.getenv("MODEL_ROUTING_THRESHOLD", "1.0"))
+CHAT_TIMEOUT = float(os.getenv("UPSTREAM_CHAT_TIMEOUT_MS", "8000")) / 1000.0
+
+FAST = "fast"
+LARGE = "large"
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+# Cues that a turn needs reasoning or domain depth
+_COMPLEX_CUES = (
+    "explain", "why", "derive", "calculate", "compute", "solve", "prove", "compare",
+    "difference between", "how does", "how do", "step by step", "steps", "design",
+    "code", "program", "circuit", "equation", "formula", "analyze", "analyse", "summarize",
+)
+# Cues for chit-chat the small model handles well
+_SIMPLE_CUES = (
+    "hi", "hello", "hey", "thanks", "thank you", "good morning", "good night", "joke",
+    "how are you", "what time", "weather", "who are you", "your name", "bye", "ok", "okay",
+)
+_MODE_BIAS = {"child": -1.0, "privacy": -1.5, "alarm": -1.0, "study": 1.0, "normal": 0.0}
+
+# Phrases that suggest the fast model could not really answer
+_EVASIVE = (
+    "i'm not sure", "i am not sure", "i don't know", "i do not know", "i cannot", "i can't help",
+    "as an ai", "i'm unable", "i am unable", "beyond my", "consult a",
+)
+
+
+def _has_cue(text: str, words: set, cues: Tuple[str, ...]) -> bool:
+    return any((cue in text) if " " in cue else (cue in words) for cue in cues)
+
+
+class TurnClassifier:
+    """Linear score over hand-picked features; >= threshold means the large model."""
+
+    WEIGHTS: Dict[str, float] = {
+        "bias": -0.4,
+        "log_words": 0.55,      # longer questions tend to be harder
+        "complex_cue": 1.2,
+        "simple_cue": -0.9,
+        "has_digits": 0.5,      # numbers usually mean calculation or specifics
+        "multi_question": 0.4,
+        "mode": 1.0,            # weight on _MODE_BIAS
+    }
+
+    def __init__(self, threshold: float = THRESHOLD) -> None:
+        self.threshold = threshold
+
+    def features(self, text: str, mode: str) -> Dict[str, float]:
+        lower = text.lower()
+        words = _WORD.findall(lower)
+        word_set = set(words)
+        return {
+            "bias": 1.0,
+            "log_words": math.log1p(len(words)),
+            "complex_cue": 1.0 if _has_cue(lower, word_set, _COMPLEX_CUES) else 0.0,
+            "simple_cue": 1.0 if _has_cue(lower, word_set, _SIMPLE_CUES) else 0.0,
+            "has_digits": 1.0 if any(ch.isdigit() for ch in lower) else 0.0,
+            "multi_question": 1.0 if lower.count("?") > 1 else 0.0,
+            "mode": _MODE_BIAS.get(mode, 0.0),
+        }
+
+    def score(self, text: str, mode: str) -> float:
+        return sum(self.WEIGHTS[name] * value for name, value in self.features(text, mode).items())
+
+    def classify(self, text: str, mode: str) -> str:
+        return LARGE if self.score(text, mode) >= self.threshold else FAST
+
+
+def is_inadequate(reply: Optional[str], finish_reason: Optional[str]) -> bool:
+    """Heuristic check on a fast-tier answer: truncated, empty or evasive."""
+    if finish_reason == "length":
+        return True
+    text = (reply or "").strip().lower()
+    if len(text) < 2:
+        return True
+    return any(phrase in text for phrase in _EVASIVE)
+
+
+class ModelRouter:
+    """Routes a chat turn to a model tier and escalates inadequate fast answers."""
+
+    def __init__(self, fast_model: str = FAST_MODEL, large_model: str = LARGE_MODEL, routing: str = ROUTING) -> None:
+        self.models = {FAST: fast_model, LARGE: large_model}
+        self.routing = routing if routing in (FAST, LARGE) else "auto"
+        self.classifier = TurnClassifier()
+
+    def choose(self, text: str, mode: str) -> str:
+        if self.routing != "auto":
+            return self.routing
+        return self.classifier.classify(text, mode)
+
+    def complete(
+        self,
+        client: Any,
+        messages: List[dict],
+        text: str,
+        mode: str,
+        max_tokens: int = 150,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        """
+        Ask the chosen tier; if that tier is down (breaker open, retries exhausted) use the
+        other one, and retry on the large model if a fast answer is not good enough.
+        """
+        deadline = deadline or Deadline()
+        tier = self.choose(text, mode)
+        metrics = get_metrics()
+        metrics.incr(f"ai.route.{tier}")
+        try:
+            reply, finish_reason = self._ask(client, tier, messages, max_tokens, deadline)
+        except UpstreamError as e:
+            other = LARGE if tier == FAST else FAST
+            print(f"⚠️ {tier} model unavailable ({e}); falling back to {other}")
+            metrics.incr(f"ai.fallback.{other}")
+            return self._ask(client, other, messages, max_tokens, deadline)[0]
+        if tier == FAST and self.routing == "auto" and is_inadequate(reply, finish_reason):
+            metrics.incr("ai.escalated")
+            try:
+                reply, _ = self._ask(client, LARGE, messages, max_tokens, deadline)
+            except UpstreamError:
+                pass  # keep the fast answer rather than nothing
+        return reply
+
+    def _ask(
+        self, client: Any, tier: str, messages: List[dict], max_tokens: int, deadline: Deadline
+    ) -> Tuple[str, Optional[str]]:
+        def request(timeout: float) -> Any:
+            return client.chat.completions.create(
+                model=self.models[tier],
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=timeout,
+            )
+
+        completion = get_resilience().call(f"groq.chat.{tier}", request, deadline, timeout=CHAT_TIMEOUT)
+        metrics = get_metrics()
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            metrics.incr(f"ai.tokens.{tier}.prompt", getattr(usage, "prompt_tokens", 0) or 0)
+            metrics.incr(f"ai.tokens.{tier}.completion", getattr(usage, "completion_tokens", 0) or 0)
+        choice = completion.choices[0]
+        return choice.message.content, getattr(choice, "finish_reason", None)
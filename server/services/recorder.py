@@ -0,0 +1,206 @@
+"""
+Session Recorder - opt-in capture of inbound /ws/audio and /ws/robot traffic for replay.
+Enabled with RECORD_SESSIONS=1. Each server run writes one recording directory under
+RECORD_DIR (default shared/recordings/<timestamp>-<pid>/):
+
+    index.jsonl      one JSON line per segment opened, plus a final line on clean shutdown
+    seg-00000.rec    append-only segments, rolled over at RECORD_SEGMENT_MB
+
+A segment starts with MAGIC and holds back-to-back records: a RECORD header
+(microseconds since recording start, payload length, channel, kind, stream id) and the
+payload. Besides the raw frames, transcripts and LLM replies are stored as annotations so
+the replayer can serve the exact same upstream answers (benchmarks/replay_session.py).
+
+Writes happen on a background thread; if it falls behind, records are dropped and counted
+(recorder.dropped) rather than slowing the WebSocket handlers down.
+"""
+
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Union
+
+from server.services.metrics import get_metrics
+
+DEFAULT_RECORD_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "shared", "recordings"
+)
+SEGMENT_BYTES = int(float(os.getenv("RECORD_SEGMENT_MB", "64")) * 1024 * 1024)
+QUEUE_SIZE = 10000
+
+MAGIC = b"GUSREC1\n"
+RECORD = struct.Struct("<QIBBH")  # t_us, payload length, channel, kind, stream id
+
+# Channels
+CH_AUDIO = 0
+CH_ROBOT = 1
+CH_NOTE = 2
+
+# Kinds
+K_OPEN = 0        # stream opened; payload is JSON metadata (path, subprotocol, query)
+K_CLOSE = 1
+K_TEXT = 2        # inbound text frame (UTF-8)
+K_BYTES = 3       # inbound binary frame
+K_TRANSCRIPT = 4  # annotation: what the upstream transcriber returned
+K_REPLY = 5       # annotation: what the upstream LLM returned
+
+
+class Record(NamedTuple):
+    t_us: int
+    channel: int
+    kind: int
+    stream: int
+    payload: bytes
+
+    @property
+    def text(self) -> str:
+        return self.payload.decode("utf-8")
+
+
+class SessionRecorder:
+    """Appends records to the current segment from a writer thread."""
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._started = time.monotonic_ns()
+        self._streams = itertools.count(1)
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._segment_no = -1
+        self._segment = None
+        self._segment_size = 0
+        self._records = 0
+        self._index = open(os.path.join(directory, "index.jsonl"), "a", encoding="utf-8")
+        self._write_index({"version": 1, "started_at": datetime.utcnow().isoformat() + "Z"})
+        self._thread = threading.Thread(target=self._writer, name="session-recorder", daemon=True)
+        self._thread.start()
+        print(f"⏺️ Recording sessions to {directory}")
+
+    # ---- Producer side (event loop) ----
+
+    def record(self, channel: int, kind: int, stream: int, payload: Union[bytes, str] = b"") -> None:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        t_us = (time.monotonic_ns() - self._started) // 1000
+        try:
+            self._queue.put_nowait((t_us, channel, kind, stream, payload))
+        except queue.Full:
+            get_metrics().incr("recorder.dropped")
+
+    def open_stream(self, channel: int, **meta) -> int:
+        stream = next(self._streams) % 65536
+        self.record(channel, K_OPEN, stream, json.dumps(meta))
+        return stream
+
+    def close_stream(self, channel: int, stream: int) -> None:
+        self.record(channel, K_CLOSE, stream)
+
+    def frame(self, channel: int, stream: int, data: Union[bytes, str]) -> None:
+        self.record(channel, K_TEXT if isinstance(data, str) else K_BYTES, stream, data)
+
+    def annotate(self, kind: int, text: str) -> None:
+        self.record(CH_NOTE, kind, 0, text)
+
+    def close(self) -> None:
+        """Flush everything queued and close the files (lifespan shutdown)."""
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    # ---- Writer thread ----
+
+    def _write_index(self, entry: dict) -> None:
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+    def _roll(self, t_us: int) -> None:
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_no += 1
+        name = f"seg-{self._segment_no:05d}.rec"
+        self._segment = open(os.path.join(self.directory, name), "ab")
+        self._segment.write(MAGIC)
+        self._segment_size = len(MAGIC)
+        self._write_index({"segment": name, "first_us": t_us, "first_record": self._records})
+
+    def _writer(self) -> None:
+        last_t = 0
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while item is not None and not self._queue.empty() and len(batch) < 512:
+                item = self._queue.get_nowait()
+                batch.append(item)
+            for entry in batch:
+                if entry is None:
+                    continue
+                t_us, channel, kind, stream, payload = entry
+                if self._segment is None or self._segment_size >= self.segment_bytes:
+                    self._roll(t_us)
+                self._segment.write(RECORD.pack(t_us, len(payload), channel, kind, stream))
+                self._segment.write(payload)
+                self._segment_size += RECORD.size + len(payload)
+                self._records += 1
+                last_t = t_us
+            if self._segment is not None:
+                self._segment.flush()
+            if batch[-1] is None:
+                break
+        if self._segment is not None:
+            self._segment.close()
+        self._write_index({"end_us": last_t, "records": self._records})
+        self._index.close()
+
+
+class RecordingReader:
+    """Iterates the records of a recording directory in order (tolerates a torn last record)."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.index: List[dict] = []
+        with open(os.path.join(directory, "index.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self.index.append(json.loads(line))
+
+    @property
+    def segments(self) -> List[str]:
+        return [entry["segment"] for entry in self.index if "segment" in entry]
+
+    def __iter__(self) -> Iterator[Record]:
+        for name in self.segments:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{name} is not a session recording segment")
+                while True:
+                    header = f.read(RECORD.size)
+                    if len(header) < RECORD.size:
+                        break
+                    t_us, length, channel, kind, stream = RECORD.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length:
+                        break
+                    yield Record(t_us, channel, kind, stream, payload)
+
+    def annotations(self, kind: int) -> List[str]:
+        return [r.text for r in self if r.channel == CH_NOTE and r.kind == kind]
+
+
+_recorder: Optional[SessionRecorder] = None
+_configured = False
+
+
+def get_recorder() -> Optional[SessionRecorder]:
+    """Return the session recorder, or None unless RECORD_SESSIONS is enabled."""
+    global _recorder, _configured
+    if not _configured:
+        _configured = True
+        if os.getenv("RECORD_SESSIONS", "").lower() in ("1", "true", "yes"):
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            _recorder = SessionRecorder(os.path.join(os.getenv("RECORD_DIR", DEFAULT_RECORD_DIR), name))
+    return _recorder
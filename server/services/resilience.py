@@ -0,0 +1,241 @@
+"""
+Resilience Service - deadlines, hedging, retries and circuit breaking for upstream calls.
+Every Groq and OpenWeatherMap request goes through Resilience.call():
+
+  - Deadline: each voice turn gets an end-to-end budget (UPSTREAM_BUDGET_MS); every call is
+    capped at the smaller of its own timeout and what is left of the budget.
+  - Hedging: if an attempt has not answered after the route's observed p95 latency, a
+    duplicate is sent and the first success wins (idempotent calls only).
+  - Retry: retryable failures (timeouts, connection errors, 429, 5xx) are retried with
+    full-jitter exponential backoff while the deadline allows.
+  - Circuit breaker: after BREAKER_FAILURES consecutive failures a route fails fast for
+    BREAKER_RESET_S, so callers switch to their fallback (another model) immediately.
+
+Calls are plain blocking functions taking a timeout; attempts run on a small thread pool so
+a hedge can race the original.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+from server.services.metrics import get_metrics
+
+T = TypeVar("T")
+
+BUDGET = float(os.getenv("UPSTREAM_BUDGET_MS", "12000")) / 1000.0
+MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+HEDGING = os.getenv("UPSTREAM_HEDGE", "1").lower() in ("1", "true", "yes")
+HEDGE_MIN = float(os.getenv("HEDGE_MIN_MS", "150")) / 1000.0
+HEDGE_DEFAULT = float(os.getenv("HEDGE_DEFAULT_MS", "2000")) / 1000.0
+HEDGE_MIN_SAMPLES = 20
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 1.0
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET_S", "30"))
+MIN_ATTEMPT_TIME = 0.05  # don't start an attempt with less budget than this
+
+_RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "TimeoutException", "ConnectError", "ReadTimeout"}
+
+
+class UpstreamError(Exception):
+    """An upstream call failed after retries, hedging and the deadline were exhausted."""
+
+
+class UpstreamUnavailable(UpstreamError):
+    """The route's circuit breaker is open (or the deadline was already spent)."""
+
+
+class Deadline:
+    """Absolute end time for a unit of work (one voice turn)."""
+
+    def __init__(self, budget: float = BUDGET) -> None:
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def within(self, budget: float) -> "Deadline":
+        """A sub-deadline for optional work: at most `budget` seconds, never past this one."""
+        return Deadline(min(budget, self.remaining()))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, TimeoutError) or type(exc).__name__ in _RETRYABLE_NAMES:
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (fail fast) -> half-open (one probe)."""
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET) -> None:
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            was_probe, self._probing = self._probing, False
+            if was_probe or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                get_metrics().incr(f"resilience.{self.name}.breaker_opened")
+                print(f"🔌 Circuit open for {self.name} ({self.failures} failures)")
+
+
+class Resilience:
+    """Per-route breakers plus the shared attempt pool."""
+
+    def __init__(self, hedging: bool = HEDGING, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self.hedging = hedging
+        self.max_attempts = max_attempts
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upstream")
+        self._lock = threading.Lock()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def hedge_delay(self, name: str) -> float:
+        hist = get_metrics().histogram(f"upstream.{name}")
+        if hist.count < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT
+        return max(HEDGE_MIN, (hist.percentile(95) or 0.0) / 1000.0)
+
+    def call(
+        self,
+        name: str,
+        fn: Callable[[float], T],
+        deadline: Optional[Deadline] = None,
+        timeout: float = 10.0,
+        hedge: bool = True,
+    ) -> T:
+        """
+        Run fn(timeout_seconds) under the route's breaker, deadline, hedging and retry policy.
+        Raises UpstreamUnavailable when the breaker is open, UpstreamError when all attempts
+        failed, or the original exception for non-retryable errors (e.g. 400).
+        """
+        deadline = deadline or Deadline()
+        breaker = self.breaker(name)
+        metrics = get_metrics()
+        last_error: Optional[BaseException] = None
+        for attempt in range(self.max_attempts):
+            # Deadline first: a half-open breaker hands out its one probe in allow(), and only
+            # an attempt's success or failure gives it back
+            remaining = deadline.remaining()
+            if remaining < MIN_ATTEMPT_TIME:
+                break
+            if not breaker.allow():
+                metrics.incr(f"resilience.{name}.short_circuited")
+                raise UpstreamUnavailable(f"{name}: circuit open")
+            if attempt:
+                metrics.incr(f"resilience.{name}.retries")
+            try:
+                result = self._attempt(name, fn, min(timeout, remaining), hedge and self.hedging)
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.record_success()  # the upstream answered; the request was bad
+                    raise
+                breaker.record_failure()
+                last_error = e
+                metrics.incr(f"resilience.{name}.failures")
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                if deadline.remaining() <= backoff + MIN_ATTEMPT_TIME:
+                    break
+                time.sleep(backoff)
+                continue
+            breaker.record_success()
+            return result
+        if last_error is None:
+            metrics.incr(f"resilience.{name}.deadline_exceeded")
+            raise UpstreamUnavailable(f"{name}: deadline exhausted")
+        raise UpstreamError(f"{name}: {last_error}") from last_error
+
+    def _timed(self, name: str, fn: Callable[[float], T], timeout: float) -> T:
+        with get_metrics().timer(f"upstream.{name}"):
+            return fn(timeout)
+
+    def _attempt(self, name: str, fn: Callable[[float], T], timeout: float, hedge: bool) -> T:
+        started = time.monotonic()
+        first: Future = self._pool.submit(self._timed, name, fn, timeout)
+        delay = self.hedge_delay(name)
+        if not hedge or delay >= timeout:
+            return first.result(timeout=timeout + 1.0)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        get_metrics().incr(f"resilience.{name}.hedges")
+        second: Future = self._pool.submit(self._timed, name, fn, max(MIN_ATTEMPT_TIME, timeout - delay))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            left = timeout + 1.0 - (time.monotonic() - started)
+            if left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        get_metrics().incr(f"resilience.{name}.hedge_wins")
+                    return future.result()
+                error = future.exception()
+        # The loser keeps running until its own timeout; sync HTTP calls cannot be cancelled
+        raise error or TimeoutError(f"{name}: no answer within {timeout:.2f}s")
+
+    def snapshot(self) -> dict:
+        return {
+            name: {"state": b.state, "consecutive_failures": b.failures}
+            for name, b in sorted(self.breakers.items())
+        }
+
+
+_resilience: Optional[Resilience] = None
+
+
+def get_resilience() -> Resilience:
+    """Return the process-wide resilience layer."""
+    global _resilience
+    if _resilience is None:
+        _resilience = Resilience()
+    return _resilience
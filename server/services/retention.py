@@ -0,0 +1,270 @@
+"""
+Retention Service - keeps shared/gus.db from growing without bound.
+A background job runs every RETENTION_INTERVAL_S on one worker at a time (a lease on the
+shared state backend) and, off the event loop:
+
+  1. rolls complete UTC days of interaction_logs up into interaction_daily_rollups
+     (turns, audio duration, per-mode counts); the analytics endpoint reads these
+  2. moves raw rows older than RETENTION_DAYS to gzip'd JSON-lines archives
+     (ARCHIVE_DIR/interactions-YYYY-MM.jsonl.gz) and deletes them RETENTION_BATCH rows at a
+     time with a pause in between, so writers never queue behind one long delete
+  3. hands the freed pages back to the filesystem with bounded incremental-vacuum steps
+
+Rows are archived only once their day is rolled up. Each batch is written and fsynced to
+the archive before it is deleted, so a crash can at worst repeat a batch in the archive
+(every line carries the row id), never lose one.
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from server.database import engine as default_engine
+from server.models import InteractionDailyRollups, InteractionLogs
+from server.services.history import daily_aggregates
+from server.services.metrics import get_metrics
+
+ENABLED = os.getenv("RETENTION_ENABLED", "1").lower() in ("1", "true", "yes")
+RETENTION_DAYS = max(2, int(os.getenv("RETENTION_DAYS", "30")))
+INTERVAL = float(os.getenv("RETENTION_INTERVAL_S", "3600"))
+BATCH = int(os.getenv("RETENTION_BATCH", "500"))
+PAUSE = float(os.getenv("RETENTION_PAUSE_MS", "50")) / 1000.0
+VACUUM_PAGES = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "shared", "archive"
+)
+START_DELAY = 60.0  # let startup traffic settle before the first run
+ROLLUP_CHUNK_DAYS = 7
+LEASE_KEY = "retention:leader"
+
+
+class RetentionJob:
+    """Rollup, archive, batched delete and incremental vacuum for interaction_logs."""
+
+    def __init__(
+        self,
+        engine: Optional[Engine] = None,
+        archive_dir: str = ARCHIVE_DIR,
+        retention_days: int = RETENTION_DAYS,
+        batch: int = BATCH,
+        pause: float = PAUSE,
+        vacuum_pages: int = VACUUM_PAGES,
+    ) -> None:
+        self.engine = engine or default_engine
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.batch = batch
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+        self.last_run: Optional[dict] = None
+        self._stop = threading.Event()
+
+    # ---- One pass (blocking; runs in a worker thread) ----
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        """Roll up, archive and vacuum once; returns a summary of what was done."""
+        started = time.monotonic()
+        now = now or datetime.utcnow()
+        summary: dict = {"started_at": now.isoformat()}
+        summary["converted_to_incremental_vacuum"] = self._ensure_incremental_vacuum()
+        summary["days_rolled"], watermark = self.rollup(now.date())
+        cutoff = now - timedelta(days=self.retention_days)
+        if watermark is None:
+            cutoff = None  # nothing rolled up yet, so nothing may be archived
+        else:
+            cutoff = min(cutoff, datetime.combine(watermark + timedelta(days=1), dtime()))
+        summary["archive_cutoff"] = cutoff.isoformat() if cutoff else None
+        summary["rows_archived"] = self.archive(cutoff) if cutoff else 0
+        summary["pages_vacuumed"] = self.vacuum()
+        summary["seconds"] = round(time.monotonic() - started, 2)
+        self.last_run = summary
+        return summary
+
+    def rollup(self, today: date) -> Tuple[int, Optional[date]]:
+        """
+        Aggregate every complete day since the last rollup; returns (days written, newest
+        rolled day). The newest rolled day is redone while its raw rows are still all there,
+        picking up turns that other workers flushed after midnight.
+        """
+        table = InteractionDailyRollups.__table__
+        with self.engine.connect() as conn:
+            watermark = conn.execute(select(func.max(table.c.day))).scalar()
+            if watermark is not None:
+                start = watermark
+                if watermark <= today - timedelta(days=self.retention_days):
+                    start = watermark + timedelta(days=1)
+            else:
+                first = conn.execute(select(func.min(InteractionLogs.timestamp))).scalar()
+                if first is None:
+                    return 0, None
+                start = first.date()
+
+        days = set()
+        while start < today and not self._stop.is_set():
+            end = min(start + timedelta(days=ROLLUP_CHUNK_DAYS), today)
+            with self.engine.begin() as conn:
+                rows = daily_aggregates(conn, start, end)
+                if rows:
+                    stmt = sqlite_insert(table)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["day", "mode"],
+                        set_={
+                            "turns": stmt.excluded.turns,
+                            "audio_turns": stmt.excluded.audio_turns,
+                            "audio_seconds": stmt.excluded.audio_seconds,
+                        },
+                    )
+                    conn.execute(stmt, rows)
+            days.update(row["day"] for row in rows)
+            start = end
+        if days:
+            watermark = max(days) if watermark is None else max(watermark, max(days))
+        get_metrics().incr("retention.days_rolled", len(days))
+        return len(days), watermark
+
+    def archive(self, cutoff: datetime) -> int:
+        """Move rows older than `cutoff` to the archive, one short delete per batch."""
+        table = InteractionLogs.__table__
+        metrics = get_metrics()
+        query = (
+            select(table.c.id, table.c.timestamp, table.c.mode, table.c.user_text,
+                   table.c.robot_response, table.c.audio_duration)
+            .where(table.c.timestamp < cutoff)
+            .order_by(table.c.timestamp, table.c.id)
+            .limit(self.batch)
+        )
+        archived = 0
+        while not self._stop.is_set():
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            if not rows:
+                break
+            self._write_archive(rows)
+            with metrics.timer("retention.delete_batch"):
+                with self.engine.begin() as conn:
+                    conn.execute(table.delete().where(table.c.id.in_([r.id for r in rows])))
+            archived += len(rows)
+            metrics.incr("retention.archived", len(rows))
+            time.sleep(self.pause)  # let queued writers in between batches
+        return archived
+
+    def _write_archive(self, rows: List) -> None:
+        """Append rows to their month's archive as one gzip member, durably."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_month: Dict[str, List[str]] = defaultdict(list)
+        for r in rows:
+            by_month[f"{r.timestamp:%Y-%m}"].append(json.dumps({
+                "id": r.id,
+                "timestamp": r.timestamp.isoformat(),
+                "mode": r.mode,
+                "user_text": r.user_text,
+                "robot_response": r.robot_response,
+                "audio_duration": r.audio_duration,
+            }))
+        for month, lines in by_month.items():
+            path = os.path.join(self.archive_dir, f"interactions-{month}.jsonl.gz")
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                    gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+
+    def vacuum(self) -> int:
+        """Release free pages in steps of vacuum_pages; returns the number released."""
+        released = 0
+        with self.engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                return 0
+            while not self._stop.is_set():
+                free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                if not free:
+                    break
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.execute(f"PRAGMA incremental_vacuum({min(free, self.vacuum_pages)})")
+                    cursor.fetchall()  # SQLite frees one page per step of the statement
+                finally:
+                    cursor.close()
+                conn.commit()
+                released += free - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                time.sleep(self.pause)
+        get_metrics().incr("retention.pages_vacuumed", released)
+        return released
+
+    def _ensure_incremental_vacuum(self) -> bool:
+        """
+        Switch a database created before auto_vacuum=INCREMENTAL over (one full VACUUM).
+        Returns True if it did.
+        """
+        with self.engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 0:
+                return False
+            print("🧹 Converting database to incremental auto-vacuum (one-time VACUUM)")
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        return True
+
+    # ---- Scheduling (event loop) ----
+
+    async def run(self) -> Optional[dict]:
+        """One pass in a worker thread; failures are logged, not raised."""
+        try:
+            summary = await asyncio.to_thread(self.run_once)
+        except Exception as e:
+            print(f"⚠️ Retention run failed: {e}")
+            get_metrics().incr("retention.failed")
+            return None
+        if summary["rows_archived"] or summary["days_rolled"]:
+            print(
+                f"🧹 Retention: {summary['days_rolled']} days rolled up, {summary['rows_archived']} rows archived, "
+                f"{summary['pages_vacuumed']} pages vacuumed in {summary['seconds']}s"
+            )
+        return summary
+
+    async def run_forever(self, interval: float = INTERVAL) -> None:
+        """Background task: run every `interval` seconds on whichever worker holds the lease."""
+        from server.services.cluster import get_cluster
+
+        if not ENABLED:
+            return
+        cluster = get_cluster()
+        try:
+            await asyncio.sleep(START_DELAY)
+            while True:
+                if await self._take_lease(cluster, ttl=interval * 2):
+                    await self.run()
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            self._stop.set()  # a pass still running in its thread stops after the current batch
+            await cluster.backend.delete(LEASE_KEY, only_if=cluster.worker_id)
+            raise
+
+    @staticmethod
+    async def _take_lease(cluster, ttl: float) -> bool:
+        """Best effort: the backend has no compare-and-set, but every step is idempotent."""
+        owner = await cluster.backend.get(LEASE_KEY)
+        if owner and owner != cluster.worker_id:
+            return False
+        await cluster.backend.set(LEASE_KEY, cluster.worker_id, ttl=ttl)
+        return await cluster.backend.get(LEASE_KEY) == cluster.worker_id
+
+
+_job_instance: Optional[RetentionJob] = None
+
+
+def get_retention() -> RetentionJob:
+    """Return the shared retention job."""
+    global _job_instance
+    if _job_instance is None:
+        _job_instance = RetentionJob()
+    return _job_instance
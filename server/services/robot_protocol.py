@@ -0,0 +1,276 @@
+"""
+Robot Protocol - wire codecs for the /ws/robot link.
+The codec is negotiated with the WebSocket subprotocol header during the handshake:
+
+    gus.bin.v1   compact binary framing with a fixed opcode table (preferred)
+    gus.json.v1  {"action": ..., "value": ...} text frames (also used when nothing is offered)
+
+Binary frame layout (little endian):
+    uint8   opcode
+    uint16  seq         - 0 when the command is not sequenced
+    ...     body        - depends on the opcode:
+        LED / SERVO / BUZZER   uint8 value code from VALUE_CODES
+        VOLUME                 uint8 percent (0-100)
+        SAY / AUDIO_START /
+        AUDIO_END              uint16 length + UTF-8 text (at most 65535 bytes, else
+                               encode_command raises ProtocolError)
+        GENERIC                uint8 length + action, uint16 length + value
+    AUDIO_FRAME frames are opcode + raw audio bytes (no seq).
+
+Robot -> server frames use opcodes >= 0x80:
+    TELEMETRY              uint16 battery x10 (%), int16 temperature x10 (C),
+                           int8 rssi (dBm), uint16 mic_level x1000 (0-1 RMS)
+    ACK                    header only; seq of the executed command
+
+Sequencing: on a negotiated connection (either subprotocol) every command carries a non-zero
+seq and the robot answers with an ACK for it. Retransmissions reuse the seq, so the robot must
+ack duplicates without executing them again. Legacy clients (no subprotocol) get no seq.
+
+Sessions: right after the handshake a negotiated robot gets an unsequenced SESSION command
+whose value is "<token>/new" or "<token>/resumed". A robot that lost its link reconnects with
+?session=<token>; if the session is resumed, commands it missed are replayed with their
+original seq (the seq is the idempotency key), so its duplicate suppression must survive the
+reconnect. On "new" nothing is replayed and old seqs mean nothing.
+
+This module has no server dependencies so the simulator can import it.
+"""
+
+import json
+import math
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+JSON_PROTOCOL = "gus.json.v1"
+BINARY_PROTOCOL = "gus.bin.v1"
+
+# Server preference order
+SUPPORTED_PROTOCOLS = (BINARY_PROTOCOL, JSON_PROTOCOL)
+
+OP_LED = 0x01
+OP_SERVO = 0x02
+OP_BUZZER = 0x03
+OP_VOLUME = 0x04
+OP_SAY = 0x05
+OP_AUDIO_START = 0x06
+OP_AUDIO_END = 0x07
+OP_AUDIO_FRAME = 0x10
+OP_GENERIC = 0x7F
+OP_TELEMETRY = 0x81
+OP_ACK = 0x82
+
+SESSION_ACTION = "SESSION"  # sent with generic framing
+
+OPCODES: Dict[str, int] = {
+    "LED": OP_LED,
+    "SERVO": OP_SERVO,
+    "BUZZER": OP_BUZZER,
+    "VOLUME": OP_VOLUME,
+    "SAY": OP_SAY,
+    "AUDIO_START": OP_AUDIO_START,
+    "AUDIO_END": OP_AUDIO_END,
+}
+ACTIONS: Dict[int, str] = {op: action for action, op in OPCODES.items()}
+
+VALUE_CODES: Dict[str, Dict[str, int]] = {
+    "LED": {"OFF": 0, "GREEN": 1, "BLUE": 2, "RED": 3, "GREEN_BLINK": 4, "RED_BLINK": 5, "BLUE_BLINK": 6},
+    "SERVO": {"DOWN": 0, "UP": 1, "CENTER": 2},
+    "BUZZER": {"OFF": 0, "ON": 1},
+}
+VALUE_NAMES: Dict[str, Dict[int, str]] = {
+    action: {code: name for name, code in table.items()} for action, table in VALUE_CODES.items()
+}
+
+_HEADER = struct.Struct("<BH")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_TELEMETRY = struct.Struct("<HhbH")
+
+Frame = Union[str, bytes]
+
+
+class ProtocolError(ValueError):
+    """Raised when a frame cannot be decoded, or a command cannot be encoded."""
+
+
+class JsonCodec:
+    """Legacy text framing; one JSON object per command."""
+
+    name = JSON_PROTOCOL
+    binary = False
+
+    def __init__(self) -> None:
+        self._prebuilt: Dict[Tuple[str, str], str] = {}
+
+    def encode_command(self, action: str, value: str, seq: int = 0) -> str:
+        frame = self._prebuilt.get((action, value))
+        if frame is not None:
+            # Pre-built frames end with "}"; splice the seq in without re-serializing
+            return f'{frame[:-1]},"seq":{seq}}}' if seq else frame
+        payload = {"action": action, "value": value}
+        if seq:
+            payload["seq"] = seq
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def encode_audio(self, frame: bytes) -> bytes:
+        return frame
+
+    def encode_telemetry(self, sample: dict) -> str:
+        return json.dumps({"type": "telemetry", **sample}, separators=(",", ":"))
+
+    def encode_ack(self, seq: int) -> str:
+        return json.dumps({"type": "ack", "seq": seq}, separators=(",", ":"))
+
+    def decode(self, frame: Frame) -> dict:
+        if isinstance(frame, bytes):
+            return {"action": "AUDIO_FRAME", "value": frame}
+        try:
+            data = json.loads(frame)
+        except json.JSONDecodeError as e:
+            raise ProtocolError(str(e)) from e
+        if not isinstance(data, dict):
+            raise ProtocolError("JSON frame is not an object")
+        return data
+
+    def prebuild(self, commands: Iterable[Tuple[str, str]]) -> None:
+        """Serialize fixed commands once so send paths are a dict lookup."""
+        for action, value in commands:
+            self._prebuilt.pop((action, value), None)
+            self._prebuilt[(action, value)] = self.encode_command(action, value)
+
+
+def _text(action: str, value: str) -> bytes:
+    """uint16 length + UTF-8 value; raises ProtocolError past 65535 bytes."""
+    data = str(value).encode("utf-8")
+    if len(data) > 0xFFFF:
+        raise ProtocolError(f"{action} value is {len(data)} bytes, the binary framing takes at most 65535")
+    return _U16.pack(len(data)) + data
+
+
+class BinaryCodec:
+    """Compact opcode framing; an LED command is 4 bytes instead of ~35."""
+
+    name = BINARY_PROTOCOL
+    binary = True
+
+    def __init__(self) -> None:
+        self._prebuilt: Dict[Tuple[str, str], bytes] = {}
+
+    def encode_command(self, action: str, value: str, seq: int = 0) -> bytes:
+        frame = self._prebuilt.get((action, value))
+        if frame is not None:
+            if not seq:
+                return frame
+            patched = bytearray(frame)
+            _U16.pack_into(patched, 1, seq)
+            return bytes(patched)
+        op = OPCODES.get(action)
+        if op in (OP_LED, OP_SERVO, OP_BUZZER):
+            code = VALUE_CODES[action].get(value)
+            if code is not None:
+                return _HEADER.pack(op, seq) + _U8.pack(code)
+        elif op == OP_VOLUME:
+            try:
+                volume = float(value)  # 0.0-1.0 on the server
+            except ValueError:
+                volume = math.nan
+            if math.isfinite(volume):
+                return _HEADER.pack(op, seq) + _U8.pack(max(0, min(100, round(volume * 100))))
+        elif op is not None:
+            return _HEADER.pack(op, seq) + _text(action, value)
+        # Unknown action or value: generic framing keeps the protocol open-ended
+        name = action.encode("utf-8")[:255]
+        return _HEADER.pack(OP_GENERIC, seq) + _U8.pack(len(name)) + name + _text(action, value)
+
+    def encode_audio(self, frame: bytes) -> bytes:
+        return _U8.pack(OP_AUDIO_FRAME) + frame
+
+    def encode_telemetry(self, sample: dict) -> bytes:
+        return _HEADER.pack(OP_TELEMETRY, 0) + _TELEMETRY.pack(
+            max(0, min(65535, round(sample.get("battery", 0) * 10))),
+            max(-32768, min(32767, round(sample.get("temperature", 0) * 10))),
+            max(-128, min(127, round(sample.get("rssi", 0)))),
+            max(0, min(65535, round(sample.get("mic_level", 0) * 1000))),
+        )
+
+    def encode_ack(self, seq: int) -> bytes:
+        return _HEADER.pack(OP_ACK, seq)
+
+    def decode(self, frame: Frame) -> dict:
+        if isinstance(frame, str):
+            raise ProtocolError("text frame on a binary connection")
+        if not frame:
+            raise ProtocolError("empty frame")
+        op = frame[0]
+        if op == OP_AUDIO_FRAME:
+            return {"action": "AUDIO_FRAME", "value": frame[1:]}
+        if len(frame) < _HEADER.size:
+            raise ProtocolError("truncated header")
+        _, seq = _HEADER.unpack_from(frame)
+        body = frame[_HEADER.size:]
+        if op == OP_ACK:
+            return {"type": "ack", "seq": seq}
+        try:
+            if op == OP_TELEMETRY:
+                battery, temperature, rssi, mic_level = _TELEMETRY.unpack_from(body)
+                return {
+                    "type": "telemetry",
+                    "battery": battery / 10,
+                    "temperature": temperature / 10,
+                    "rssi": rssi,
+                    "mic_level": mic_level / 1000,
+                }
+            if op in (OP_LED, OP_SERVO, OP_BUZZER):
+                action = ACTIONS[op]
+                value = VALUE_NAMES[action].get(body[0], str(body[0]))
+            elif op == OP_VOLUME:
+                action, value = "VOLUME", str(body[0] / 100)
+            elif op in ACTIONS:
+                action = ACTIONS[op]
+                (length,) = _U16.unpack_from(body)
+                value = body[2:2 + length].decode("utf-8")
+            elif op == OP_GENERIC:
+                name_len = body[0]
+                action = body[1:1 + name_len].decode("utf-8")
+                (length,) = _U16.unpack_from(body, 1 + name_len)
+                start = 3 + name_len
+                value = body[start:start + length].decode("utf-8")
+            else:
+                raise ProtocolError(f"unknown opcode 0x{op:02x}")
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ProtocolError(f"malformed frame for opcode 0x{op:02x}: {e}") from e
+        decoded = {"action": action, "value": value}
+        if seq:
+            decoded["seq"] = seq
+        return decoded
+
+    def prebuild(self, commands: Iterable[Tuple[str, str]]) -> None:
+        """Encode fixed commands once so send paths are a dict lookup."""
+        for action, value in commands:
+            self._prebuilt.pop((action, value), None)
+            self._prebuilt[(action, value)] = self.encode_command(action, value)
+
+
+_CODECS = {JSON_PROTOCOL: JsonCodec(), BINARY_PROTOCOL: BinaryCodec()}
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """
+    Pick the subprotocol to accept from those the robot offered.
+    Returns None for legacy clients that offered nothing (they get JSON).
+    """
+    offered = list(offered)
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return None
+
+
+def get_codec(protocol: Optional[str]) -> Union[JsonCodec, BinaryCodec]:
+    """Return the shared codec for a negotiated subprotocol (JSON when None)."""
+    return _CODECS.get(protocol or JSON_PROTOCOL, _CODECS[JSON_PROTOCOL])
+
+
+def prebuild_all(commands: List[Tuple[str, str]]) -> None:
+    """Pre-encode fixed commands in every codec."""
+    for codec in _CODECS.values():
+        codec.prebuild(commands)
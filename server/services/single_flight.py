@@ -0,0 +1,84 @@
+"""
+Single-Flight Service - coalesces identical concurrent upstream requests.
+While a call for a key is in flight, other callers with the same key wait for it and share
+its result (or exception) instead of issuing their own request. Keys are content hashes of
+everything that determines the answer (audio bytes, prompt messages, model).
+
+A group can also remember successful results for a short `linger` window, so a client that
+times out and resends the same upload gets the finished answer instead of a second call.
+None results and exceptions are never remembered.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Generic, Optional, TypeVar, Union
+
+from server.services.metrics import get_metrics
+
+T = TypeVar("T")
+
+
+def content_key(*parts: Union[str, bytes]) -> str:
+    """SHA-256 over the parts, separated so ("ab", "c") and ("a", "bc") differ."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8") if isinstance(part, str) else part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class _Call(Generic[T]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+        self.finished_at = 0.0
+
+
+class SingleFlight(Generic[T]):
+    """One in-flight call per key; thread-safe (callers run in worker threads)."""
+
+    def __init__(self, name: str, linger: float = 0.0) -> None:
+        self.name = name
+        self.linger = linger
+        self._calls: Dict[str, _Call[T]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        metrics = get_metrics()
+        with self._lock:
+            self._expire()
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            metrics.incr(f"singleflight.{self.name}.{'shared' if not call.done.is_set() else 'remembered'}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.incr(f"singleflight.{self.name}.calls")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            call.finished_at = time.monotonic()
+            with self._lock:
+                if call.error is not None or call.result is None or self.linger <= 0:
+                    self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def _expire(self) -> None:
+        """Drop remembered results older than linger (caller holds the lock)."""
+        if self.linger <= 0:
+            return
+        cutoff = time.monotonic() - self.linger
+        stale = [k for k, c in self._calls.items() if c.done.is_set() and c.finished_at < cutoff]
+        for key in stale:
+            del self._calls[key]
@@ -0,0 +1,215 @@
+"""
+Speculation Service - start the chat reply while the user is still talking.
+A mic may stream an utterance instead of uploading it whole: a {"type": "utterance_start"}
+text frame, binary chunks (16 kHz mono 16-bit PCM, or the negotiated uplink codec), then
+{"type": "utterance_end"}. While chunks arrive, the audio so far is transcribed whenever the
+speaker pauses (SPECULATE_PAUSE_MS below SPECULATE_SILENCE_RMS, once SPECULATE_MIN_AUDIO_MS
+is in): a pause is usually the end of the question, and the mic's own end-of-speech timeout
+plus the final transcription are the time won. Each interim transcript goes through the same
+intent matching as a final one; if it is a chat turn, the LLM call starts right away in the
+background, and it is restarted if a later pause yields a different transcript.
+
+When the final transcript is in, the speculation is committed if it was made on the same
+words (spelling-level differences allowed, see SPECULATE_MATCH) and the mode and age have
+not changed since; otherwise it is cancelled and the turn runs as usual. An upstream call
+cannot be aborted mid-flight, so a cancelled one finishes in its thread and is dropped.
+Speculative work only takes a free admission slot; it never queues behind real turns.
+
+Metrics: speculation.{interims,started,hit,miss,cancelled,none,busy,command} counters,
+speculation.saved (how much sooner a committed reply was ready than a fresh call would have
+been) and speculation.wasted (LLM time spent on cancelled speculations).
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Any, Callable, List, Optional, Tuple
+
+from server.services.admission import CHAT, LISTEN, get_admission
+from server.services.audio_uplink import SAMPLE_RATE, WAV_HEADER_BYTES, wav_header
+from server.services.metrics import get_metrics
+from server.services.resilience import Deadline
+from server.services.upload_buffer import UploadBuffer
+
+ENABLED = os.getenv("SPECULATION", "1").lower() in ("1", "true", "yes")
+MIN_AUDIO = float(os.getenv("SPECULATE_MIN_AUDIO_MS", "1000")) / 1000.0
+PAUSE = float(os.getenv("SPECULATE_PAUSE_MS", "300")) / 1000.0
+SILENCE_RMS = float(os.getenv("SPECULATE_SILENCE_RMS", "500"))
+MATCH = float(os.getenv("SPECULATE_MATCH", "0.8"))  # minimum per-word similarity
+
+CHAT_INTENT = "chat"
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def words(text: str) -> List[str]:
+    """Lowercase words without punctuation, for comparing transcripts."""
+    return _WORD.findall(text.lower())
+
+
+def same_utterance(a: List[str], b: List[str], match: float = MATCH) -> bool:
+    """
+    True if two transcripts say the same thing: the same number of words, each pair equal or
+    spelled nearly alike ("colour"/"color"). A missing or extra word is a different question.
+    """
+    return len(a) == len(b) and all(
+        x == y or SequenceMatcher(None, x, y).ratio() >= match for x, y in zip(a, b)
+    )
+
+
+class UtteranceStream:
+    """
+    One streamed utterance: its audio so far (a WAV in an UploadBuffer, header written on
+    read), interim transcripts and the speculative reply.
+    """
+
+    def __init__(
+        self,
+        brain: Any,
+        transcriber: Any,
+        classify: Callable[[str], str],
+        enabled: bool = ENABLED,
+    ) -> None:
+        self.brain = brain
+        self.transcriber = transcriber
+        self.classify = classify  # transcript -> intent name
+        self.enabled = enabled
+        self.audio = UploadBuffer()
+        self.audio.write(bytes(WAV_HEADER_BYTES))
+        self._ended = False
+        self._voiced = False  # speech since the last interim transcription
+        self._silent = 0.0  # seconds of trailing silence
+        self._interim: Optional[asyncio.Task] = None
+        self._words: List[str] = []  # what the current speculation answers
+        self._state: Tuple = ()
+        self._reply: Optional[asyncio.Task] = None
+        self._reply_started = 0.0
+
+    @property
+    def seconds(self) -> float:
+        return (self.audio.size - WAV_HEADER_BYTES) / 2 / SAMPLE_RATE
+
+    def append(self, pcm: bytes) -> None:
+        """
+        Add a chunk of audio; a pause after speech starts an interim transcription. Raises
+        UploadRejected when the utterance gets too long.
+        """
+        self.audio.write(pcm)
+        if not self.enabled or self._ended or len(pcm) < 2:
+            return
+        import numpy as np  # deferred: keeps server import fast
+
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype="<i2").astype(np.float32)
+        if math.sqrt(float(np.mean(samples * samples))) >= SILENCE_RMS:
+            self._voiced, self._silent = True, 0.0
+            return
+        self._silent += len(samples) / SAMPLE_RATE
+        if not self._voiced or self._silent < PAUSE or self.seconds < MIN_AUDIO:
+            return
+        if self._interim and not self._interim.done():
+            return
+        self._voiced = False
+        self._interim = asyncio.create_task(self._transcribe_interim(self.wav()))
+
+    def wav(self) -> bytes:
+        """The utterance so far as a WAV file (blocking if the buffer spilled to disk)."""
+        return self.audio.read(wav_header(self.audio.size - WAV_HEADER_BYTES))
+
+    async def _transcribe_interim(self, wav: bytes) -> None:
+        admission = get_admission()
+        if not admission.try_acquire(LISTEN):
+            get_metrics().incr("speculation.busy")
+            return
+        try:
+            text = await asyncio.to_thread(self.transcriber.transcribe_audio, wav, Deadline())
+        finally:
+            admission.release(LISTEN)
+        get_metrics().incr("speculation.interims")
+        if text and not self._ended:
+            self._speculate(text)
+
+    def _speculate(self, text: str) -> None:
+        """Start (or keep) a speculative reply for an interim transcript."""
+        heard = words(text)
+        if self._reply is not None and same_utterance(heard, self._words):
+            return
+        self._cancel()
+        if self.classify(text) != CHAT_INTENT:
+            get_metrics().incr("speculation.command")  # commands need no LLM; wait for the final
+            return
+        if not get_admission().try_acquire(CHAT):
+            get_metrics().incr("speculation.busy")
+            return
+        self._words = heard
+        self._state = self._brain_state()
+        self._reply_started = time.perf_counter()
+        self._reply = asyncio.create_task(self._generate(text))
+        get_metrics().incr("speculation.started")
+
+    async def _generate(self, text: str) -> Tuple[str, float]:
+        started = time.perf_counter()
+        try:
+            reply = await asyncio.to_thread(self.brain.process_user_input, text, None, Deadline())
+        finally:
+            get_admission().release(CHAT)
+        return reply, time.perf_counter() - started
+
+    def _brain_state(self) -> Tuple:
+        return (self.brain.current_mode, self.brain.user_age)
+
+    async def commit(self, final_text: str) -> Optional[str]:
+        """
+        The reply for the final transcript if the speculation answered the same words in the
+        same mode, else None (the caller generates one as usual).
+        """
+        self._ended = True
+        if self._reply is None:
+            get_metrics().incr("speculation.none")
+            return None
+        if not same_utterance(words(final_text), self._words) or self._brain_state() != self._state:
+            get_metrics().incr("speculation.miss")
+            self._cancel()
+            return None
+        committed_at = time.perf_counter()
+        task, self._reply = self._reply, None
+        reply, llm_seconds = await task
+        metrics = get_metrics()
+        metrics.incr("speculation.hit")
+        # A fresh call started now would have taken about as long as this one did
+        metrics.histogram("speculation.saved").record(min(llm_seconds, committed_at - self._reply_started))
+        return reply
+
+    def close(self) -> None:
+        """The utterance is over (answered, a command, or the mic left): drop any speculation."""
+        self._ended = True
+        self._cancel()
+        self.audio.close()
+
+    def _cancel(self) -> None:
+        task, self._reply = self._reply, None
+        if task is None:
+            return
+        metrics = get_metrics()
+        metrics.incr("speculation.cancelled")
+
+        def _wasted(done: asyncio.Task) -> None:
+            if not done.cancelled() and done.exception() is None:
+                metrics.histogram("speculation.wasted").record(done.result()[1])
+
+        task.add_done_callback(_wasted)
+
+
+def speculation_stats() -> dict:
+    """Hit rate and latency saved, for the API."""
+    snapshot = get_metrics().snapshot("speculation.")
+    counters = snapshot["counters"]
+    hits, misses = counters.get("speculation.hit", 0), counters.get("speculation.miss", 0)
+    return {
+        "enabled": ENABLED,
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "counters": counters,
+        "saved": snapshot["histograms"].get("speculation.saved"),
+        "wasted": snapshot["histograms"].get("speculation.wasted"),
+    }
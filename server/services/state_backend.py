@@ -0,0 +1,306 @@
+"""
+State Backend Service - shared key/value state and pub/sub messaging between workers.
+Lets several uvicorn workers (or nodes) act as one server: which worker owns the robot
+socket, the current AI mode, and routed robot commands all go through this interface.
+
+Backends (STATE_BACKEND):
+    memory  single process, no I/O (default)
+    sqlite  shared SQLite file in WAL mode (STATE_SQLITE_PATH); any number of local workers
+    redis   Redis or a Redis-compatible server (REDIS_URL); needs the optional `redis` package
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+Handler = Callable[[dict], Awaitable[None]]
+
+DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "shared", "gus_state.db"
+)
+POLL_INTERVAL = float(os.getenv("STATE_POLL_MS", "20")) / 1000.0
+MESSAGE_RETENTION = 60.0  # seconds a published message stays in the SQLite log
+
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class StateBackend:
+    """Interface: async key/value with TTL plus fan-out pub/sub. Messages are dicts."""
+
+    name = "base"
+
+    def __init__(self, worker_id: str) -> None:
+        self.worker_id = worker_id
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._running: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str, only_if: Optional[str] = None) -> None:
+        """Delete key; with only_if, only when its current value matches (ownership release)."""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: dict) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Register a handler; every worker's handlers receive every message on the channel."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def _dispatch(self, channel: str, message: dict) -> None:
+        for handler in self._handlers.get(channel, []):
+            await self._run_handler(channel, handler, message)
+
+    def _spawn_handlers(self, channel: str, message: dict) -> None:
+        """
+        Start each handler for a received message as its own task, in arrival order, so a slow
+        one (a routed say stream) does not hold up the messages behind it.
+        """
+        for handler in self._handlers.get(channel, []):
+            task = asyncio.create_task(self._run_handler(channel, handler, message))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_handler(self, channel: str, handler: Handler, message: dict) -> None:
+        try:
+            await handler(message)
+        except Exception as e:
+            print(f"⚠️ State handler error on {channel}: {e}")
+
+    def _cancel_handlers(self) -> None:
+        for task in list(self._running):
+            task.cancel()
+
+
+class InProcessBackend(StateBackend):
+    """Single-process backend: a dict and direct handler calls."""
+
+    name = "memory"
+
+    def __init__(self, worker_id: str) -> None:
+        super().__init__(worker_id)
+        self._data: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, key: str, only_if: Optional[str] = None) -> None:
+        if only_if is None or await self.get(key) == only_if:
+            self._data.pop(key, None)
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self._dispatch(channel, {**message, "sender": self.worker_id})
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Shared-file backend for several workers on one host.
+    Messages are appended to a log table and picked up by each worker's poller.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, worker_id: str, path: str = DEFAULT_SQLITE_PATH) -> None:
+        super().__init__(worker_id)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._poller: Optional[asyncio.Task] = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            rows = cur.fetchall()
+            self._conn.commit()
+            return rows
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, payload TEXT NOT NULL, "
+            "sender TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()
+        self._last_id = row[0]
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self._open)
+        self._poller = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        self._cancel_handlers()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    async def get(self, key: str) -> Optional[str]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (key, time.time()),
+        )
+        return rows[0][0] if rows else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+
+    async def delete(self, key: str, only_if: Optional[str] = None) -> None:
+        if only_if is None:
+            await asyncio.to_thread(self._execute, "DELETE FROM kv WHERE key = ?", (key,))
+        else:
+            await asyncio.to_thread(self._execute, "DELETE FROM kv WHERE key = ? AND value = ?", (key, only_if))
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO messages (channel, payload, sender, created_at) VALUES (?, ?, ?, ?)",
+            (channel, json.dumps(message), self.worker_id, time.time()),
+        )
+
+    async def _poll_loop(self) -> None:
+        last_cleanup = time.monotonic()
+        while True:
+            rows: List[tuple] = []
+            try:
+                rows = await asyncio.to_thread(
+                    self._execute,
+                    "SELECT id, channel, payload, sender FROM messages WHERE id > ? ORDER BY id LIMIT 500",
+                    (self._last_id,),
+                )
+                for msg_id, channel, payload, sender in rows:
+                    self._last_id = msg_id
+                    if channel in self._handlers:
+                        self._spawn_handlers(channel, {**json.loads(payload), "sender": sender})
+                if time.monotonic() - last_cleanup > MESSAGE_RETENTION / 2:
+                    last_cleanup = time.monotonic()
+                    await asyncio.to_thread(
+                        self._execute, "DELETE FROM messages WHERE created_at < ?", (time.time() - MESSAGE_RETENTION,)
+                    )
+            except sqlite3.Error as e:
+                print(f"⚠️ State backend poll error: {e}")
+            if not rows:
+                await asyncio.sleep(POLL_INTERVAL)
+
+
+class RedisBackend(StateBackend):
+    """Redis (or Redis-compatible, e.g. KeyDB/Valkey) backend using native pub/sub."""
+
+    name = "redis"
+
+    def __init__(self, worker_id: str, url: str) -> None:
+        super().__init__(worker_id)
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis requires 'pip install redis'") from e
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._pubsub = self._redis.pubsub()
+        if self._handlers:
+            await self._pubsub.subscribe(*self._handlers.keys())
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        self._cancel_handlers()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        await self._redis.close()
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        super().subscribe(channel, handler)
+        if self._pubsub is not None:
+            asyncio.create_task(self._pubsub.subscribe(channel))
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str, only_if: Optional[str] = None) -> None:
+        if only_if is None:
+            await self._redis.delete(key)
+        else:
+            # Atomic compare-and-delete
+            await self._redis.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+                1, key, only_if,
+            )
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self._redis.publish(channel, json.dumps({**message, "sender": self.worker_id}))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") == "message":
+                        self._spawn_handlers(item["channel"], json.loads(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Redis listener error: {e}")
+                await asyncio.sleep(1.0)
+
+
+def create_backend(worker_id: Optional[str] = None) -> StateBackend:
+    """Build the backend selected by STATE_BACKEND."""
+    worker_id = worker_id or make_worker_id()
+    kind = os.getenv("STATE_BACKEND", "memory").strip().lower()
+    if kind == "sqlite":
+        return SQLiteBackend(worker_id, os.getenv("STATE_SQLITE_PATH", DEFAULT_SQLITE_PATH))
+    if kind == "redis":
+        return RedisBackend(worker_id, os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if kind not in ("", "memory"):
+        print(f"⚠️ Unknown STATE_BACKEND '{kind}', using in-process state")
+    return InProcessBackend(worker_id)
@@ -0,0 +1,270 @@
+"""
+Telemetry Service - ingestion and downsampling of robot sensor readings.
+Samples land in a per-device in-memory ring buffer and are folded into 1 min / 1 h / 1 day
+rollups. Rollup deltas are written to SQLite in batches by a background flusher, so the
+database sees one upsert per bucket per flush instead of one row per sample.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from server.database import SessionLocal
+from server.models import SystemState, TelemetryRollups
+
+METRICS = ("battery", "temperature", "rssi", "mic_level")
+
+# Rollup name -> bucket width in seconds
+RESOLUTIONS: Dict[str, int] = {"1m": 60, "1h": 3600, "1d": 86400}
+
+RING_SIZE = int(os.getenv("TELEMETRY_RING_SIZE", "3600"))
+FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "10"))
+MAX_POINTS = 1000
+
+BucketKey = Tuple[str, str, int, int]  # (device_id, metric, resolution, bucket_start_epoch)
+
+
+class Rollup:
+    """Aggregate of the samples in one time bucket."""
+
+    __slots__ = ("count", "total", "min", "max", "last")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.last = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.last = value
+
+    def merge(self, other: "Rollup") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.last = other.last
+
+    def to_point(self, bucket_start: int) -> dict:
+        return {
+            "t": datetime.utcfromtimestamp(bucket_start).isoformat() + "Z",
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "last": self.last if self.count else None,
+            "count": self.count,
+        }
+
+
+def choose_resolution(start: datetime, end: datetime) -> int:
+    """Pick the finest rollup that keeps the range under MAX_POINTS buckets."""
+    span = max(1.0, (end - start).total_seconds())
+    for width in sorted(RESOLUTIONS.values()):
+        if span / width <= MAX_POINTS:
+            return width
+    return max(RESOLUTIONS.values())
+
+
+class TelemetryStore:
+    """In-memory ring buffers plus unflushed rollup deltas for every robot."""
+
+    def __init__(self, ring_size: int = RING_SIZE) -> None:
+        self.ring_size = ring_size
+        self.raw: Dict[str, Deque[Tuple[float, Dict[str, float]]]] = {}
+        self.latest: Dict[str, Dict[str, float]] = {}
+        self._pending: Dict[BucketKey, Rollup] = {}
+        self.samples_ingested = 0
+
+    def ingest(self, device_id: str, sample: dict, ts: Optional[float] = None) -> int:
+        """Record one telemetry sample; unknown or non-numeric fields are ignored."""
+        ts = ts if ts is not None else time.time()
+        values: Dict[str, float] = {}
+        for metric in METRICS:
+            value = sample.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[metric] = float(value)
+        if not values:
+            return 0
+
+        ring = self.raw.get(device_id)
+        if ring is None:
+            ring = self.raw[device_id] = deque(maxlen=self.ring_size)
+        ring.append((ts, values))
+        self.latest.setdefault(device_id, {}).update(values)
+
+        second = int(ts)
+        for width in RESOLUTIONS.values():
+            bucket = second - second % width
+            for metric, value in values.items():
+                key = (device_id, metric, width, bucket)
+                rollup = self._pending.get(key)
+                if rollup is None:
+                    rollup = self._pending[key] = Rollup()
+                rollup.add(value)
+        self.samples_ingested += 1
+        return len(values)
+
+    def take_pending(self) -> Dict[BucketKey, Rollup]:
+        """Detach the rollup deltas accumulated since the last flush."""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore_pending(self, pending: Dict[BucketKey, Rollup]) -> None:
+        """Put deltas back after a failed flush so nothing is lost."""
+        for key, rollup in pending.items():
+            current = self._pending.get(key)
+            if current is None:
+                self._pending[key] = rollup
+            else:
+                rollup.merge(current)
+                self._pending[key] = rollup
+
+    def persist(self, pending: Dict[BucketKey, Rollup], latest: Dict[str, Dict[str, float]]) -> None:
+        """Upsert a batch of rollup deltas (blocking; run in a worker thread)."""
+        table = TelemetryRollups.__table__
+        db = SessionLocal()
+        try:
+            if pending:
+                rows = [
+                    {
+                        "device_id": device_id,
+                        "metric": metric,
+                        "resolution": width,
+                        "bucket_start": datetime.utcfromtimestamp(bucket),
+                        "count": r.count,
+                        "sum_value": r.total,
+                        "min_value": r.min,
+                        "max_value": r.max,
+                        "last_value": r.last,
+                    }
+                    for (device_id, metric, width, bucket), r in pending.items()
+                ]
+                stmt = sqlite_insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["device_id", "metric", "resolution", "bucket_start"],
+                    set_={
+                        "count": table.c.count + stmt.excluded.count,
+                        "sum_value": table.c.sum_value + stmt.excluded.sum_value,
+                        "min_value": _sql_min(table.c.min_value, stmt.excluded.min_value),
+                        "max_value": _sql_max(table.c.max_value, stmt.excluded.max_value),
+                        "last_value": stmt.excluded.last_value,
+                    },
+                )
+                db.execute(stmt, rows)
+
+            # Reflect the most recent battery reading in SystemState (once per flush)
+            batteries = [m["battery"] for m in latest.values() if "battery" in m]
+            if batteries:
+                state = db.query(SystemState).first()
+                if not state:
+                    state = SystemState()
+                    db.add(state)
+                state.battery_level = max(0.0, min(100.0, batteries[-1]))
+            db.commit()
+        finally:
+            db.close()
+
+    async def flush(self) -> int:
+        """Write pending rollups to the database; returns the number of buckets written."""
+        pending = self.take_pending()
+        if not pending:
+            return 0
+        latest = {device: dict(values) for device, values in self.latest.items()}
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.persist, pending, latest)
+        except Exception as e:
+            print(f"⚠️ Telemetry flush failed: {e}")
+            self.restore_pending(pending)
+            return 0
+        return len(pending)
+
+    async def run_flusher(self, interval: float = FLUSH_SECONDS) -> None:
+        """Background task: flush rollups every `interval` seconds until cancelled."""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+    def query(
+        self,
+        device_id: str,
+        metric: str,
+        start: datetime,
+        end: datetime,
+        resolution: Optional[int] = None,
+    ) -> Tuple[int, List[dict]]:
+        """
+        Return (resolution, points) for a time range, served from the rollup table
+        merged with deltas that have not been flushed yet. A range of more than MAX_POINTS
+        buckets keeps the newest ones.
+        """
+        width = resolution or choose_resolution(start, end)
+        first = start - timedelta(seconds=width)  # the bucket that contains `start`
+        buckets: Dict[int, Rollup] = {}
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(TelemetryRollups)
+                .filter(
+                    TelemetryRollups.device_id == device_id,
+                    TelemetryRollups.metric == metric,
+                    TelemetryRollups.resolution == width,
+                    TelemetryRollups.bucket_start >= first,
+                    TelemetryRollups.bucket_start <= end,
+                )
+                .order_by(TelemetryRollups.bucket_start.desc())
+                .limit(MAX_POINTS)
+                .all()
+            )
+        finally:
+            db.close()
+        for row in rows:
+            r = Rollup()
+            r.count, r.total = row.count, row.sum_value
+            r.min, r.max, r.last = row.min_value, row.max_value, row.last_value
+            buckets[int((row.bucket_start - datetime(1970, 1, 1)).total_seconds())] = r
+
+        lo = (first - datetime(1970, 1, 1)).total_seconds()
+        hi = (end - datetime(1970, 1, 1)).total_seconds()
+        for (dev, m, w, bucket), delta in list(self._pending.items()):
+            if dev == device_id and m == metric and w == width and lo <= bucket <= hi:
+                current = buckets.get(bucket)
+                if current is None:
+                    current = buckets[bucket] = Rollup()
+                current.merge(delta)
+
+        return width, [buckets[b].to_point(b) for b in sorted(buckets)][-MAX_POINTS:]
+
+
+def _sql_min(a, b):
+    return func.min(func.coalesce(a, b), b)
+
+
+def _sql_max(a, b):
+    return func.max(func.coalesce(a, b), b)
+
+
+_store_instance: Optional[TelemetryStore] = None
+
+
+def get_telemetry_store() -> TelemetryStore:
+    """Return the shared telemetry store."""
+    global _store_instance
+    if _store_instance is None:
+        _store_instance = TelemetryStore()
+    return _store_instance
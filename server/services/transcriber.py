@@ -1,18 +1,32 @@
 """
 Transcriber Service - Speech-to-text using Groq Whisper.
-Sanitizes browser audio (WebM) via FFmpeg to 16 kHz mono WAV before sending to Groq.
+Sanitizes browser audio (WebM) via FFmpeg to 16 kHz mono WAV before sending to Groq;
+uploads that already are 16 kHz mono WAV (virtual_mic, simple_mic) skip FFmpeg.
+Calls go through the resilience layer; if whisper-large-v3 is down, GROQ_STT_FALLBACK_MODEL
+(default whisper-large-v3-turbo) transcribes instead. Identical uploads are single-flighted
+on a hash of the audio, and a finished transcript is reused for STT_DEDUP_LINGER_S (a mic
+that timed out and resent its clip).
 """
 
+import io
 import os
 import tempfile
-from typing import Optional
+import time
+import wave
+from typing import Any, Optional
 from dotenv import load_dotenv
-from groq import Groq
-import ffmpeg
+
+from server.services.container import get_container
+from server.services.metrics import get_metrics
+from server.services.recorder import K_TRANSCRIPT, get_recorder
+from server.services.resilience import Deadline, UpstreamError, get_resilience
+from server.services.single_flight import SingleFlight, content_key
 
 load_dotenv()
 
 MIN_AUDIO_BYTES = 2048
+STT_TIMEOUT = float(os.getenv("UPSTREAM_STT_TIMEOUT_MS", "6000")) / 1000.0
+DEDUP_LINGER = float(os.getenv("STT_DEDUP_LINGER_S", "30"))
 
 _GHOST_PHRASES = frozenset({
     "",
@@ -32,22 +46,87 @@ class Transcriber:
     """Transcribe audio bytes to text using Groq Whisper after FFmpeg sanitization."""
 
     def __init__(self) -> None:
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise ValueError("GROQ_API_KEY environment variable not set")
-        self.client = Groq(api_key=api_key)
         self.model = "whisper-large-v3"
+        self.fallback_model = os.getenv("GROQ_STT_FALLBACK_MODEL", "whisper-large-v3-turbo")
+        self._flight: SingleFlight[Optional[str]] = SingleFlight("transcribe", linger=DEDUP_LINGER)
+
+    @property
+    def client(self) -> Any:
+        """Shared Groq client (raises ValueError if GROQ_API_KEY is not set)."""
+        return get_container().groq_client
 
-    def transcribe_audio(self, audio_data: bytes) -> Optional[str]:
+    def transcribe_audio(self, audio_data: bytes, deadline: Optional[Deadline] = None) -> Optional[str]:
         """
-        Save audio_data to temp_input.webm, convert to 16 kHz mono WAV with FFmpeg,
+        Convert audio_data to 16 kHz mono WAV (FFmpeg, skipped when it already is one),
         send the WAV to Groq, apply ghost filter. Returns None on short audio,
         conversion error, API error, or hallucination.
         """
         if not audio_data or len(audio_data) < MIN_AUDIO_BYTES:
             print("⚠️ Audio too short/empty")
             return None
+        key = content_key(self.model, audio_data)
+        return self._flight.do(key, lambda: self._transcribe(audio_data, deadline))
+
+    def _transcribe(self, audio_data: bytes, deadline: Optional[Deadline]) -> Optional[str]:
+        started = time.perf_counter()
+        metrics = get_metrics()
+        wav = audio_data if _is_clean_wav(audio_data) else self._sanitize(audio_data)
+        if wav is None:
+            metrics.incr("pipeline.transcribe.errors")
+            return None
 
+        raw: Optional[str] = None
+        try:
+            transcription = self._request(wav, deadline or Deadline())
+            raw = (
+                transcription
+                if isinstance(transcription, str)
+                else getattr(transcription, "text", "") or ""
+            )
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.annotate(K_TRANSCRIPT, raw)
+        except Exception as e:
+            print("⚠️ Groq API Error", e)
+            metrics.incr("upstream.groq.transcribe.errors")
+            return None
+        finally:
+            metrics.histogram("pipeline.transcribe").record(time.perf_counter() - started)
+
+        text = (raw or "").strip()
+        if not text:
+            return None
+        if text.lower() in _GHOST_PHRASES:
+            return None
+        return text
+
+    def _request(self, wav: bytes, deadline: Deadline) -> Any:
+        """Whisper call with retries/hedging; switches to the fallback model if the primary is down."""
+        def create(model: str):
+            return lambda timeout: self.client.audio.transcriptions.create(
+                file=("audio.wav", wav),
+                model=model,
+                response_format="text",
+                language="en",
+                temperature=0.0,
+                prompt=_CONTEXT_PROMPT,
+                timeout=timeout,
+            )
+
+        resilience = get_resilience()
+        try:
+            return resilience.call("groq.transcribe", create(self.model), deadline, timeout=STT_TIMEOUT)
+        except UpstreamError as e:
+            if not self.fallback_model or self.fallback_model == self.model:
+                raise
+            print(f"⚠️ {self.model} unavailable ({e}); trying {self.fallback_model}")
+            get_metrics().incr("pipeline.transcribe.fallback")
+            return resilience.call(
+                "groq.transcribe.fallback", create(self.fallback_model), deadline, timeout=STT_TIMEOUT
+            )
+
+    def _sanitize(self, audio_data: bytes) -> Optional[bytes]:
+        """Save audio_data to temp_input.webm and convert it to 16 kHz mono WAV with FFmpeg."""
         tmpdir = tempfile.mktemp(prefix="transcriber_")
         os.mkdir(tmpdir)
         temp_input = os.path.join(tmpdir, "temp_input.webm")
@@ -58,6 +137,7 @@ class Transcriber:
                 f.write(audio_data)
 
             try:
+                import ffmpeg  # deferred: only needed once audio actually arrives
                 (
                     ffmpeg
                     .input(temp_input)
@@ -73,32 +153,8 @@ class Transcriber:
                 print("⚠️ FFmpeg did not produce a valid WAV")
                 return None
 
-            raw: Optional[str] = None
-            try:
-                with open(temp_clean, "rb") as f:
-                    transcription = self.client.audio.transcriptions.create(
-                        file=f,
-                        model=self.model,
-                        response_format="text",
-                        language="en",
-                        temperature=0.0,
-                        prompt=_CONTEXT_PROMPT,
-                    )
-                raw = (
-                    transcription
-                    if isinstance(transcription, str)
-                    else getattr(transcription, "text", "") or ""
-                )
-            except Exception as e:
-                print("⚠️ Groq API Error", e)
-                return None
-
-            text = (raw or "").strip()
-            if not text:
-                return None
-            if text.lower() in _GHOST_PHRASES:
-                return None
-            return text
+            with open(temp_clean, "rb") as f:
+                return f.read()
         finally:
             for path in (temp_input, temp_clean):
                 try:
@@ -111,3 +167,25 @@ class Transcriber:
                     os.rmdir(tmpdir)
             except OSError:
                 pass
+
+
+def _is_clean_wav(audio_data: bytes) -> bool:
+    """True if audio_data is already 16 kHz mono 16-bit PCM WAV (what the Python mics send)."""
+    if audio_data[:4] != b"RIFF" or audio_data[8:12] != b"WAVE":
+        return False
+    try:
+        with wave.open(io.BytesIO(audio_data)) as w:
+            return w.getnchannels() == 1 and w.getframerate() == 16000 and w.getsampwidth() == 2
+    except (wave.Error, EOFError):
+        return False
+
+
+def wav_duration(audio_data: bytes) -> Optional[float]:
+    """Length in seconds of a WAV upload; None for other containers (browser WebM)."""
+    if audio_data[:4] != b"RIFF" or audio_data[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(io.BytesIO(audio_data)) as w:
+            return round(w.getnframes() / float(w.getframerate()), 3)
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return None
@@ -0,0 +1,272 @@
+"""
+TTS Engine Service - server-side text-to-speech for the robot.
+Synthesizes replies sentence by sentence with a pluggable local backend, compresses them to
+IMA-ADPCM frames and streams them to the ESP32, so speech starts after the first sentence.
+
+Configuration (environment):
+    TTS_BACKEND       none (default: robot speaks SAY text itself), espeak, piper
+    TTS_VOICE         espeak voice name (default "en")
+    PIPER_MODEL       path to a piper .onnx voice (required for piper)
+    TTS_CACHE_DIR     cache directory (default shared/tts_cache)
+    TTS_CACHE_MAX_MB  cache size budget in MB (default 64)
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import wave
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, Tuple, Union
+
+from server.services import adpcm
+from server.services.audio_cache import AudioCache, DEFAULT_CACHE_DIR, cache_key
+
+OUTPUT_SAMPLE_RATE = 16000
+CODEC_NAME = "ima_adpcm"
+MAX_SENTENCE_CHARS = 240
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+
+_engine_instance: Optional["TTSEngine"] = None
+_engine_loaded = False
+
+
+class TTSBackend:
+    """Base class for local speech synthesizers. Returns 16-bit mono PCM."""
+
+    name = "base"
+
+    @property
+    def voice_id(self) -> str:
+        """Identifies the voice for cache addressing; change it whenever output would change."""
+        return self.name
+
+    def synthesize(self, text: str) -> Tuple[bytes, int]:
+        """Return (pcm_bytes, sample_rate) for text."""
+        raise NotImplementedError
+
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng via its CLI. Tiny and fast on any CPU; robotic voice."""
+
+    name = "espeak"
+
+    def __init__(self, voice: str = "en", speed: int = 165) -> None:
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise RuntimeError("espeak-ng not found on PATH")
+        self.voice = voice
+        self.speed = speed
+
+    @property
+    def voice_id(self) -> str:
+        return f"espeak:{self.voice}:{self.speed}"
+
+    def synthesize(self, text: str) -> Tuple[bytes, int]:
+        result = subprocess.run(
+            [self.binary, "--stdout", "-v", self.voice, "-s", str(self.speed), text],
+            capture_output=True,
+            check=True,
+            timeout=30,
+        )
+        with wave.open(io.BytesIO(result.stdout), "rb") as wav:
+            return wav.readframes(wav.getnframes()), wav.getframerate()
+
+
+class PiperBackend(TTSBackend):
+    """Piper neural TTS via its CLI (onnxruntime on CPU). Natural voice, ~realtime/10 on x86."""
+
+    name = "piper"
+
+    def __init__(self, model_path: str) -> None:
+        self.binary = shutil.which("piper")
+        if not self.binary:
+            raise RuntimeError("piper not found on PATH")
+        if not model_path or not os.path.exists(model_path):
+            raise RuntimeError(f"Piper model not found: {model_path!r}")
+        self.model_path = model_path
+        self.sample_rate = 22050
+        config_path = f"{model_path}.json"
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                self.sample_rate = int(json.load(f).get("audio", {}).get("sample_rate", 22050))
+
+    @property
+    def voice_id(self) -> str:
+        return f"piper:{os.path.basename(self.model_path)}"
+
+    def synthesize(self, text: str) -> Tuple[bytes, int]:
+        result = subprocess.run(
+            [self.binary, "--model", self.model_path, "--output-raw"],
+            input=text.encode("utf-8"),
+            capture_output=True,
+            check=True,
+            timeout=60,
+        )
+        return result.stdout, self.sample_rate
+
+
+def resample_pcm(pcm: bytes, src_rate: int, dst_rate: int = OUTPUT_SAMPLE_RATE) -> bytes:
+    """Linear-interpolation resample of 16-bit mono PCM (speech only, no anti-aliasing needed)."""
+    if src_rate == dst_rate or not pcm:
+        return pcm
+    import numpy as np  # deferred: keeps server import fast when TTS is off
+    samples = np.frombuffer(pcm[: len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.float32)
+    n_out = int(len(samples) * dst_rate / src_rate)
+    positions = np.linspace(0, len(samples) - 1, n_out, dtype=np.float64)
+    out = np.interp(positions, np.arange(len(samples)), samples)
+    return np.clip(out, -32768, 32767).astype("<i2").tobytes()
+
+
+class SentenceSplitter:
+    """Incrementally cut streamed text into sentences as soon as each one is complete."""
+
+    def __init__(self, max_chars: int = MAX_SENTENCE_CHARS) -> None:
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add text; return any sentences that are now complete."""
+        self._buffer += chunk
+        sentences: List[str] = []
+        while True:
+            match = _SENTENCE_END.search(self._buffer)
+            if match is None:
+                break
+            sentence = self._buffer[: match.start()].strip()
+            self._buffer = self._buffer[match.end():]
+            if sentence:
+                sentences.append(sentence)
+        # Very long run-ons: cut at the last comma/space so synthesis can start.
+        while len(self._buffer) > self.max_chars:
+            cut = max(self._buffer.rfind(",", 0, self.max_chars), self._buffer.rfind(" ", 0, self.max_chars))
+            cut = cut + 1 if cut > 0 else self.max_chars
+            sentences.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever is left once the text stream has ended."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a complete text into sentences."""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+async def _as_chunks(text: Union[str, Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if isinstance(text, str):
+        yield text
+    elif hasattr(text, "__aiter__"):
+        async for chunk in text:
+            yield chunk
+    else:
+        for chunk in text:
+            yield chunk
+
+
+class TTSEngine:
+    """
+    Renders text to compressed audio frames with a backend and a content-addressed cache.
+    Only phrases marked cacheable (canned replies) are stored; free-form chat is not.
+    """
+
+    def __init__(self, backend: TTSBackend, cache: Optional[AudioCache] = None) -> None:
+        self.backend = backend
+        self.cache = cache
+        self.codec = CODEC_NAME
+        self.sample_rate = OUTPUT_SAMPLE_RATE
+
+    def render(self, text: str, cacheable: bool = False) -> List[bytes]:
+        """Synchronously synthesize one sentence to ADPCM frames (runs in a worker thread)."""
+        key = cache_key(self.backend.voice_id, self.codec, text) if cacheable and self.cache is not None else None
+        if key:
+            frames = self.cache.get(key)
+            if frames is not None:
+                return frames
+        pcm, rate = self.backend.synthesize(text)
+        frames = adpcm.encode_frames(resample_pcm(pcm, rate, self.sample_rate))
+        if key and frames:
+            self.cache.put(key, frames)
+        return frames
+
+    async def stream(
+        self,
+        text: Union[str, Iterable[str], AsyncIterable[str]],
+        cacheable: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield audio frames sentence by sentence.
+        The next sentence is synthesized while the frames of the current one are being sent.
+        `text` may arrive in chunks (e.g. LLM tokens); the chat path currently passes the
+        finished reply, so the overlap is between sentences of one reply.
+        """
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Optional[asyncio.Future]]" = asyncio.Queue(maxsize=2)
+
+        async def produce() -> None:
+            splitter = SentenceSplitter()
+            try:
+                async for chunk in _as_chunks(text):
+                    for sentence in splitter.feed(chunk):
+                        await queue.put(loop.run_in_executor(None, self.render, sentence, cacheable))
+                for sentence in splitter.flush():
+                    await queue.put(loop.run_in_executor(None, self.render, sentence, cacheable))
+            except asyncio.CancelledError:
+                raise  # the consumer is gone: nobody is left to take the end marker off a full queue
+            except Exception as e:
+                print(f"⚠️ TTS text stream error: {e}")
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                pending = await queue.get()
+                if pending is None:
+                    break
+                try:
+                    frames = await pending
+                except Exception as e:
+                    print(f"⚠️ TTS synthesis error: {e}")
+                    continue
+                for frame in frames:
+                    yield frame
+        finally:
+            producer.cancel()
+
+
+def _build_engine() -> Optional[TTSEngine]:
+    backend_name = os.getenv("TTS_BACKEND", "none").strip().lower()
+    if backend_name in ("", "none", "off"):
+        return None
+    try:
+        if backend_name == "espeak":
+            backend: TTSBackend = EspeakBackend(voice=os.getenv("TTS_VOICE", "en"))
+        elif backend_name == "piper":
+            backend = PiperBackend(os.getenv("PIPER_MODEL", ""))
+        else:
+            print(f"⚠️ Unknown TTS_BACKEND '{backend_name}', falling back to robot-side speech")
+            return None
+    except Exception as e:
+        print(f"⚠️ TTS backend '{backend_name}' unavailable: {e}")
+        return None
+
+    cache_mb = float(os.getenv("TTS_CACHE_MAX_MB", "64"))
+    cache = AudioCache(os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR), int(cache_mb * 1024 * 1024))
+    print(f"🔊 TTS enabled: {backend.voice_id} ({len(cache)} cached phrases)")
+    return TTSEngine(backend, cache)
+
+
+def get_tts_engine() -> Optional[TTSEngine]:
+    """Return the shared TTS engine, or None when speech is left to the robot (SAY text)."""
+    global _engine_instance, _engine_loaded
+    if not _engine_loaded:
+        _engine_instance = _build_engine()
+        _engine_loaded = True
+    return _engine_instance
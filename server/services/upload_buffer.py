@@ -0,0 +1,236 @@
+"""
+Upload Buffers - bounded memory for the audio mics send on /ws/audio.
+
+Every utterance (one whole binary message, or the chunks of one streamed between
+utterance_start/utterance_end) is held in an UploadBuffer until the voice pipeline gets to it:
+
+  - In memory it is a list of fixed-size blocks (UPLOAD_BLOCK_KB) from one process-wide
+    BufferPool. Blocks go back to the pool when the turn is done and are reused by the next
+    uploads, so buffers never grow by reallocate-and-copy. All uploads together hold at most
+    UPLOAD_MEMORY_MB of blocks.
+  - A buffer past UPLOAD_CONN_MEMORY_KB, or one that finds the pool used up, spills to an
+    anonymous temp file (in UPLOAD_SPILL_DIR, default the system temp dir) and gives its
+    blocks back. Spilled uploads together may take UPLOAD_DISK_MB; past that, new audio is
+    refused as busy.
+  - An utterance over UPLOAD_MAX_KB is refused: up front if utterance_start declares its size
+    ({"type": "utterance_start", "bytes": N}, N = PCM bytes), else as soon as its chunks add
+    up to more. A whole message is checked before it is copied; WS_MAX_SIZE, given to uvicorn
+    as its WebSocket message limit, keeps much bigger ones from being read at all.
+
+The pipeline reads a buffer back into one bytes object only once the turn holds a LISTEN
+admission slot, so turns queued behind a busy Whisper wait in the pool or on disk, not as
+full copies in memory.
+
+Counters: upload.{spilled,too_large,busy}; pool usage in upload_stats().
+"""
+
+import os
+import tempfile
+import threading
+from typing import IO, Iterator, List, Optional
+
+from server.services.metrics import get_metrics
+
+MAX_BYTES = int(os.getenv("UPLOAD_MAX_KB", "2048")) * 1024  # ~64 s of 16 kHz PCM
+CONN_MEMORY = int(os.getenv("UPLOAD_CONN_MEMORY_KB", "256")) * 1024
+MEMORY_BUDGET = int(os.getenv("UPLOAD_MEMORY_MB", "32")) * 1024 * 1024
+DISK_BUDGET = int(os.getenv("UPLOAD_DISK_MB", "512")) * 1024 * 1024
+BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_KB", "64")) * 1024
+SPILL_DIR = os.getenv("UPLOAD_SPILL_DIR", "") or None
+WS_MAX_SIZE = MAX_BYTES + 64 * 1024  # a whole-message upload at the limit, plus slack
+
+MIB = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """An utterance was refused: reason "too_large" (over UPLOAD_MAX_KB) or "busy" (no room)."""
+
+    def __init__(self, reason: str, detail: str = "") -> None:
+        super().__init__(detail or reason)
+        self.reason = reason
+
+
+class BufferPool:
+    """Fixed-size blocks shared by every upload; at most `budget` bytes of them exist."""
+
+    def __init__(self, block_size: int = BLOCK_SIZE, budget: int = MEMORY_BUDGET,
+                 disk_budget: int = DISK_BUDGET) -> None:
+        self.block_size = block_size
+        self.capacity = max(1, budget // block_size)
+        self.disk_budget = disk_budget
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.allocated = 0
+        self.disk_bytes = 0
+        self.peak_disk_bytes = 0
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()  # buffers are read back in worker threads
+
+    def take(self) -> Optional[bytearray]:
+        """A block (a reused one if any is free); None when the memory budget is used up."""
+        with self._lock:
+            if self.in_use >= self.capacity:
+                return None
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return bytearray(self.block_size)
+
+    def give(self, blocks: List[bytearray]) -> None:
+        with self._lock:
+            self.in_use -= len(blocks)
+            self._free.extend(blocks)
+
+    def reserve_disk(self, size: int) -> bool:
+        with self._lock:
+            if self.disk_bytes + size > self.disk_budget:
+                return False
+            self.disk_bytes += size
+            self.peak_disk_bytes = max(self.peak_disk_bytes, self.disk_bytes)
+            return True
+
+    def release_disk(self, size: int) -> None:
+        with self._lock:
+            self.disk_bytes -= size
+
+    def status(self) -> dict:
+        block = self.block_size
+        return {
+            "block_kb": block // 1024,
+            "memory_mb": round(self.in_use * block / MIB, 2),
+            "memory_peak_mb": round(self.peak_in_use * block / MIB, 2),
+            "memory_budget_mb": round(self.capacity * block / MIB, 2),
+            "pooled_mb": round(self.allocated * block / MIB, 2),  # allocated blocks, in use or free
+            "disk_mb": round(self.disk_bytes / MIB, 2),
+            "disk_peak_mb": round(self.peak_disk_bytes / MIB, 2),
+            "disk_budget_mb": round(self.disk_budget / MIB, 2),
+        }
+
+
+class UploadBuffer:
+    """One utterance's bytes: pooled blocks in memory, or an anonymous temp file once spilled."""
+
+    def __init__(self, limit: int = MAX_BYTES, memory_limit: int = CONN_MEMORY,
+                 pool: Optional[BufferPool] = None) -> None:
+        self.pool = pool or get_buffer_pool()
+        self.limit = limit
+        self.memory_limit = memory_limit
+        self.size = 0
+        self._blocks: List[bytearray] = []
+        self._file: Optional[IO[bytes]] = None
+        self._disk = 0  # bytes reserved in the pool's disk budget
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes) -> None:
+        """Append data; raises UploadRejected, after which the buffer is empty and closed."""
+        total = self.size + len(data)
+        if total > self.limit:
+            self._reject("too_large", f"upload over {self.limit} bytes")
+        if self._file is None and (total > self.memory_limit or not self._grow(total)):
+            self._spill()
+        if self._file is not None:
+            if not self.pool.reserve_disk(len(data)):
+                self._reject("busy", "upload spill space is full")
+            self._disk += len(data)
+            self._file.write(data)
+        else:
+            self._copy_in(data)
+        self.size = total
+
+    def _grow(self, total: int) -> bool:
+        """Take blocks until `total` bytes fit; False if the pool ran out first."""
+        while len(self._blocks) * self.pool.block_size < total:
+            block = self.pool.take()
+            if block is None:
+                return False
+            self._blocks.append(block)
+        return True
+
+    def _copy_in(self, data: bytes) -> None:
+        block_size = self.pool.block_size
+        view = memoryview(data)
+        pos = self.size
+        while view:
+            block, offset = self._blocks[pos // block_size], pos % block_size
+            n = min(block_size - offset, len(view))
+            block[offset:offset + n] = view[:n]
+            view = view[n:]
+            pos += n
+
+    def _spill(self) -> None:
+        if not self.pool.reserve_disk(self.size):
+            self._reject("busy", "upload spill space is full")
+        self._disk = self.size
+        self._file = tempfile.TemporaryFile(dir=SPILL_DIR)
+        for view in self._views():
+            self._file.write(view)
+        self.pool.give(self._blocks)
+        self._blocks = []
+        get_metrics().incr("upload.spilled")
+
+    def _views(self) -> Iterator[memoryview]:
+        block_size = self.pool.block_size
+        for i, block in enumerate(self._blocks):
+            end = min(block_size, self.size - i * block_size)
+            if end <= 0:
+                break
+            yield memoryview(block)[:end]
+
+    def _reject(self, reason: str, detail: str) -> None:
+        self.close()
+        get_metrics().incr(f"upload.{reason}")
+        raise UploadRejected(reason, detail)
+
+    def read(self, head: bytes = b"") -> bytes:
+        """
+        The whole upload as one bytes object, with its first len(head) bytes replaced by
+        `head` (e.g. a WAV header written once the length is known). Blocking when spilled.
+        """
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.write(head)
+            self._file.seek(0)
+            return self._file.read()
+        views = list(self._views())
+        if head:
+            views[0][:len(head)] = head
+        return b"".join(views)
+
+    def close(self) -> None:
+        """Give the blocks back and drop the spill file (idempotent)."""
+        if self._blocks:
+            self.pool.give(self._blocks)
+            self._blocks = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._disk:
+            self.pool.release_disk(self._disk)
+            self._disk = 0
+        self.size = 0
+
+
+_pool: Optional[BufferPool] = None
+
+
+def get_buffer_pool() -> BufferPool:
+    """Return the process-wide upload block pool."""
+    global _pool
+    if _pool is None:
+        _pool = BufferPool()
+    return _pool
+
+
+def upload_stats() -> dict:
+    """Limits, pool and spill usage and rejection counts, for the API."""
+    return {
+        "max_kb": MAX_BYTES // 1024,
+        "conn_memory_kb": CONN_MEMORY // 1024,
+        **get_buffer_pool().status(),
+        "counters": get_metrics().snapshot("upload.")["counters"],
+    }
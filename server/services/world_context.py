@@ -1,21 +1,25 @@
 """
 World Context Service - Real-world awareness (time, weather) for the AI.
 Singleton that provides location, time, and weather strings for system prompts.
+Weather is fetched through the service container's shared HTTP client under its own small
+slice of the turn's deadline (see resilience): a missing forecast must not delay a reply.
 """
 
 import os
 from datetime import datetime
 from typing import Optional
 
-# DEBUG CHECK: See if requests is actually installed
-try:
-    import requests
-    print("✅ Requests library loaded successfully.")
-except ImportError:
-    requests = None
-    print("❌ ERROR: Requests library NOT found. Run 'pip install requests'.")
+from server.services.container import get_container
+from server.services.metrics import get_metrics
+from server.services.resilience import Deadline, get_resilience
+from server.services.single_flight import SingleFlight
+
+# Overridable so load tests can point at a local fake (benchmarks/fake_upstreams.py)
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "http://api.openweathermap.org/data/2.5/weather")
+WEATHER_BUDGET = float(os.getenv("UPSTREAM_WEATHER_BUDGET_MS", "1000")) / 1000.0
 
 _instance: Optional["WorldContext"] = None
+_weather_flight: SingleFlight = SingleFlight("weather")  # concurrent turns share one lookup
 
 class WorldContext:
     """Singleton providing current time and weather for Pune, India."""
@@ -31,7 +35,7 @@ class WorldContext:
         now = datetime.now()
         return now.strftime("%A, %I:%M %p")
 
-    def get_weather_string(self) -> str:
+    def get_weather_string(self, deadline: Optional[Deadline] = None) -> str:
         """
         Return weather for Pune as e.g. '28°C, Clear Sky'.
         If OPENWEATHER_API_KEY is missing or request fails, return a safe message.
@@ -43,19 +47,24 @@ class WorldContext:
             print("⚠️ DEBUG: API Key is MISSING in .env file.")
             return "Weather data unavailable (Missing Key)"
 
-        if requests is None:
-            print("⚠️ DEBUG: Requests library is missing.")
-            return "Weather data unavailable (Missing Library)"
-
         try:
             print(f"🌍 DEBUG: Requesting weather for Pune with Key: {api_key[:5]}...") # Print first 5 chars only
 
-            url = "http://api.openweathermap.org/data/2.5/weather"
             params = {"q": "Pune", "appid": api_key, "units": "metric"}
 
-            r = requests.get(url, params=params, timeout=5)
+            def fetch(timeout: float):
+                r = get_container().http_client.get(OPENWEATHER_URL, params=params, timeout=timeout)
+                if r.status_code >= 500:
+                    r.raise_for_status()  # retryable
+                return r
+
+            budget = (deadline or Deadline()).within(WEATHER_BUDGET)  # retries and hedges included
+            r = _weather_flight.do(
+                "Pune", lambda: get_resilience().call("weather", fetch, budget, timeout=WEATHER_BUDGET)
+            )
 
             if r.status_code != 200:
+                get_metrics().incr("upstream.weather.errors")
                 print(f"❌ DEBUG: API Error {r.status_code}: {r.text}")
                 return "Weather data unavailable (API Error)"
 
@@ -69,12 +78,13 @@ class WorldContext:
 
         except Exception as e:
             print(f"❌ DEBUG: Crash inside get_weather_string: {e}")
+            get_metrics().incr("upstream.weather.errors")
             return "Weather data unavailable (Crash)"
 
-    def get_full_context(self) -> str:
+    def get_full_context(self, deadline: Optional[Deadline] = None) -> str:
         """Combine location, time, and weather into one context string."""
         time_str = self.get_time_string()
-        weather_str = self.get_weather_string()
+        weather_str = self.get_weather_string(deadline)
         return f"Location: Pune, India. Time: {time_str}. Weather: {weather_str}."
 
 def get_world_context() -> WorldContext:
@@ -5,16 +5,26 @@ import sounddevice as sd
 import numpy as np
 import scipy.io.wavfile as wav
 import io
+import os
+
+from server.services.audio_uplink import ADPCM_PROTOCOL, OPUS_PROTOCOL, get_uplink
 
 # Settings
 SAMPLE_RATE = 16000
 DURATION = 5  # Record for 5 seconds
 SERVER_URL = "ws://127.0.0.1:8000/ws/audio"
+# Uplink codec: adpcm (default, 4x smaller), opus (needs opuslib + libopus) or wav
+MIC_CODEC = os.getenv("MIC_CODEC", "adpcm").lower()
+UPLINK_PROTOCOLS = [
+    p for p in {"opus": [OPUS_PROTOCOL, ADPCM_PROTOCOL], "adpcm": [ADPCM_PROTOCOL]}.get(MIC_CODEC, [])
+    if get_uplink(p) is not None
+]
 
 async def send_audio():
     print(f"🔌 Connecting to {SERVER_URL}...")
-    async with websockets.connect(SERVER_URL) as websocket:
-        print("✅ Connected! usage: Press Enter to record.")
+    async with websockets.connect(SERVER_URL, subprotocols=UPLINK_PROTOCOLS or None) as websocket:
+        uplink = get_uplink(websocket.subprotocol)
+        print(f"✅ Connected ({uplink.name if uplink else 'wav'} uplink)! usage: Press Enter to record.")
         
         while True:
             input("\n🎤 Press Enter to start recording (5s)...")
@@ -25,10 +35,13 @@ async def send_audio():
             sd.wait()
             print("✅ Recording finished. Sending...")
 
-            # Convert to WAV bytes
-            bytes_io = io.BytesIO()
-            wav.write(bytes_io, SAMPLE_RATE, audio_data)
-            audio_bytes = bytes_io.getvalue()
+            # Compress with the negotiated codec, or send a WAV file
+            if uplink:
+                audio_bytes = uplink.encode(audio_data.tobytes())
+            else:
+                bytes_io = io.BytesIO()
+                wav.write(bytes_io, SAMPLE_RATE, audio_data)
+                audio_bytes = bytes_io.getvalue()
 
             # Send to server
             await websocket.send(audio_bytes)
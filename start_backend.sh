@@ -31,6 +31,9 @@ fi
 # Create shared directory if it doesn't exist
 mkdir -p shared
 
+# WebSocket message limit: just above UPLOAD_MAX_KB, so oversized uploads are not even read
+WS_MAX_SIZE=$(python -c "from dotenv import load_dotenv; load_dotenv(); from server.services.upload_buffer import WS_MAX_SIZE; print(WS_MAX_SIZE)")
+
 # Run the server from project root
 echo "🚀 Starting Gus System - THE BRAIN..."
-uvicorn server.main:app --reload --host 0.0.0.0 --port 8000
+uvicorn server.main:app --reload --host 0.0.0.0 --port 8000 --ws-max-size "$WS_MAX_SIZE"
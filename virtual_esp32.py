@@ -3,11 +3,34 @@
 Virtual ESP32 - Simulator for the Gus robot hardware.
 Connects to the server at ws://127.0.0.1:8000/ws/robot and prints
 incoming commands as graphical logs. Run the server first, then this script.
+When the server has TTS enabled, binary IMA-ADPCM speech frames are counted and summarized.
+
+Sequenced commands are acknowledged; retransmitted duplicates are re-acked but not executed.
+Use --ack-delay-ms and --loss to inject latency and frame loss for testing.
+
+A dropped link is retried almost at once (then with jittered exponential backoff) and resumes
+the server session with ?session=<token>; commands missed meanwhile are replayed by the server
+and deduplicated against those already executed. Use --drop-every to cut the link periodically.
+
+Usage: python virtual_esp32.py [--protocol bin|json] [--device-id gus] [--telemetry-hz 0.2]
+                               [--ack-delay-ms 0] [--loss 0.0] [--drop-every 0]
 """
 
+import argparse
 import asyncio
-import json
+import math
+import random
 import sys
+import time
+from collections import OrderedDict
+
+from server.services.robot_protocol import (
+    BINARY_PROTOCOL,
+    JSON_PROTOCOL,
+    SESSION_ACTION,
+    ProtocolError,
+    get_codec,
+)
 
 try:
     import websockets
@@ -16,8 +39,9 @@ except ImportError:
     sys.exit(1)
 
 WS_URL = "ws://127.0.0.1:8000/ws/robot"
-RECONNECT_DELAY = 3
+RECONNECT_DELAY = 0.2  # first retry; a Wi-Fi blip should not cost a resumable session
 MAX_RECONNECT_DELAY = 30
+DEDUP_WINDOW = 256  # recently executed seqs remembered for duplicate suppression
 
 
 def format_command(action: str, value: str) -> str:
@@ -32,34 +56,149 @@ def format_command(action: str, value: str) -> str:
         return f"BUZZER {value_upper}"
     if action_upper == "VOLUME":
         return f"Setting VOLUME to {value_upper}"
+    if action_upper == "SAY":
+        return f"Saying: {value}"
+    if action_upper == "AUDIO_START":
+        return f"Speaker ON ({value})"
+    if action_upper == "AUDIO_END":
+        return f"Speaker OFF after {value} frames"
     return f"{action_upper} {value_upper}"
 
 
-async def run_robot() -> None:
+def synthetic_telemetry(started: float) -> dict:
+    """Plausible sensor readings: slow battery drain, warm CPU, noisy Wi-Fi and mic."""
+    elapsed = time.time() - started
+    return {
+        "battery": max(0.0, 100.0 - elapsed / 36.0),  # ~1% per 36 s
+        "temperature": 40.0 + 2.0 * math.sin(elapsed / 60.0) + random.uniform(-0.3, 0.3),
+        "rssi": -55 + random.randint(-8, 8),
+        "mic_level": abs(random.gauss(0.02, 0.03)),
+    }
+
+
+async def send_telemetry(ws, codec, hz: float) -> None:
+    """Emit synthetic telemetry at `hz` samples per second until cancelled."""
+    started = time.time()
+    interval = 1.0 / hz
+    next_at = time.monotonic()
+    while True:
+        await ws.send(codec.encode_telemetry(synthetic_telemetry(started)))
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+
+async def send_ack(ws, codec, seq: int, delay: float) -> None:
+    """Acknowledge a command after an optional injected delay."""
+    if delay > 0:
+        await asyncio.sleep(delay)
+    try:
+        await ws.send(codec.encode_ack(seq))
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
+async def drop_link(ws, seconds: float) -> None:
+    """Simulate a Wi-Fi drop: abort the TCP connection without a closing handshake."""
+    await asyncio.sleep(seconds)
+    print("🤖 VIRTUAL ROBOT: (dropping the link)")
+    ws.transport.abort()
+
+
+async def run_robot(
+    protocol: str = BINARY_PROTOCOL,
+    device_id: str = "gus",
+    telemetry_hz: float = 0.2,
+    ack_delay: float = 0.0,
+    loss: float = 0.0,
+    drop_every: float = 0.0,
+) -> None:
     delay = RECONNECT_DELAY
+    session = None  # token of the server session to resume
+    executed: "OrderedDict[int, None]" = OrderedDict()  # kept while the session is resumed
     while True:
+        telemetry_task = None
+        dropper = None
+        url = f"{WS_URL}?device_id={device_id}" + (f"&session={session}" if session else "")
         try:
-            async with websockets.connect(WS_URL, ping_interval=20, ping_timeout=10) as ws:
+            async with websockets.connect(
+                url, subprotocols=[protocol], ping_interval=20, ping_timeout=10
+            ) as ws:
                 delay = RECONNECT_DELAY
-                print("🤖 VIRTUAL ROBOT: Connected to server. Waiting for commands...\n")
+                codec = get_codec(ws.subprotocol)
+                print(f"🤖 VIRTUAL ROBOT: Connected to server ({codec.name}). Waiting for commands...\n")
+                if telemetry_hz > 0:
+                    telemetry_task = asyncio.create_task(send_telemetry(ws, codec, telemetry_hz))
+                if drop_every > 0:
+                    dropper = asyncio.create_task(drop_link(ws, drop_every))
+                speech_samples = 0
                 while True:
                     raw = await ws.recv()
                     try:
-                        data = json.loads(raw)
-                        action = data.get("action", "?")
-                        value = data.get("value", "?")
-                        line = format_command(action, value)
-                        print(f"🤖 VIRTUAL ROBOT: {line}")
-                    except json.JSONDecodeError:
-                        print(f"🤖 VIRTUAL ROBOT: (raw) {raw}")
+                        data = codec.decode(raw)
+                    except ProtocolError:
+                        print(f"🤖 VIRTUAL ROBOT: (raw) {raw!r}")
+                        continue
+                    action = data.get("action", "?")
+                    value = data.get("value", "?")
+                    seq = data.get("seq")
+                    if action == SESSION_ACTION:
+                        session, _, state = value.partition("/")
+                        if state != "resumed":
+                            executed.clear()  # a fresh session: old seqs mean nothing
+                        print(f"🤖 VIRTUAL ROBOT: Session {state}")
+                        continue
+                    if seq:
+                        if loss and random.random() < loss:
+                            print(f"🤖 VIRTUAL ROBOT: (frame #{seq} lost)")
+                            continue
+                        asyncio.create_task(send_ack(ws, codec, seq, ack_delay))
+                        if seq in executed:
+                            print(f"🤖 VIRTUAL ROBOT: (duplicate #{seq} re-acked, not executed)")
+                            continue
+                        executed[seq] = None
+                        if len(executed) > DEDUP_WINDOW:
+                            executed.popitem(last=False)
+                    if action == "AUDIO_FRAME":
+                        # TTS audio frame: 4-byte decoder state + 4-bit ADPCM codes
+                        speech_samples += max(0, len(value) - 4) * 2
+                        continue
+                    line = format_command(action, value)
+                    if action == "AUDIO_END":
+                        line += f" ({speech_samples / 16000:.1f}s of speech)"
+                        speech_samples = 0
+                    print(f"🤖 VIRTUAL ROBOT: {line}")
         except (websockets.exceptions.ConnectionClosed, OSError, ConnectionRefusedError) as e:
-            print(f"⚠️  Connection lost: {e}. Reconnecting in {delay}s...")
-            await asyncio.sleep(delay)
+            wait = delay * random.uniform(0.5, 1.5)  # jitter, so a fleet does not reconnect in lockstep
+            print(f"⚠️  Connection lost: {e}. Reconnecting in {wait:.1f}s...")
+            await asyncio.sleep(wait)
             delay = min(delay * 2, MAX_RECONNECT_DELAY)
         except KeyboardInterrupt:
             print("\n🤖 VIRTUAL ROBOT: Shutting down.")
             break
+        finally:
+            for task in (telemetry_task, dropper):
+                if task is not None:
+                    task.cancel()
 
 
 if __name__ == "__main__":
-    asyncio.run(run_robot())
+    parser = argparse.ArgumentParser(description="Virtual ESP32 robot simulator")
+    parser.add_argument("--protocol", choices=["bin", "json"], default="bin",
+                        help="wire format to offer during the handshake (default: bin)")
+    parser.add_argument("--device-id", default="gus", help="device id reported to the server")
+    parser.add_argument("--telemetry-hz", type=float, default=0.2,
+                        help="synthetic telemetry samples per second, 0 to disable (default: 0.2)")
+    parser.add_argument("--ack-delay-ms", type=float, default=0.0, help="delay before acking each command")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="probability (0-1) that a command frame is dropped without an ack")
+    parser.add_argument("--drop-every", type=float, default=0.0,
+                        help="abort the link after this many seconds of each connection, 0 to never")
+    args = parser.parse_args()
+    asyncio.run(run_robot(
+        BINARY_PROTOCOL if args.protocol == "bin" else JSON_PROTOCOL,
+        device_id=args.device_id,
+        telemetry_hz=args.telemetry_hz,
+        ack_delay=args.ack_delay_ms / 1000.0,
+        loss=args.loss,
+        drop_every=args.drop_every,
+    ))
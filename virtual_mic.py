@@ -3,13 +3,17 @@
 Virtual Microphone - Simulates ESP32 mic using the laptop's microphone.
 Press and hold SPACEBAR to record; release to send audio to the server.
 Prints the AI response to the console.
+Clips are sent IMA-ADPCM compressed (4x smaller) when the server accepts it; set
+MIC_CODEC=opus (needs opuslib + libopus) or MIC_CODEC=wav to change that.
 
 Dependencies: pip install sounddevice numpy scipy websockets
+Run from the project root (the uplink codecs live in server/services/audio_uplink.py).
 """
 
 import asyncio
 import io
 import json
+import os
 import sys
 import time
 
@@ -27,7 +31,15 @@ except ImportError:
     print("Install websockets: pip install websockets")
     sys.exit(1)
 
+from server.services.audio_uplink import ADPCM_PROTOCOL, OPUS_PROTOCOL, get_uplink, wav_to_pcm
+
 WS_URL = "ws://127.0.0.1:8000/ws/audio"
+MIC_CODEC = os.getenv("MIC_CODEC", "adpcm").lower()
+# Subprotocols to offer, best first (only those this machine can encode)
+UPLINK_PROTOCOLS = [
+    p for p in {"opus": [OPUS_PROTOCOL, ADPCM_PROTOCOL], "adpcm": [ADPCM_PROTOCOL]}.get(MIC_CODEC, [])
+    if get_uplink(p) is not None
+]
 SAMPLE_RATE = 16000
 CHANNELS = 1
 DTYPE = np.int16
@@ -72,8 +84,9 @@ async def main() -> None:
             if len(wav_bytes) < 100:
                 print("Too short, try again.")
                 continue
-            async with websockets.connect(WS_URL) as ws:
-                await ws.send(wav_bytes)
+            async with websockets.connect(WS_URL, subprotocols=UPLINK_PROTOCOLS or None) as ws:
+                uplink = get_uplink(ws.subprotocol)
+                await ws.send(uplink.encode(wav_to_pcm(wav_bytes)) if uplink else wav_bytes)
                 try:
                     msg = await asyncio.wait_for(ws.recv(), timeout=15.0)
                     data = json.loads(msg)